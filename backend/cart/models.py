@@ -91,14 +91,10 @@ class CartItem(models.Model):
     def unit_price(self):
         """Get the unit price of the item."""
         if self.variant:
-            if self.variant.is_on_sale and self.variant.sale_price:
-                return self.variant.sale_price
-            return self.variant.price
+            return self.variant.current_price
         
         if self.product:
-            if self.product.is_on_sale and self.product.sale_price:
-                return self.product.sale_price
-            return self.product.price
+            return self.product.current_price
         
         return 0
     
@@ -1,3 +1,183 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.forms import modelform_factory
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from products.models import Inventory, ProductImage, ProductListing, Reservation
+from products.tests import CatalogFixtureMixin
+from users.models import CustomUser
+
+from .models import Cart
+
+
+class CartQueryTests(CatalogFixtureMixin, TestCase):
+    """The cart loads its lines' products in a fixed number of queries."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user(email='buyer@example.com', password='pw'))
+
+    def add(self, products):
+        for product in products:
+            response = self.client.post('/api/v1/cart/cart/add_item/', {'product_id': product.pk})
+            self.assertEqual(response.status_code, 201)
+
+    def queries_for(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_lines(self):
+        self.add(self.create_catalog(2))
+        few = self.queries_for('/api/v1/cart/cart/current/')
+        self.add(self.create_catalog(3))
+        self.assertEqual(self.queries_for('/api/v1/cart/cart/current/'), few)
+        data = self.client.get('/api/v1/cart/cart/current/').data
+        self.assertEqual(len(data['items']), 5)
+        self.assertTrue(data['items'][0]['product_details']['primary_image'].startswith('http'))
+
+
+class ReservationTests(CatalogFixtureMixin, TestCase):
+    """Checkout reservations hold stock for a while and convert into the order."""
+
+    def setUp(self):
+        self.product = self.create_catalog(1)[0]
+        ProductImage.objects.all().delete()
+        self.inventory = Inventory.objects.create(product=self.product, quantity=3)
+        self.buyer = self.client_for('buyer@example.com')
+        self.rival = self.client_for('rival@example.com')
+
+    def client_for(self, email):
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.create_user(email=email, password='pw'))
+        return client
+
+    def fill_cart(self, client, quantity):
+        response = client.post('/api/v1/cart/cart/add_item/', {'product_id': self.product.pk, 'quantity': quantity})
+        self.assertIn(response.status_code, (200, 201))
+
+    def order(self, client, quantity):
+        return client.post('/api/v1/orders/orders/', {
+            'email': 'rival@example.com',
+            'items': [{'product_id': self.product.pk, 'quantity': quantity, 'price': 10}],
+        }, format='json')
+
+    def test_hold_blocks_other_buyers(self):
+        self.fill_cart(self.buyer, 2)
+        response = self.buyer.post('/api/v1/cart/cart/reserve/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['items'], [{'sku': self.product.sku, 'quantity': 2}])
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.reserved, self.inventory.available), (2, 1))
+        self.assertEqual(self.order(self.rival, 2).status_code, 400)
+        self.assertEqual(self.order(self.rival, 1).status_code, 201)
+
+        # Nothing is left for a second hold.
+        self.fill_cart(self.rival, 1)
+        self.assertEqual(self.rival.post('/api/v1/cart/cart/reserve/').status_code, 400)
+
+    def test_checkout_converts_the_hold(self):
+        self.fill_cart(self.buyer, 2)
+        self.buyer.post('/api/v1/cart/cart/reserve/')
+        # Re-reserving replaces the hold instead of adding to it.
+        self.buyer.post('/api/v1/cart/cart/reserve/')
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.reserved, 2)
+
+        response = self.buyer.post('/api/v1/orders/orders/checkout_from_cart/', {}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.quantity, self.inventory.reserved), (1, 0))
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_expired_holds_are_swept(self):
+        from products.stock import release_expired_reservations
+        self.fill_cart(self.buyer, 3)
+        self.buyer.post('/api/v1/cart/cart/reserve/')
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        # A lapsed hold on the SKU is swept before the sale, not counted against it.
+        self.assertEqual(self.order(self.rival, 3).status_code, 201)
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.quantity, self.inventory.reserved), (0, 0))
+
+        self.inventory.quantity = 3
+        self.inventory.save()
+        self.buyer.post('/api/v1/cart/cart/reserve/')
+        later = timezone.now() + timedelta(hours=1)
+        self.assertEqual(release_expired_reservations(batch_size=1, now=later), 1)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.reserved, 0)
+
+    def test_holds_reach_cached_details_and_listings(self):
+        cache.clear()
+        anonymous = APIClient()
+        url = f'/api/v1/products/products/{self.product.slug}/'
+        etag = anonymous.get(url)['ETag']
+        self.fill_cart(self.buyer, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.buyer.post('/api/v1/cart/cart/reserve/')
+        response = anonymous.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['inventory']['available'], 1)
+        listing = ProductListing.objects.get(product=self.product)
+        self.assertEqual((listing.stock_quantity, listing.in_stock), (1, True))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.buyer.post('/api/v1/cart/cart/release/')
+        self.assertEqual(anonymous.get(url).data['inventory']['available'], 3)
+        self.assertEqual(ProductListing.objects.get(product=self.product).stock_quantity, 3)
+
+    def test_saves_never_overwrite_reserved(self):
+        stale = Inventory.objects.get(pk=self.inventory.pk)
+        self.fill_cart(self.buyer, 2)
+        self.buyer.post('/api/v1/cart/cart/reserve/')
+        stale.quantity = 5
+        stale.save()
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.quantity, self.inventory.reserved), (5, 2))
+        # Admin and other model forms leave it out too.
+        self.assertNotIn('reserved', modelform_factory(Inventory, fields='__all__').base_fields)
+
+    def test_command_reconciles_drifted_counters(self):
+        self.fill_cart(self.buyer, 2)
+        self.buyer.post('/api/v1/cart/cart/reserve/')
+        Inventory.objects.update(reserved=7)
+        out = StringIO()
+        call_command('release_expired_reservations', stdout=out)
+        self.assertIn('reconciled 1', out.getvalue())
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.reserved, 2)
+        self.assertEqual(ProductListing.objects.get(product=self.product).stock_quantity, 1)
+
+    def test_deleting_a_cart_releases_its_hold(self):
+        self.fill_cart(self.buyer, 2)
+        self.buyer.post('/api/v1/cart/cart/reserve/')
+        Cart.objects.all().delete()
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.reserved, 0)
 
-# Create your tests here.
+    def test_lost_claim_races_answer_409(self):
+        from products.stock import ReservationConflict, claim_reservations
+        self.fill_cart(self.buyer, 2)
+        self.buyer.post('/api/v1/cart/cart/reserve/')
+        # Every attempt finds its reservations already claimed by someone else.
+        with mock.patch('django.db.models.query.QuerySet.delete', return_value=(0, {})):
+            with self.assertRaises(ReservationConflict):
+                claim_reservations(Reservation.objects.all())
+            response = self.buyer.post('/api/v1/cart/cart/reserve/')
+            self.assertEqual(response.status_code, 409)
+            self.assertIn('retry', response.data['error'])
+            response = self.buyer.post('/api/v1/orders/orders/checkout_from_cart/', {}, format='json')
+            self.assertEqual(response.status_code, 409)
+            self.assertIn('retry', response.data['detail'])
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.quantity, self.inventory.reserved), (3, 2))
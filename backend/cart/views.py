@@ -1,8 +1,10 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
 from products.models import Product, ProductVariant
+from products.stock import InsufficientStock, ReservationConflict, release_reservations, reserve_cart
 from .models import Cart, CartItem, SavedForLater
 from .serializers import (
     CartSerializer, CartItemSerializer, AddToCartSerializer,
@@ -10,6 +12,14 @@ from .serializers import (
 )
 
 
+def cart_items():
+    """Cart items with what CartItemSerializer reads loaded in a fixed number of queries."""
+    return CartItem.objects.prefetch_related(
+        Prefetch('product', queryset=Product.objects.for_listing()),
+        Prefetch('variant', queryset=ProductVariant.objects.for_detail()),
+    )
+
+
 class CartViewSet(viewsets.GenericViewSet):
     """ViewSet for managing shopping cart."""
     
@@ -48,6 +58,7 @@ class CartViewSet(viewsets.GenericViewSet):
     def current(self, request):
         """Get the current cart."""
         cart = self.get_cart(request)
+        cart = Cart.objects.prefetch_related(Prefetch('items', queryset=cart_items())).get(pk=cart.pk)
         serializer = self.get_serializer(cart)
         return Response(serializer.data)
     
@@ -81,7 +92,7 @@ class CartViewSet(viewsets.GenericViewSet):
                 # Update quantity if item already exists
                 existing_item.quantity += quantity
                 existing_item.save()
-                serializer = CartItemSerializer(existing_item)
+                serializer = CartItemSerializer(existing_item, context=self.get_serializer_context())
                 return Response(serializer.data)
             else:
                 # Create new cart item
@@ -91,7 +102,7 @@ class CartViewSet(viewsets.GenericViewSet):
                     variant=variant,
                     quantity=quantity
                 )
-                serializer = CartItemSerializer(cart_item)
+                serializer = CartItemSerializer(cart_item, context=self.get_serializer_context())
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -109,7 +120,7 @@ class CartViewSet(viewsets.GenericViewSet):
         if serializer.is_valid():
             cart_item.quantity = serializer.validated_data['quantity']
             cart_item.save()
-            return Response(CartItemSerializer(cart_item).data)
+            return Response(CartItemSerializer(cart_item, context=self.get_serializer_context()).data)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -132,7 +143,7 @@ class CartViewSet(viewsets.GenericViewSet):
             cart_item = CartItem.objects.get(id=item_id, cart=cart, saved_for_later=False)
             cart_item.saved_for_later = True
             cart_item.save()
-            return Response(CartItemSerializer(cart_item).data)
+            return Response(CartItemSerializer(cart_item, context=self.get_serializer_context()).data)
         except CartItem.DoesNotExist:
             return Response({"error": "Item not found in cart"}, status=status.HTTP_404_NOT_FOUND)
     
@@ -144,7 +155,7 @@ class CartViewSet(viewsets.GenericViewSet):
             cart_item = CartItem.objects.get(id=item_id, cart=cart, saved_for_later=True)
             cart_item.saved_for_later = False
             cart_item.save()
-            return Response(CartItemSerializer(cart_item).data)
+            return Response(CartItemSerializer(cart_item, context=self.get_serializer_context()).data)
         except CartItem.DoesNotExist:
             return Response({"error": "Saved item not found"}, status=status.HTTP_404_NOT_FOUND)
     
@@ -152,8 +163,8 @@ class CartViewSet(viewsets.GenericViewSet):
     def saved_items(self, request):
         """Get items saved for later."""
         cart = self.get_cart(request)
-        saved_items = CartItem.objects.filter(cart=cart, saved_for_later=True)
-        serializer = CartItemSerializer(saved_items, many=True)
+        saved_items = cart_items().filter(cart=cart, saved_for_later=True)
+        serializer = CartItemSerializer(saved_items, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
     
     @action(detail=False, methods=['post'])
@@ -162,3 +173,37 @@ class CartViewSet(viewsets.GenericViewSet):
         cart = self.get_cart(request)
         CartItem.objects.filter(cart=cart, saved_for_later=False).delete()
         return Response({"message": "Cart cleared successfully"}, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['post'])
+    def reserve(self, request):
+        """Hold the cart's stock while the customer checks out."""
+        cart = self.get_cart(request)
+        if cart.is_empty:
+            return Response({"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            expires_at = reserve_cart(cart)
+        except InsufficientStock as e:
+            return Response({"error": "Not enough stock", "items": e.shortages}, status=status.HTTP_400_BAD_REQUEST)
+        except ReservationConflict as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        reservations = cart.reservations.select_related('inventory__product', 'inventory__variant')
+        return Response({
+            "expires_at": expires_at,
+            "items": [
+                {
+                    "sku": (reservation.inventory.variant or reservation.inventory.product).sku,
+                    "quantity": reservation.quantity,
+                }
+                for reservation in reservations
+            ],
+        })
+    
+    @action(detail=False, methods=['post'])
+    def release(self, request):
+        """Give back the stock held for the cart."""
+        cart = self.get_cart(request)
+        try:
+            release_reservations(cart.reservations.all())
+        except ReservationConflict as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response({"message": "Reservation released"}, status=status.HTTP_200_OK)
@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'laptop_store.settings')
 
 application = get_asgi_application()
+
+# Build per-process in-memory indexes before the first request.
+from products.autocomplete import warm_autocomplete_index  # noqa: E402
+from products.tracking import start_view_flusher  # noqa: E402
+
+warm_autocomplete_index()
+# Single background writer for buffered product views.
+start_view_flusher()
@@ -96,6 +96,25 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Catalog version stamps live in the 'catalog' cache (see products/caching.py).
+# Management commands bump them from their own process, so it must be a store
+# every process shares: files on this host, or Redis/Memcached across hosts.
+# Responses and validators are keyed by the stamps and may stay process-local.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'laptop-store',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'catalog',
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -165,6 +184,11 @@ REST_FRAMEWORK = {
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Serve MEDIA_ROOT from Django; content-hashed files as immutable for
+# MEDIA_CACHE_MAX_AGE seconds (see products/storage.py). Turn off when a web
+# server or CDN serves the media directory.
+SERVE_MEDIA = True
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
 
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # For development only, restrict in production
@@ -192,4 +216,32 @@ PRODUCT_IMAGE_WIDTH = 800
 PRODUCT_IMAGE_HEIGHT = 600
 PRODUCT_THUMBNAIL_WIDTH = 300
 PRODUCT_THUMBNAIL_HEIGHT = 300
+PRODUCT_CARD_WIDTH = 480
+PRODUCT_CARD_HEIGHT = 360
+# Threads per process rendering image derivatives; 0 renders inline (see products/derivatives.py)
+PRODUCT_IMAGE_WORKERS = 2
+
+# Seconds a cached anonymous catalog response may live (see products/caching.py).
+# Writes invalidate entries immediately through version stamps; this only
+# bounds how long unreachable entries occupy the cache.
+CATALOG_CACHE_TIMEOUT = 60 * 15
+
+# Product search backend (see products/search.py)
+PRODUCT_SEARCH_BACKEND = 'products.search.SQLiteFTS5Backend'
+
+# Rebuild stale autocomplete/facet indexes on a background thread while the
+# old ones keep serving; False rebuilds inline (see products/caching.py)
+CATALOG_INDEX_BACKGROUND_REBUILD = True
+
+# Write-behind buffer for product views (see products/tracking.py)
+RECENTLY_VIEWED_FLUSH_INTERVAL = 5  # seconds
+RECENTLY_VIEWED_BUFFER_SIZE = 500
+RECENTLY_VIEWED_LIMIT = 50  # views kept per user
+
+# Seconds a checkout reservation holds stock (see products/stock.py)
+RESERVATION_TTL = 15 * 60
+
+# Product feed export (see products/exporting.py)
+STOREFRONT_URL = 'http://localhost:3000'
+CATALOG_FEED_CURRENCY = 'USD'
 STATIC_ROOT = BASE_DIR / "static_collected"
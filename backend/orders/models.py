@@ -64,8 +64,9 @@ class Order(models.Model):
         if not self.order_number:
             self.order_number = self.generate_order_number()
         
-        # Calculate totals
-        self.subtotal = sum(item.total_price for item in self.items.all())
+        # Calculate totals (a new order has no items yet)
+        if self.pk:
+            self.subtotal = sum(item.total_price for item in self.items.all())
         self.total = self.subtotal + self.shipping_cost + self.tax_amount - self.discount_amount
         
         super().save(*args, **kwargs)
@@ -1,3 +1,141 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from products.models import Inventory, ProductListing
+from products.tests import CatalogFixtureMixin
+from users.models import CustomUser
+
+
+class OrderQueryTests(CatalogFixtureMixin, TestCase):
+    """Order lists load their lines' products in a fixed number of queries."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user(email='buyer@example.com', password='pw'))
+
+    def order(self, products):
+        response = self.client.post('/api/v1/orders/orders/', {
+            'email': 'buyer@example.com',
+            'items': [{'product_id': product.pk, 'quantity': 1, 'price': 10} for product in products],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def queries_for(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_lines(self):
+        from .models import Order
+        urls = ('/api/v1/orders/orders/', '/api/v1/orders/orders/my_orders/')
+        self.order(self.create_catalog(1))
+        few = {url: self.queries_for(url) for url in urls}
+        Order.objects.all().delete()
+        self.order(self.create_catalog(4))
+        for url, count in few.items():
+            self.assertEqual(self.queries_for(url), count, url)
+
+
+class StockDecrementTests(CatalogFixtureMixin, TestCase):
+    """Placing an order takes all of its stock in one conditional UPDATE."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.products = self.create_catalog(2)
+        for product in self.products:
+            Inventory.objects.create(product=product, quantity=3)
+
+    def order(self, *lines):
+        return self.client.post('/api/v1/orders/orders/', {
+            'email': 'buyer@example.com',
+            'items': [{'product_id': product.pk, 'quantity': quantity, 'price': 10} for product, quantity in lines],
+        }, format='json')
+
+    def stock(self, product):
+        return Inventory.objects.get(product=product).quantity
+
+    def test_one_update_for_all_lines(self):
+        from .models import Order
+        with CaptureQueriesContext(connection) as queries:
+            response = self.order((self.products[0], 2), (self.products[1], 1), (self.products[0], 1))
+        self.assertEqual(response.status_code, 201)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "products_inventory"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual((self.stock(self.products[0]), self.stock(self.products[1])), (0, 2))
+        self.assertEqual(ProductListing.objects.get(product=self.products[0]).stock_quantity, 0)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_sale_moves_last_checked(self):
+        stale = timezone.now() - timedelta(days=1)
+        Inventory.objects.update(last_checked=stale)
+        self.assertEqual(self.order((self.products[0], 1)).status_code, 201)
+        self.assertGreater(Inventory.objects.get(product=self.products[0]).last_checked, stale)
+        self.assertEqual(Inventory.objects.get(product=self.products[1]).last_checked, stale)
+
+    def test_short_stock_rolls_back_the_order(self):
+        from .models import Order
+        response = self.order((self.products[0], 1), (self.products[1], 4))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((response.data['items'][0]['sku'], int(response.data['items'][0]['available'])), (self.products[1].sku, 3))
+        self.assertEqual((self.stock(self.products[0]), self.stock(self.products[1])), (3, 3))
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_untracked_lines_pass(self):
+        untracked = self.create_catalog(1)[0]
+        self.assertEqual(self.order((untracked, 5), (self.products[0], 1)).status_code, 201)
+        self.assertEqual(self.stock(self.products[0]), 2)
+
+
+@override_settings(PRODUCT_IMAGE_WORKERS=0)
+class ConcurrentCheckoutTests(CatalogFixtureMixin, TransactionTestCase):
+    """Parallel checkouts of one SKU never sell more than is in stock."""
+
+    def test_parallel_checkouts_do_not_oversell(self):
+        import random
+        import threading
+        import time
+        from django.db import OperationalError, transaction
+        from .models import Order, OrderItem
+        from products.stock import InsufficientStock, decrement_stock, stock_lines
+        # The fixture's image files do not exist, so rendering their derivatives fails.
+        with self.assertLogs('products.derivatives', 'WARNING'):
+            product = self.create_catalog(1)[0]
+        Inventory.objects.create(product=product, quantity=3)
+        barrier = threading.Barrier(8)
+        outcomes = []
+
+        def checkout():
+            barrier.wait()
+            try:
+                # The in-memory test database rejects a concurrent writer instead
+                # of queueing it; the whole transaction rolled back, so retry.
+                for _ in range(500):
+                    try:
+                        with transaction.atomic():
+                            order = Order.objects.create(email='buyer@example.com')
+                            OrderItem.objects.create(order=order, product=product, price=10, quantity=1)
+                            decrement_stock(stock_lines(order.items.values_list('product_id', 'variant_id', 'quantity')))
+                        outcomes.append('sold')
+                        return
+                    except InsufficientStock:
+                        outcomes.append('short')
+                        return
+                    except OperationalError:
+                        time.sleep(random.random() / 200)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(outcomes), ['short'] * 5 + ['sold'] * 3)
+        self.assertEqual(Inventory.objects.get(product=product).quantity, 0)
+        self.assertEqual(Order.objects.count(), 3)
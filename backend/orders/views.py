@@ -1,8 +1,9 @@
-from rest_framework import viewsets, generics, status, permissions
+from rest_framework import viewsets, generics, status, permissions, serializers, exceptions
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Prefetch, Q
 from django.utils import timezone
 from .models import Order, OrderItem, Payment, Coupon, OrderStatusHistory
 from .serializers import (
@@ -10,10 +11,26 @@ from .serializers import (
     PaymentSerializer, CouponSerializer, CouponApplySerializer,
     OrderStatusUpdateSerializer, PaymentStatusUpdateSerializer
 )
-from products.models import Product, ProductVariant, Inventory
+from products.models import Product, ProductVariant, Inventory, Reservation
+from products.stock import InsufficientStock, ReservationConflict, decrement_stock, stock_lines
 from cart.models import Cart, CartItem
 
 
+class CheckoutConflict(exceptions.APIException):
+    """409 for a checkout that lost a race over its reservations; the client may retry."""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Checkout conflicted with a concurrent request; please retry.'
+    default_code = 'conflict'
+
+
+def order_items():
+    """Order items with what OrderItemSerializer reads loaded in a fixed number of queries."""
+    return OrderItem.objects.prefetch_related(
+        Prefetch('product', queryset=Product.objects.for_listing()),
+        Prefetch('variant', queryset=ProductVariant.objects.for_detail()),
+    )
+
+
 class OrderViewSet(viewsets.ModelViewSet):
     """ViewSet for managing orders."""
     
@@ -22,10 +39,12 @@ class OrderViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:
-            return Order.objects.all()
+            orders = Order.objects.all()
         elif user.is_authenticated:
-            return Order.objects.filter(user=user)
-        return Order.objects.none()
+            orders = Order.objects.filter(user=user)
+        else:
+            return Order.objects.none()
+        return orders.prefetch_related(Prefetch('items', queryset=order_items()))
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -37,21 +56,33 @@ class OrderViewSet(viewsets.ModelViewSet):
             return [permissions.AllowAny()]
         return [permissions.IsAuthenticated()]
     
+    def place_order(self, serializer):
+        """
+        Create the order and take its stock in one transaction, converting the
+        user's checkout reservations; nothing is kept if stock is short.
+        """
+        user = self.request.user
+        session_id = self.request.session.session_key
+        reservations = None
+        if user.is_authenticated:
+            reservations = Reservation.objects.filter(cart__user=user)
+        elif session_id:
+            reservations = Reservation.objects.filter(cart__session_id=session_id, cart__user=None)
+        try:
+            with transaction.atomic():
+                order = serializer.save()
+                decrement_stock(
+                    stock_lines(order.items.values_list('product_id', 'variant_id', 'quantity')),
+                    reservations=reservations,
+                )
+        except InsufficientStock as e:
+            raise serializers.ValidationError({'items': e.shortages})
+        except ReservationConflict as e:
+            raise CheckoutConflict(str(e))
+        return order
+    
     def perform_create(self, serializer):
-        order = serializer.save()
-        
-        # Update inventory for ordered items
-        for item in order.items.all():
-            if item.product:
-                inventory = item.product.inventory
-                if inventory:
-                    inventory.quantity = max(0, inventory.quantity - item.quantity)
-                    inventory.save()
-            elif item.variant:
-                inventory = item.variant.inventory
-                if inventory:
-                    inventory.quantity = max(0, inventory.quantity - item.quantity)
-                    inventory.save()
+        order = self.place_order(serializer)
         
         # Clear the cart if user is authenticated
         user = self.request.user
@@ -106,8 +137,8 @@ class OrderViewSet(viewsets.ModelViewSet):
         if not request.user.is_authenticated:
             return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
         
-        orders = Order.objects.filter(user=request.user)
-        serializer = OrderSerializer(orders, many=True)
+        orders = Order.objects.filter(user=request.user).prefetch_related(Prefetch('items', queryset=order_items()))
+        serializer = OrderSerializer(orders, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
     
     @action(detail=False, methods=['post'])
@@ -153,7 +184,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             # Create order
             serializer = OrderCreateSerializer(data=order_data, context={'request': request})
             if serializer.is_valid():
-                order = serializer.save()
+                order = self.place_order(serializer)
                 
                 # Clear the cart
                 CartItem.objects.filter(cart=cart, saved_for_later=False).delete()
@@ -39,6 +39,7 @@ class InventoryInline(admin.TabularInline):
     model = Inventory
     extra = 1
     max_num = 1
+    readonly_fields = ('reserved',)
 
 
 class ProductAdmin(admin.ModelAdmin):
@@ -85,10 +86,10 @@ class ProductAttributeAdmin(admin.ModelAdmin):
 
 
 class InventoryAdmin(admin.ModelAdmin):
-    list_display = ('__str__', 'quantity', 'low_stock_threshold', 'is_low_stock', 'is_in_stock', 'last_checked')
+    list_display = ('__str__', 'quantity', 'reserved', 'low_stock_threshold', 'is_low_stock', 'is_in_stock', 'last_checked')
     list_filter = ('quantity', 'low_stock_threshold')
     search_fields = ('product__name', 'variant__name')
-    readonly_fields = ('is_low_stock', 'is_in_stock')
+    readonly_fields = ('reserved', 'is_low_stock', 'is_in_stock')
 
 
 class ReviewAdmin(admin.ModelAdmin):
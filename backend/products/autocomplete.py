@@ -0,0 +1,90 @@
+"""
+In-memory prefix index for search-as-you-type.
+
+The index is a sorted array of normalised terms searched with ``bisect``,
+built once per process from product, brand and category names and SKUs.
+When the catalog version stamp moves it is rebuilt on a background thread
+while the old index keeps answering (see ``caching.VersionedIndex``), so
+the hot path is one cache read plus a binary search and never touches
+the database.
+"""
+from bisect import bisect_left
+
+from .caching import VersionedIndex
+from .models import Brand, Category, Product
+
+KIND_ORDER = {'brand': 0, 'category': 1, 'product': 2, 'sku': 3}
+MAX_SCAN = 200
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+class PrefixIndex:
+    """Sorted ``(term, suggestion)`` pairs answering prefix queries with bisect."""
+
+    def __init__(self, entries):
+        entries = sorted(entries, key=lambda entry: entry[0])
+        self.terms = [term for term, _ in entries]
+        self.suggestions = [suggestion for _, suggestion in entries]
+
+    def __len__(self):
+        return len(self.terms)
+
+    def lookup(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        start = bisect_left(self.terms, prefix)
+        matches = {}
+        for i in range(start, min(start + MAX_SCAN, len(self.terms))):
+            if not self.terms[i].startswith(prefix):
+                break
+            suggestion = self.suggestions[i]
+            # Whole-name matches rank above matches on a later word.
+            rank = (KIND_ORDER[suggestion['type']], self.terms[i] != normalize(suggestion['text']),
+                    len(suggestion['text']))
+            key = (suggestion['type'], suggestion['slug'])
+            if key not in matches or rank < matches[key][0]:
+                matches[key] = (rank, suggestion)
+        return [suggestion for _, suggestion in sorted(matches.values(), key=lambda m: m[0])[:limit]]
+
+
+def _name_terms(name):
+    """Index the full name and every word suffix, so 'carb' finds 'ThinkPad X1 Carbon'."""
+    words = normalize(name).split()
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+def build_index():
+    entries = []
+    for name, slug in Brand.objects.filter(is_active=True).values_list('name', 'slug'):
+        suggestion = {'type': 'brand', 'text': name, 'slug': slug}
+        entries += [(term, suggestion) for term in _name_terms(name)]
+    for name, slug in Category.objects.filter(is_active=True).values_list('name', 'slug'):
+        suggestion = {'type': 'category', 'text': name, 'slug': slug}
+        entries += [(term, suggestion) for term in _name_terms(name)]
+    for name, slug, sku in Product.objects.active().order_by().values_list('name', 'slug', 'sku'):
+        suggestion = {'type': 'product', 'text': name, 'slug': slug}
+        entries += [(term, suggestion) for term in _name_terms(name)]
+        entries.append((normalize(sku), {'type': 'sku', 'text': sku, 'slug': slug}))
+    return PrefixIndex(entries)
+
+
+_index = VersionedIndex('autocomplete index', build_index, ('catalog',))
+
+
+def get_autocomplete_index():
+    """Return this process's prefix index (see ``caching.VersionedIndex``)."""
+    return _index.get()
+
+
+def warm_autocomplete_index():
+    """Build the index at process start so the first keystroke is already fast."""
+    from django.db import DatabaseError
+    try:
+        get_autocomplete_index()
+    except DatabaseError:
+        # Tables not migrated yet; the index builds on first use instead.
+        pass
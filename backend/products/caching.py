@@ -0,0 +1,147 @@
+"""
+Catalog version stamps and the response cache built on them.
+
+Each resource family carries a version number in the ``catalog`` cache,
+which all processes share, so bumps made by management commands reach the
+web workers too. Writers bump it from model signals (see
+``CATALOG_VERSION_FAMILIES`` in models.py) and readers fold it into their
+cache keys or compare it against the version their in-process data was
+built from. Invalidation is therefore a single cache increment; stale
+entries are never looked up again and simply expire.
+
+``VersionedIndex`` holds per-process structures built from the catalog
+(the autocomplete and facet indexes) and rebuilds them when their stamps
+move.
+"""
+import hashlib
+import logging
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'catalog:version:{}'
+
+stamps = caches['catalog']
+
+
+def _initial_version():
+    # Seeded from the clock so a version lost to eviction never repeats an old one.
+    return int(time.time() * 1000)
+
+
+def get_catalog_version(family='catalog'):
+    """Return the current version stamp of a catalog resource family."""
+    key = VERSION_KEY.format(family)
+    version = stamps.get(key)
+    if version is None:
+        stamps.add(key, _initial_version(), timeout=None)
+        version = stamps.get(key)
+    return version
+
+
+def bump_catalog_version(*families):
+    """Invalidate everything built from the given resource families."""
+    for family in families or ('catalog',):
+        key = VERSION_KEY.format(family)
+        try:
+            stamps.incr(key)
+        except ValueError:
+            stamps.set(key, _initial_version(), timeout=None)
+
+
+class VersionedIndex:
+    """
+    A per-process structure rebuilt whenever the stamps of ``families`` move.
+
+    Only the first ``get()`` of a process builds inline. Afterwards the
+    current structure keeps answering while a background thread builds its
+    replacement (``CATALOG_INDEX_BACKGROUND_REBUILD``; False rebuilds
+    inline), so a full catalog scan never runs on the request path and
+    readers trail a write by at most one rebuild. ``invalidates`` are
+    bumped once a replacement is in place, for responses built from the
+    old one.
+    """
+
+    def __init__(self, name, build, families, invalidates=()):
+        self.name = name
+        self.build = build
+        self.families = families
+        self.invalidates = invalidates
+        self.lock = threading.Lock()
+        self.value = None
+        self.version = None
+        self.rebuilding = False
+
+    def current_version(self):
+        return tuple(get_catalog_version(family) for family in self.families)
+
+    def get(self):
+        version = self.current_version()
+        if self.value is not None and self.version == version:
+            return self.value
+        with self.lock:
+            if self.value is None:
+                self.value, self.version = self.build(), version
+            elif self.version != version:
+                if not getattr(settings, 'CATALOG_INDEX_BACKGROUND_REBUILD', True):
+                    self.value, self.version = self.build(), version
+                elif not self.rebuilding:
+                    self.rebuilding = True
+                    threading.Thread(
+                        target=self.rebuild, args=(version,), name=f'{self.name} rebuild', daemon=True
+                    ).start()
+            return self.value
+
+    def rebuild(self, version):
+        try:
+            value = self.build()
+            with self.lock:
+                self.value, self.version = value, version
+            if self.invalidates:
+                bump_catalog_version(*self.invalidates)
+        except Exception:
+            logger.exception('Rebuilding the %s failed', self.name)
+        finally:
+            self.rebuilding = False
+            connection.close()
+
+
+def response_cache_key(request, families):
+    versions = '.'.join(f'{family}{get_catalog_version(family)}' for family in families)
+    url = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    return f'catalog:response:{versions}:{url}'
+
+
+def cache_response(*families, timeout=None):
+    """
+    Cache a read-only view's response data for anonymous GET requests.
+
+    The key includes the version stamps of ``families``, so any write
+    bumping one of them makes every dependent entry unreachable at once.
+    Authenticated requests bypass the cache as their payloads may be
+    personalised.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return func(self, request, *args, **kwargs)
+            
+            key = response_cache_key(request, families)
+            cached = cache.get(key)
+            if cached is not None:
+                return Response(cached)
+            
+            response = func(self, request, *args, **kwargs)
+            if response.status_code == 200 and isinstance(response, Response):
+                cache.set(key, response.data, timeout or settings.CATALOG_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,54 @@
+"""
+Side-by-side product comparison.
+
+Everything comes from two queries whatever the number of products: the
+listing rows (prices, variant price ranges, stock) and the products'
+attribute values, which are pivoted into an attribute x product matrix.
+"""
+from collections import defaultdict
+
+from rest_framework.exceptions import ValidationError
+
+from .models import ProductAttributeValue, ProductListing
+
+MAX_COMPARE = 6
+
+
+def parse_compare_ids(raw):
+    """Turn ``'1,2,3'`` into ``[1, 2, 3]``, dropping duplicates and keeping order."""
+    try:
+        ids = [int(part) for part in raw.split(',') if part.strip()]
+    except ValueError:
+        raise ValidationError({'ids': 'Expected a comma-separated list of product ids.'})
+    ids = list(dict.fromkeys(ids))
+    if len(ids) < 2:
+        raise ValidationError({'ids': 'Select at least two products to compare.'})
+    if len(ids) > MAX_COMPARE:
+        raise ValidationError({'ids': f'At most {MAX_COMPARE} products can be compared.'})
+    return ids
+
+
+def build_comparison(product_ids):
+    """
+    Return ``(listings, rows)`` for the active products among ``product_ids``.
+
+    ``listings`` keep the requested order. Each row is
+    ``{'attribute', 'values', 'differs'}`` with one value per listing
+    (``None`` where a product lacks the attribute).
+    """
+    listings = ProductListing.objects.in_bulk(product_ids)
+    listings = [listings[pk] for pk in product_ids if pk in listings]
+    order = {listing.pk: index for index, listing in enumerate(listings)}
+
+    matrix = defaultdict(lambda: [None] * len(listings))
+    values = ProductAttributeValue.objects.filter(product_id__in=order).values_list(
+        'attribute__name', 'product_id', 'value'
+    )
+    for attribute, product_id, value in values:
+        matrix[attribute][order[product_id]] = value
+
+    rows = [
+        {'attribute': attribute, 'values': matrix[attribute], 'differs': len(set(matrix[attribute])) > 1}
+        for attribute in sorted(matrix)
+    ]
+    return listings, rows
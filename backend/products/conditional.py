@@ -0,0 +1,91 @@
+"""
+Conditional GET support (ETag / Last-Modified) for catalog resources.
+
+Validators are computed from the database (``MAX(updated_at)`` and a count
+for lists, the newest timestamp of a row and its children for details) and
+memoised in the cache under the same version stamps as the response cache.
+A client revalidating an unchanged resource therefore gets a ``304 Not
+Modified`` without the view running, let alone serializing anything.
+"""
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .caching import get_catalog_version
+
+
+def _timestamp(value):
+    return timegm(value.utctimetuple()) if value else None
+
+
+def list_validators(view, request):
+    """Validators of a list: newest ``updated_at`` and size of the filtered queryset."""
+    queryset = view.filter_queryset(view.get_queryset())
+    stats = queryset.aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+    return _timestamp(stats['last_modified']), f"{stats['count']}"
+
+
+def detail_validators(view, request, **kwargs):
+    """Validators of a single object; views with child rows override ``get_last_modified``."""
+    lookup = view.lookup_url_kwarg or view.lookup_field
+    queryset = view.get_queryset().filter(**{view.lookup_field: kwargs[lookup]})
+    if hasattr(view, 'get_last_modified'):
+        last_modified = view.get_last_modified(queryset)
+    else:
+        last_modified = queryset.values_list('updated_at', flat=True).first()
+    return _timestamp(last_modified), kwargs[lookup]
+
+
+def conditional_response(*families, detail=False):
+    """
+    Answer GETs with ETag/Last-Modified validators and 304 when they still match.
+
+    Place it above ``cache_response`` so a revalidation never reaches the
+    response cache or the view. Views whose payload varies per user define
+    ``get_etag_variant(request)`` to fold that state into the ETag.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET':
+                return func(self, request, *args, **kwargs)
+
+            versions = '.'.join(f'{family}{get_catalog_version(family)}' for family in families)
+            url = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+            key = f'catalog:validators:{versions}:{url}'
+            validators = cache.get(key)
+            if validators is None:
+                if detail:
+                    last_modified, identity = detail_validators(self, request, **kwargs)
+                else:
+                    last_modified, identity = list_validators(self, request)
+                if last_modified is None and detail:
+                    # Unknown object; let the view produce its 404.
+                    return func(self, request, *args, **kwargs)
+                digest = hashlib.md5(f'{url}|{versions}|{last_modified}|{identity}'.encode('utf-8')).hexdigest()
+                validators = (quote_etag(digest), last_modified)
+                cache.set(key, validators, settings.CATALOG_CACHE_TIMEOUT)
+            etag, last_modified = validators
+            if hasattr(self, 'get_etag_variant'):
+                # Per-user parts of the payload (e.g. wishlist flags) must change the ETag too.
+                variant = self.get_etag_variant(request)
+                if variant:
+                    etag = quote_etag(hashlib.md5(f'{etag}|{variant}'.encode('utf-8')).hexdigest())
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = func(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,157 @@
+"""
+Responsive derivatives of product images.
+
+Each ``ProductImage`` is rendered to every size of ``image_sizes()``
+(thumbnail, card, detail; from the ``PRODUCT_*_WIDTH/HEIGHT`` settings)
+in WebP and JPEG, stored as
+``derivatives/<original name>/<size>-<WxH>-<options hash>.<ext>`` so their
+URLs follow from the original's name without a lookup. The files are served
+as immutable, so any change to a box or to the encoder options yields new
+names; re-render with ``generate_image_derivatives --all`` after one.
+Rendering runs after the saving transaction commits, on a small
+per-process thread pool (``PRODUCT_IMAGE_WORKERS``; 0 renders inline),
+and ``derivatives_ready`` is set once every file exists. Until then the
+serializers expose only the original. The
+``generate_image_derivatives`` command backfills existing media.
+"""
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from PIL import Image, ImageOps
+
+from .caching import bump_catalog_version
+from .listings import refresh_listings
+from .models import ProductImage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+# format key: (Pillow format, file extension, save options)
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Bump when the resize pipeline itself changes (crop, resampling, colour mode).
+RENDER_VERSION = 1
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def image_sizes():
+    """Derivative sizes as ``{name: (width, height)}``, smallest first."""
+    return {
+        'thumbnail': (settings.PRODUCT_THUMBNAIL_WIDTH, settings.PRODUCT_THUMBNAIL_HEIGHT),
+        'card': (settings.PRODUCT_CARD_WIDTH, settings.PRODUCT_CARD_HEIGHT),
+        'detail': (settings.PRODUCT_IMAGE_WIDTH, settings.PRODUCT_IMAGE_HEIGHT),
+    }
+
+
+def render_digest(image_format):
+    """Short hash of everything besides the box that shapes a derivative's bytes."""
+    pillow_format, _, options = FORMATS[image_format]
+    recipe = repr((RENDER_VERSION, pillow_format, sorted(options.items())))
+    return hashlib.sha256(recipe.encode('utf-8')).hexdigest()[:8]
+
+
+def derivative_name(name, size, image_format):
+    # Box and options are part of the name, so changing either never reuses a URL.
+    width, height = image_sizes()[size]
+    stem = os.path.splitext(name)[0]
+    return f'derivatives/{stem}/{size}-{width}x{height}-{render_digest(image_format)}.{FORMATS[image_format][1]}'
+
+
+def render_derivatives(name):
+    """Write every size and format of the stored image ``name``; returns the number of files."""
+    with default_storage.open(name, 'rb') as handle:
+        with Image.open(handle) as original:
+            original = ImageOps.exif_transpose(original).convert('RGB')
+    written = 0
+    for size, box in image_sizes().items():
+        # Crop to the exact box so srcset widths are true widths.
+        resized = ImageOps.fit(original, box, Image.LANCZOS)
+        for image_format, (pillow_format, _, options) in FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, pillow_format, **options)
+            target = derivative_name(name, size, image_format)
+            # Names are deterministic; replace rather than let storage pick a new one.
+            default_storage.delete(target)
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+            written += 1
+    return written
+
+
+def _render(name):
+    try:
+        render_derivatives(name)
+        return name
+    except (OSError, ValueError):
+        logger.warning('Could not render derivatives of %s', name, exc_info=True)
+        return None
+
+
+def generate_derivatives(image_ids, workers=1):
+    """Render the derivatives of ``image_ids`` and mark them ready; returns images rendered."""
+    images = list(ProductImage.objects.filter(pk__in=image_ids).exclude(image='').only(
+        'pk', 'image', 'product_id', 'is_primary'
+    ))
+    # Content-addressed files are shared between products; render each once.
+    names = list(dict.fromkeys(image.image.name for image in images))
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            rendered = set(filter(None, executor.map(_render, names)))
+    else:
+        rendered = set(filter(None, map(_render, names)))
+    images = [image for image in images if image.image.name in rendered]
+    if not images:
+        return 0
+    # update() skips the post_save receiver, which would schedule these again.
+    ProductImage.objects.filter(pk__in=[image.pk for image in images]).update(derivatives_ready=True)
+    refresh_listings([image.product_id for image in images if image.is_primary])
+    bump_catalog_version('products')
+    return len(images)
+
+
+def _run_in_background(image_ids):
+    try:
+        generate_derivatives(image_ids)
+    except Exception:
+        logger.exception('Derivative generation failed for images %s', image_ids)
+    finally:
+        connection.close()
+
+
+def schedule_derivatives(image_ids):
+    """Render derivatives off the request path (inline when PRODUCT_IMAGE_WORKERS is 0)."""
+    global _executor
+    image_ids = list(image_ids)
+    workers = getattr(settings, 'PRODUCT_IMAGE_WORKERS', DEFAULT_WORKERS)
+    if not workers:
+        generate_derivatives(image_ids)
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-derivatives')
+    _executor.submit(_run_in_background, image_ids)
+
+
+def image_set(name, request):
+    """Absolute URLs of every derivative of ``name`` plus a srcset per format."""
+    sizes = {}
+    srcset = {image_format: [] for image_format in FORMATS}
+    for size, (width, _) in image_sizes().items():
+        sizes[size] = {}
+        for image_format in FORMATS:
+            url = request.build_absolute_uri(default_storage.url(derivative_name(name, size, image_format)))
+            sizes[size][image_format] = url
+            srcset[image_format].append(f'{url} {width}w')
+    return {'sizes': sizes, 'srcset': {image_format: ', '.join(urls) for image_format, urls in srcset.items()}}
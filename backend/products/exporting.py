@@ -0,0 +1,201 @@
+"""
+Streaming catalog export as CSV, JSONL or a Google Shopping style XML feed.
+
+Products are read with ``.iterator(chunk_size=...)``, so only one chunk
+of rows, plus that chunk's prefetched images, attribute values and
+variants, is in memory at a time. Each writer is a generator of text
+pieces that can feed a StreamingHttpResponse or a (compressed) file.
+CSV and JSONL use the same layout ``import_products`` reads, so an
+export can be imported again.
+"""
+import csv
+import json
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Prefetch
+
+from .importing import ATTRIBUTE_PREFIX
+from .models import Product, ProductAttribute, ProductAttributeValue, ProductImage, ProductVariant
+
+CHUNK_SIZE = 500
+
+CSV_COLUMNS = [
+    'sku', 'product_sku', 'name', 'category', 'brand', 'short_description', 'description',
+    'price', 'sale_price', 'is_on_sale', 'is_featured', 'is_active', 'is_default',
+    'availability', 'warranty_info', 'stock', 'image',
+]
+
+# Product.availability -> Google Shopping g:availability
+FEED_AVAILABILITY = {
+    'in_stock': 'in_stock',
+    'limited_stock': 'in_stock',
+    'out_of_stock': 'out_of_stock',
+    'pre_order': 'preorder',
+    'back_order': 'backorder',
+}
+
+
+def export_queryset(active_only=False):
+    """Products with everything the exporters read, prefetched per iterator chunk."""
+    products = Product.objects.select_related('category', 'brand', 'inventory').prefetch_related(
+        Prefetch('images', queryset=ProductImage.objects.order_by('-is_primary', 'created_at')),
+        Prefetch('attribute_values', queryset=ProductAttributeValue.objects.select_related('attribute')),
+        Prefetch(
+            'variants',
+            queryset=ProductVariant.objects.select_related('inventory').prefetch_related('attribute_values__attribute'),
+        ),
+    ).order_by('pk')
+    if active_only:
+        products = products.active()
+    return products.iterator(chunk_size=CHUNK_SIZE)
+
+
+def _stock(obj):
+    inventory = getattr(obj, 'inventory', None)
+    return inventory.quantity if inventory is not None else None
+
+
+def _attributes(obj):
+    return {value.attribute.name: value.value for value in obj.attribute_values.all()}
+
+
+def _images(product, base_url):
+    return [base_url + image.image.url for image in product.images.all()]
+
+
+def _decimal(value):
+    return str(value) if value is not None else None
+
+
+def product_record(product, base_url=''):
+    """A product as the JSON object ``import_products`` accepts, plus its image URLs."""
+    return {
+        'sku': product.sku,
+        'name': product.name,
+        'category': product.category.name,
+        'brand': product.brand.name,
+        'short_description': product.short_description,
+        'description': product.description,
+        'price': _decimal(product.price),
+        'sale_price': _decimal(product.sale_price),
+        'is_on_sale': product.is_on_sale,
+        'is_featured': product.is_featured,
+        'is_active': product.is_active,
+        'availability': product.availability,
+        'warranty_info': product.warranty_info,
+        'stock': _stock(product),
+        'attributes': _attributes(product),
+        'images': _images(product, base_url),
+        'variants': [
+            {
+                'sku': variant.sku,
+                'name': variant.name,
+                'price': _decimal(variant.price),
+                'sale_price': _decimal(variant.sale_price),
+                'is_on_sale': variant.is_on_sale,
+                'is_default': variant.is_default,
+                'is_active': variant.is_active,
+                'stock': _stock(variant),
+                'attributes': _attributes(variant),
+            }
+            for variant in product.variants.all()
+        ],
+    }
+
+
+def export_jsonl(base_url=''):
+    for product in export_queryset():
+        yield json.dumps(product_record(product, base_url), ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(base_url=''):
+    attribute_names = list(ProductAttribute.objects.order_by('name').values_list('name', flat=True))
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS + [ATTRIBUTE_PREFIX + name for name in attribute_names])
+
+    def row(values, attributes):
+        return writer.writerow(
+            [values.get(column, '') for column in CSV_COLUMNS] +
+            [attributes.get(name, '') for name in attribute_names]
+        )
+
+    for product in export_queryset():
+        record = product_record(product, base_url)
+        variants = record.pop('variants')
+        record['image'] = record.pop('images')[0] if record['images'] else ''
+        yield row({key: '' if value is None else value for key, value in record.items()}, record['attributes'])
+        for variant in variants:
+            variant['product_sku'] = product.sku
+            yield row({key: '' if value is None else value for key, value in variant.items()}, variant['attributes'])
+
+
+def _feed_item(values):
+    parts = ['<item>']
+    for tag, value in values:
+        if value not in (None, ''):
+            parts.append(f'<{tag}>{escape(str(value))}</{tag}>')
+    parts.append('</item>\n')
+    return ''.join(parts)
+
+
+def export_xml_feed(base_url=''):
+    """Google Shopping style RSS feed of active products; each active variant is its own item."""
+    currency = getattr(settings, 'CATALOG_FEED_CURRENCY', 'USD')
+    storefront = getattr(settings, 'STOREFRONT_URL', base_url).rstrip('/')
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0">\n<channel>\n'
+        f'<title>{escape(getattr(settings, "ADMIN_SITE_TITLE", "Product feed"))}</title>\n'
+        f'<link>{escape(storefront)}</link>\n'
+    )
+
+    def price(value):
+        return f'{value} {currency}' if value is not None else None
+
+    for product in export_queryset(active_only=True):
+        images = _images(product, base_url)
+        common = [
+            ('g:brand', product.brand.name),
+            ('g:product_type', product.category.name),
+            ('g:condition', 'new'),
+            ('link', f'{storefront}/products/{product.slug}'),
+            ('g:image_link', images[0] if images else None),
+        ] + [('g:additional_image_link', image) for image in images[1:10]]
+        variants = [variant for variant in product.variants.all() if variant.is_active]
+        if not variants:
+            yield _feed_item([
+                ('g:id', product.sku),
+                ('title', product.name),
+                ('description', product.short_description or product.description),
+                ('g:availability', FEED_AVAILABILITY.get(product.availability, 'in_stock')),
+                ('g:price', price(product.price)),
+                ('g:sale_price', price(product.sale_price) if product.is_on_sale else None),
+            ] + common)
+            continue
+        for variant in variants:
+            stock = _stock(variant)
+            yield _feed_item([
+                ('g:id', variant.sku),
+                ('g:item_group_id', product.sku),
+                ('title', f'{product.name} - {variant.name}'),
+                ('description', product.short_description or product.description),
+                ('g:availability', 'out_of_stock' if stock == 0 else FEED_AVAILABILITY.get(product.availability, 'in_stock')),
+                ('g:price', price(variant.price)),
+                ('g:sale_price', price(variant.sale_price) if variant.is_on_sale else None),
+            ] + common)
+    yield '</channel>\n</rss>\n'
+
+
+EXPORTERS = {
+    'csv': (export_csv, 'text/csv'),
+    'jsonl': (export_jsonl, 'application/x-ndjson'),
+    'xml': (export_xml_feed, 'application/xml'),
+}
@@ -0,0 +1,179 @@
+"""
+Faceted attribute filtering over an in-process bitmap index.
+
+For every ``(attribute, value)`` pair the index keeps a bitmap (a Python
+int with bit ``product_id`` set) of the active products carrying it,
+either directly through ``ProductAttributeValue`` or through one of their
+active variants' ``VariantAttributeValue`` rows. Filters and facet counts
+for a result set are then bitwise ANDs/ORs and popcounts in one pass
+instead of one EAV join per facet and one GROUP BY per attribute. The
+list's category, brand, featured and availability filters have bitmaps
+too, so the result set only has to be read from the database when
+another filter (price range, search) is active.
+
+The index is rebuilt off the request path when the catalog changes (see
+``caching.VersionedIndex``), so facets may trail a write by one rebuild;
+the matched ids are always intersected with the live SQL filters.
+"""
+import json
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import ValidationError
+
+from .caching import VersionedIndex
+from .models import ProductAttributeValue, ProductListing, VariantAttributeValue
+
+
+def ids_to_bitmap(ids):
+    """Pack product ids into an int bitmap in O(n + max_id / 8)."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for pk in ids:
+        buffer[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def bitmap_to_ids(bitmap):
+    """Unpack an int bitmap into a sorted list of product ids."""
+    ids = []
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            ids.append((index << 3) + low.bit_length() - 1)
+            byte ^= low
+    return ids
+
+
+def id_filter(ids):
+    """
+    ``Q(pk__in=ids)`` with the ids bound as one parameter.
+
+    A plain ``__in`` binds a variable per id, and SQLite refuses a
+    statement with more than 32766 of them, which a broad filter over a
+    large catalog easily matches.
+    """
+    ids = list(ids)
+    if connection.vendor == 'sqlite':
+        return Q(pk__in=RawSQL('SELECT value FROM json_each(%s)', [json.dumps(ids)]))
+    if connection.vendor == 'postgresql':
+        return Q(pk__in=RawSQL('SELECT unnest(%s::bigint[])', [ids]))
+    return Q(pk__in=ids)
+
+
+def parse_attr_filters(params):
+    """Turn ``['RAM:16GB', 'RAM:32GB', 'Storage:512GB']`` into ``{'RAM': {...}, ...}``."""
+    filters = defaultdict(set)
+    for param in params:
+        attribute, sep, value = param.partition(':')
+        if not sep or not attribute.strip() or not value.strip():
+            raise ValidationError({'attr': f'Expected "Attribute:Value", got "{param}".'})
+        filters[attribute.strip()].add(value.strip())
+    return dict(filters)
+
+
+class FacetResult:
+    def __init__(self, bitmap, facets):
+        self.bitmap = bitmap
+        self.facets = facets
+
+    @property
+    def product_ids(self):
+        return bitmap_to_ids(self.bitmap)
+
+
+class FacetIndex:
+    """Per-(attribute, value) bitmaps over active products."""
+
+    # ProductFilter filters answered from ``fields``.
+    FIELDS = ('category', 'brand', 'is_featured', 'availability')
+
+    def __init__(self, postings, products=0, fields=None):
+        # {attribute: {value: bitmap}}
+        self.postings = postings
+        # Every listed product, and {filter: {value: bitmap}} over them
+        self.products = products
+        self.fields = fields or {}
+
+    @classmethod
+    def build(cls):
+        listed = defaultdict(lambda: defaultdict(list))
+        products = []
+        for product_id, *values in ProductListing.objects.values_list('product_id', *cls.FIELDS).iterator(chunk_size=5000):
+            products.append(product_id)
+            for name, value in zip(cls.FIELDS, values):
+                listed[name][value].append(product_id)
+
+        ids = defaultdict(lambda: defaultdict(list))
+        product_values = ProductAttributeValue.objects.filter(
+            product__is_active=True
+        ).values_list('attribute__name', 'value', 'product_id')
+        variant_values = VariantAttributeValue.objects.filter(
+            variant__is_active=True, variant__product__is_active=True
+        ).values_list('attribute__name', 'value', 'variant__product_id')
+        for rows in (product_values, variant_values):
+            for attribute, value, product_id in rows.iterator(chunk_size=5000):
+                ids[attribute][value].append(product_id)
+        def bitmaps(groups):
+            return {key: {value: ids_to_bitmap(pks) for value, pks in values.items()} for key, values in groups.items()}
+
+        return cls(bitmaps(ids), ids_to_bitmap(products), bitmaps(listed))
+
+    def filter(self, filters):
+        """Listed products matching ``{field: value}`` for fields of ``FIELDS``."""
+        bitmap = self.products
+        for name, value in filters.items():
+            bitmap &= self.fields.get(name, {}).get(value, 0)
+        return bitmap
+
+    def match(self, attribute, values):
+        """Products having any of ``values`` for ``attribute``."""
+        bitmap = 0
+        for value in values:
+            bitmap |= self.postings.get(attribute, {}).get(value, 0)
+        return bitmap
+
+    def query(self, base, filters):
+        """
+        Intersect the ``base`` bitmap with ``filters`` and count every facet value.
+
+        Values of one attribute are ORed and attributes are ANDed. Counts
+        for an attribute ignore that attribute's own filter, so selecting
+        ``RAM:16GB`` still shows how many results ``RAM:32GB`` would give.
+        """
+        matches = {attribute: self.match(attribute, values) for attribute, values in filters.items()}
+
+        result = base
+        for bitmap in matches.values():
+            result &= bitmap
+
+        facets = []
+        for attribute in sorted(self.postings):
+            mask = base
+            for other, bitmap in matches.items():
+                if other != attribute:
+                    mask &= bitmap
+            selected = filters.get(attribute, set())
+            values = []
+            for value, bitmap in self.postings[attribute].items():
+                count = (bitmap & mask).bit_count()
+                if count or value in selected:
+                    values.append({'value': value, 'count': count, 'selected': value in selected})
+            if values:
+                values.sort(key=lambda item: (-item['count'], item['value']))
+                facets.append({'attribute': attribute, 'values': values})
+        return FacetResult(result, facets)
+
+
+# Cached list responses carry facets, so they go when a rebuilt index lands.
+_index = VersionedIndex('facet index', FacetIndex.build, ('catalog', 'attributes'), invalidates=('products',))
+
+
+def get_facet_index():
+    """Return this process's facet index (see ``caching.VersionedIndex``)."""
+    return _index.get()
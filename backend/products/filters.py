@@ -0,0 +1,18 @@
+import django_filters
+
+
+class ProductFilter(django_filters.FilterSet):
+    """
+    Filters for the product list.
+
+    The filters are declared without a model so the same set applies to
+    both ``ProductListing`` (list) and ``Product`` (detail lookups); both
+    carry the indexed ``effective_price`` column the price range uses.
+    """
+
+    category = django_filters.NumberFilter()
+    brand = django_filters.NumberFilter()
+    is_featured = django_filters.BooleanFilter()
+    availability = django_filters.CharFilter()
+    min_price = django_filters.NumberFilter(field_name='effective_price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='effective_price', lookup_expr='lte')
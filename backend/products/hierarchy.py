@@ -0,0 +1,84 @@
+"""
+Maintenance of the CategoryClosure table.
+
+Inserting a category copies its parent's ancestor rows one level deeper.
+Moving a category detaches its subtree from the old ancestors and links
+every (new ancestor, subtree member) pair, so both cost one read of the
+affected paths and one bulk write, independent of the rest of the tree.
+"""
+from django.db import transaction
+
+from .models import Category, CategoryClosure
+
+
+def insert_category(category):
+    """Add closure rows for a newly created (leaf) category."""
+    rows = [CategoryClosure(ancestor_id=category.pk, descendant_id=category.pk, depth=0)]
+    if category.parent_id:
+        rows += [
+            CategoryClosure(ancestor_id=ancestor_id, descendant_id=category.pk, depth=depth + 1)
+            for ancestor_id, depth in CategoryClosure.objects.filter(
+                descendant_id=category.parent_id
+            ).values_list('ancestor_id', 'depth')
+        ]
+    CategoryClosure.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def move_category(category):
+    """Relink ``category`` and its subtree under its current parent."""
+    subtree = list(
+        CategoryClosure.objects.filter(ancestor_id=category.pk).values_list('descendant_id', 'depth')
+    )
+    if not subtree:
+        # Category predates the closure table; treat it as new.
+        insert_category(category)
+        return
+    subtree_ids = [descendant_id for descendant_id, _ in subtree]
+    with transaction.atomic():
+        CategoryClosure.objects.filter(descendant_id__in=subtree_ids).exclude(
+            ancestor_id__in=subtree_ids
+        ).delete()
+        if category.parent_id:
+            ancestors = CategoryClosure.objects.filter(
+                descendant_id=category.parent_id
+            ).values_list('ancestor_id', 'depth')
+            CategoryClosure.objects.bulk_create([
+                CategoryClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=up + down + 1)
+                for ancestor_id, up in ancestors
+                for descendant_id, down in subtree
+            ])
+
+
+def is_descendant(category, candidate):
+    """Whether ``candidate`` lies in ``category``'s subtree (itself included)."""
+    return CategoryClosure.objects.filter(ancestor=category, descendant=candidate).exists()
+
+
+def rebuild_closure():
+    """Recompute the whole closure table from ``Category.parent``; returns the number of rows."""
+    parents = dict(Category.objects.values_list('pk', 'parent_id'))
+    rows = []
+    for pk in parents:
+        ancestor_id, depth = pk, 0
+        seen = set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append(CategoryClosure(ancestor_id=ancestor_id, descendant_id=pk, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    with transaction.atomic():
+        CategoryClosure.objects.all().delete()
+        CategoryClosure.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def build_tree(categories):
+    """Nest ``categories`` (ordered as they should be listed) under their parents."""
+    nodes = {
+        category.pk: {'id': category.pk, 'name': category.name, 'slug': category.slug, 'children': []}
+        for category in categories
+    }
+    roots = []
+    for category in categories:
+        parent = nodes.get(category.parent_id)
+        (parent['children'] if parent else roots).append(nodes[category.pk])
+    return roots
@@ -0,0 +1,160 @@
+"""
+Concurrent, content-addressed ingestion of product images.
+
+``ingest_images`` takes ``{product: [location, ...]}`` where a location
+is an http(s) URL or a local file path. Every distinct location is
+fetched once, on a bounded thread pool; files are stored under the
+SHA-256 of their bytes (products.storage), so identical images shared by many products (or
+served from different URLs) land on disk once. The ``ProductImage``
+rows are then written with ``bulk_create``; since bulk writes skip the
+model signals, the affected listing rows are refreshed and derivatives
+scheduled here.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from io import BytesIO
+from urllib.parse import urljoin, urlsplit
+from urllib.request import Request, urlopen
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image
+
+from .caching import bump_catalog_version
+from .derivatives import schedule_derivatives
+from .listings import refresh_listings
+from .models import ProductImage
+
+WORKERS = 8
+TIMEOUT = 10
+BATCH_SIZE = 500
+UPLOAD_TO = 'products/'
+USER_AGENT = 'laptop-store-image-ingest/1.0'
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp', 'GIF': '.gif'}
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
+
+
+@dataclass
+class IngestResult:
+    """Counters of one ingestion run."""
+
+    fetched: int = 0
+    bytes_fetched: int = 0
+    files_stored: int = 0
+    files_reused: int = 0
+    images_created: int = 0
+    elapsed: float = 0.0
+    failures: dict = field(default_factory=dict)
+
+    @property
+    def images_per_second(self):
+        return self.fetched / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def megabytes_per_second(self):
+        return self.bytes_fetched / 1e6 / self.elapsed if self.elapsed else 0.0
+
+
+def is_url(location):
+    return urlsplit(location).scheme in ('http', 'https')
+
+
+def rebase_url(url, base):
+    """Point ``url`` at a stand-in server: keep its path, swap scheme and host for ``base``."""
+    return urljoin(base.rstrip('/') + '/', urlsplit(url).path.lstrip('/'))
+
+
+def list_directory(path):
+    """Image files directly under ``path``, in a stable order."""
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if os.path.splitext(name)[1].lower() in IMAGE_SUFFIXES
+    )
+
+
+def fetch(location, timeout=TIMEOUT):
+    """Return the bytes at an http(s) URL or local path."""
+    if is_url(location):
+        with urlopen(Request(location, headers={'User-Agent': USER_AGENT}), timeout=timeout) as response:
+            return response.read()
+    with open(location, 'rb') as handle:
+        return handle.read()
+
+
+def image_storage():
+    return ProductImage._meta.get_field('image').storage
+
+
+def content_name(data):
+    """Storage name for ``data``: its SHA-256 plus the extension of its real image format."""
+    with Image.open(BytesIO(data)) as image:
+        image_format = image.format
+        image.verify()
+    if image_format not in EXTENSIONS:
+        raise ValueError(f'Unsupported image format {image_format}')
+    return image_storage().hashed_name(f'{UPLOAD_TO}image{EXTENSIONS[image_format]}', ContentFile(data))
+
+
+def store(data, result):
+    """Save ``data`` under its content name unless an identical file is already stored."""
+    name = content_name(data)
+    storage = image_storage()
+    if storage.exists(name):
+        result.files_reused += 1
+        return name
+    saved = storage.save(name, ContentFile(data))
+    result.files_stored += 1
+    return saved
+
+
+def ingest_images(assignments, workers=WORKERS, timeout=TIMEOUT, batch_size=BATCH_SIZE):
+    """
+    Fetch, dedupe and attach images; ``assignments`` maps products to locations.
+
+    The first location of each product becomes its primary image, replacing
+    any primary it already had, as ``ProductImage.save`` does. Locations
+    that fail to fetch or decode are recorded in ``result.failures`` and
+    skipped; the product's remaining images are still attached.
+    """
+    result = IngestResult()
+    started = time.monotonic()
+    locations = list(dict.fromkeys(
+        location for product_locations in assignments.values() for location in product_locations
+    ))
+    names = {}
+    # Storage writes stay on this thread, so content-hash dedupe needs no lock.
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fetch, location, timeout): location for location in locations}
+        for future in as_completed(futures):
+            location = futures[future]
+            try:
+                data = future.result()
+                result.fetched += 1
+                result.bytes_fetched += len(data)
+                names[location] = store(data, result)
+            except Exception as e:
+                result.failures[location] = str(e)
+
+    images = []
+    for product, product_locations in assignments.items():
+        stored = [names[location] for location in product_locations if location in names]
+        for position, name in enumerate(stored):
+            images.append(ProductImage(
+                product=product, image=name, is_primary=position == 0,
+                alt_text=f'{product.name} - Image {position + 1}',
+            ))
+    with transaction.atomic():
+        ProductImage.objects.filter(
+            product_id__in=[image.product_id for image in images if image.is_primary], is_primary=True,
+        ).update(is_primary=False)
+        ProductImage.objects.bulk_create(images, batch_size=batch_size)
+        refresh_listings([image.product_id for image in images])
+        # bulk_create skips the receiver that renders derivatives.
+        transaction.on_commit(lambda: schedule_derivatives([image.pk for image in images]))
+    if images:
+        bump_catalog_version('products')
+    result.images_created = len(images)
+    result.elapsed = time.monotonic() - started
+    return result
@@ -0,0 +1,468 @@
+"""
+Streaming bulk import of products, variants, attribute values and stock.
+
+Input is read one record at a time from CSV or JSONL and written in
+fixed-size chunks. Each chunk is one transaction doing a handful of set-based
+statements: one SELECT per lookup, ``bulk_create``/``bulk_update`` for
+products and variants, and upserts for attribute values and inventory.
+Brands, categories and attributes are resolved through in-memory name
+maps. Memory is bounded by the chunk size and the capped error report,
+not by the file size.
+
+Rows are validated against the column lengths, and a new brand or
+category whose slug matches an existing one is reported rather than
+created. A chunk the database still rejects is split in halves and
+retried until the offending rows are isolated and reported one by one.
+
+Bulk writes bypass model signals, so each chunk refreshes its listing
+rows and search index entries itself and the catalog versions are bumped
+once at the end.
+
+JSONL: one product per line, with optional ``attributes`` ({name: value}),
+``stock`` and ``variants`` (a list of objects with the same keys).
+
+CSV: one product or variant per row. Variant rows name their product in
+``product_sku``; ``attr:<Name>`` columns carry attribute values.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .caching import bump_catalog_version
+from .listings import refresh_listings
+from .models import (
+    Brand, Category, Inventory, Product, ProductAttribute, ProductAttributeValue,
+    ProductVariant, VariantAttributeValue,
+)
+from .search import get_search_backend
+
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+ATTRIBUTE_PREFIX = 'attr:'
+
+PRODUCT_FIELDS = [
+    'name', 'category_id', 'brand_id', 'short_description', 'description', 'price',
+    'sale_price', 'is_on_sale', 'is_featured', 'is_active', 'availability', 'warranty_info',
+]
+VARIANT_FIELDS = ['product_id', 'name', 'price', 'sale_price', 'is_on_sale', 'is_default', 'is_active']
+AVAILABILITY_VALUES = {value for value, _ in Product.AVAILABILITY_CHOICES}
+
+
+class RowError(ValueError):
+    """A record that cannot be imported; reported with its line number."""
+
+
+class ImportResult:
+    """Counters and a capped list of per-row errors."""
+
+    def __init__(self, max_errors=MAX_REPORTED_ERRORS):
+        self.max_errors = max_errors
+        self.products_created = 0
+        self.products_updated = 0
+        self.variants_created = 0
+        self.variants_updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'error': str(message)})
+
+    def as_dict(self):
+        return {
+            'products_created': self.products_created,
+            'products_updated': self.products_updated,
+            'variants_created': self.variants_created,
+            'variants_updated': self.variants_updated,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+# Parsing
+
+def _max_length(model, field):
+    return model._meta.get_field(field).max_length
+
+
+def _text(record, key, required=False, default='', max_length=None):
+    value = record.get(key)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f'"{key}" is required')
+    if max_length and len(value) > max_length:
+        raise RowError(f'"{key}" is longer than {max_length} characters')
+    return value or default
+
+
+def _decimal(record, key, required=False):
+    value = _text(record, key, required)
+    if not value:
+        return None
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise RowError(f'"{key}" is not a number: {value!r}')
+    if number < 0 or number >= Decimal('1e8'):
+        raise RowError(f'"{key}" is out of range: {value!r}')
+    return number.quantize(Decimal('0.01'))
+
+
+def _bool(record, key, default=False):
+    value = record.get(key)
+    if isinstance(value, bool):
+        return value
+    value = _text(record, key).lower()
+    if not value:
+        return default
+    if value in ('1', 'true', 'yes', 'y'):
+        return True
+    if value in ('0', 'false', 'no', 'n'):
+        return False
+    raise RowError(f'"{key}" is not a boolean: {value!r}')
+
+
+def _stock(record):
+    value = _text(record, 'stock')
+    if not value:
+        return None
+    try:
+        stock = int(value)
+    except ValueError:
+        raise RowError(f'"stock" is not an integer: {value!r}')
+    if stock < 0:
+        raise RowError('"stock" cannot be negative')
+    return stock
+
+
+def _attributes(record):
+    attributes = record.get('attributes') or {}
+    if not isinstance(attributes, dict):
+        raise RowError('"attributes" must be an object')
+    attributes = {str(name).strip(): str(value).strip() for name, value in attributes.items() if str(value).strip()}
+    name_length, value_length = _max_length(ProductAttribute, 'name'), _max_length(ProductAttributeValue, 'value')
+    for name, value in attributes.items():
+        if len(name) > name_length:
+            raise RowError(f'attribute names cannot be longer than {name_length} characters')
+        if len(value) > value_length:
+            raise RowError(f'value of attribute {name!r} is longer than {value_length} characters')
+    return attributes
+
+
+def clean_product(record):
+    availability = _text(record, 'availability', default='in_stock')
+    if availability not in AVAILABILITY_VALUES:
+        raise RowError(f'"availability" must be one of {sorted(AVAILABILITY_VALUES)}')
+    return {
+        'sku': _text(record, 'sku', required=True, max_length=_max_length(Product, 'sku')),
+        'name': _text(record, 'name', required=True, max_length=_max_length(Product, 'name')),
+        'category': _text(record, 'category', required=True, max_length=_max_length(Category, 'name')),
+        'brand': _text(record, 'brand', required=True, max_length=_max_length(Brand, 'name')),
+        'short_description': _text(record, 'short_description'),
+        'description': _text(record, 'description'),
+        'price': _decimal(record, 'price', required=True),
+        'sale_price': _decimal(record, 'sale_price'),
+        'is_on_sale': _bool(record, 'is_on_sale'),
+        'is_featured': _bool(record, 'is_featured'),
+        'is_active': _bool(record, 'is_active', default=True),
+        'availability': availability,
+        'warranty_info': _text(record, 'warranty_info', max_length=_max_length(Product, 'warranty_info')),
+        'attributes': _attributes(record),
+        'stock': _stock(record),
+    }
+
+
+def clean_variant(record):
+    return {
+        'sku': _text(record, 'sku', required=True, max_length=_max_length(ProductVariant, 'sku')),
+        'product_sku': _text(record, 'product_sku', required=True),
+        'name': _text(record, 'name', required=True, max_length=_max_length(ProductVariant, 'name')),
+        'price': _decimal(record, 'price', required=True),
+        'sale_price': _decimal(record, 'sale_price'),
+        'is_on_sale': _bool(record, 'is_on_sale'),
+        'is_default': _bool(record, 'is_default'),
+        'is_active': _bool(record, 'is_active', default=True),
+        'attributes': _attributes(record),
+        'stock': _stock(record),
+    }
+
+
+def iter_jsonl(stream):
+    """Yield ``(line, record)``; a product's variants follow it as their own records."""
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as exc:
+            yield line, RowError(f'invalid JSON: {exc}')
+            continue
+        if not isinstance(record, dict):
+            yield line, RowError('expected a JSON object')
+            continue
+        variants = record.pop('variants', None) or []
+        yield line, record
+        for variant in variants:
+            if isinstance(variant, dict):
+                variant.setdefault('product_sku', record.get('sku'))
+                yield line, variant
+            else:
+                yield line, RowError('variants must be JSON objects')
+
+
+def iter_csv(stream):
+    """Yield ``(line, record)`` with ``attr:<Name>`` columns folded into ``attributes``."""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        record = {'attributes': {}}
+        for column, value in row.items():
+            if column is None:
+                continue
+            if column.startswith(ATTRIBUTE_PREFIX):
+                record['attributes'][column[len(ATTRIBUTE_PREFIX):].strip()] = value or ''
+            else:
+                record[column.strip()] = value
+        yield reader.line_num, record
+
+
+READERS = {'csv': iter_csv, 'jsonl': iter_jsonl}
+
+
+# Writing
+
+class ProductImporter:
+    """Import records chunk by chunk; see the module docstring for the formats."""
+
+    def __init__(self, chunk_size=CHUNK_SIZE, dry_run=False, max_errors=MAX_REPORTED_ERRORS):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.result = ImportResult(max_errors)
+        self.names = {
+            Category: dict(Category.objects.values_list('name', 'pk')),
+            Brand: dict(Brand.objects.values_list('name', 'pk')),
+            ProductAttribute: dict(ProductAttribute.objects.values_list('name', 'pk')),
+        }
+        # Brand and category slugs are unique and derived from the name.
+        self.slugs = {
+            Category: dict(Category.objects.values_list('slug', 'name')),
+            Brand: dict(Brand.objects.values_list('slug', 'name')),
+        }
+        # Names created by the chunk in progress, forgotten if it rolls back.
+        self.new_names = []
+
+    def run(self, stream, format):
+        chunk = []
+        for line, record in READERS[format](stream):
+            if isinstance(record, RowError):
+                self.result.add_error(line, record)
+                continue
+            chunk.append((line, record))
+            if len(chunk) >= self.chunk_size:
+                self.write_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.write_chunk(chunk)
+        if not self.dry_run and (self.result.products_created or self.result.products_updated or
+                                 self.result.variants_created or self.result.variants_updated):
+            bump_catalog_version('catalog', 'products', 'attributes')
+        return self.result
+
+    def resolve(self, model, name):
+        """Primary key of the brand/category/attribute called ``name``, creating it if needed."""
+        names = self.names[model]
+        if name not in names:
+            if model in self.slugs:
+                slug = slugify(name)
+                if not slug:
+                    raise RowError(f'{model._meta.verbose_name} {name!r} has no usable slug')
+                if slug in self.slugs[model]:
+                    raise RowError(
+                        f'{model._meta.verbose_name} {name!r} has the same slug as {self.slugs[model][slug]!r}'
+                    )
+                self.slugs[model][slug] = name
+            names[name] = model.objects.create(name=name).pk
+            self.new_names.append((model, name))
+        return names[name]
+
+    def write_chunk(self, chunk):
+        rows = []
+        for line, record in chunk:
+            try:
+                if record.get('product_sku'):
+                    rows.append((line, clean_variant(record)))
+                else:
+                    rows.append((line, clean_product(record)))
+            except RowError as exc:
+                self.result.add_error(line, exc)
+        self.write_rows(rows)
+
+    def write_rows(self, rows):
+        """Write cleaned ``rows`` in one transaction, bisecting them if the database rejects it."""
+        if not rows:
+            return
+        counts, errors = {}, []
+        try:
+            with transaction.atomic():
+                product_ids = self.write_products(
+                    [(line, row) for line, row in rows if 'product_sku' not in row], counts, errors
+                )
+                product_ids |= self.write_variants(
+                    [(line, row) for line, row in rows if 'product_sku' in row], counts, errors
+                )
+                if product_ids:
+                    refresh_listings(product_ids, create=True)
+                    get_search_backend().index_products(Product.objects.filter(pk__in=product_ids))
+                if self.dry_run:
+                    transaction.set_rollback(True)
+        except DatabaseError as exc:
+            self.forget_new_names()
+            if len(rows) == 1:
+                self.result.add_error(rows[0][0], f'rejected by the database: {exc}')
+                return
+            # Halves keep their order, so products still precede their variants.
+            middle = len(rows) // 2
+            self.write_rows(rows[:middle])
+            self.write_rows(rows[middle:])
+            return
+        if self.dry_run:
+            self.forget_new_names()
+        self.new_names = []
+        for line, message in errors:
+            self.result.add_error(line, message)
+        for key, value in counts.items():
+            setattr(self.result, key, getattr(self.result, key) + value)
+
+    def forget_new_names(self):
+        for model, name in self.new_names:
+            self.names[model].pop(name, None)
+            if model in self.slugs:
+                self.slugs[model].pop(slugify(name), None)
+        self.new_names = []
+
+    def write_products(self, rows, counts, errors):
+        # The last record of a SKU within a chunk wins.
+        rows = {row['sku']: (line, row) for line, row in rows}
+        if not rows:
+            return set()
+        existing = Product.objects.in_bulk(list(rows), field_name='sku')
+        new_slugs = {sku: slugify(row['name']) for sku, (_, row) in rows.items() if sku not in existing}
+        taken = set(Product.objects.filter(slug__in=new_slugs.values()).values_list('slug', flat=True))
+
+        now = timezone.now()
+        to_create, to_update, valid = [], [], {}
+        for sku, (line, row) in rows.items():
+            values = {field: row[field] for field in PRODUCT_FIELDS if field in row}
+            try:
+                values['category_id'] = self.resolve(Category, row['category'])
+                values['brand_id'] = self.resolve(Brand, row['brand'])
+            except RowError as exc:
+                errors.append((line, exc))
+                continue
+            product = existing.get(sku)
+            if product is None:
+                slug = new_slugs[sku]
+                if slug in taken:
+                    slug = slugify(f"{row['name']}-{sku}")
+                taken.add(slug)
+                product = Product(sku=sku, slug=slug, **values)
+                to_create.append(product)
+            else:
+                for field, value in values.items():
+                    setattr(product, field, value)
+                # bulk_update() does not apply auto_now.
+                product.updated_at = now
+                to_update.append(product)
+            valid[sku] = (product, row)
+
+        Product.objects.bulk_create(to_create, batch_size=self.chunk_size)
+        Product.objects.bulk_update(to_update, PRODUCT_FIELDS + ['updated_at'], batch_size=self.chunk_size)
+        counts['products_created'] = len(to_create)
+        counts['products_updated'] = len(to_update)
+
+        self.write_attribute_values(
+            ProductAttributeValue, 'product', [(product.pk, row) for product, row in valid.values()]
+        )
+        self.write_stock('product', [(product.pk, row) for product, row in valid.values()])
+        return {product.pk for product, _ in valid.values()}
+
+    def write_variants(self, rows, counts, errors):
+        rows = {row['sku']: (line, row) for line, row in rows}
+        if not rows:
+            return set()
+        parents = dict(Product.objects.filter(
+            sku__in={row['product_sku'] for _, row in rows.values()}
+        ).values_list('sku', 'pk'))
+        existing = ProductVariant.objects.in_bulk(list(rows), field_name='sku')
+
+        now = timezone.now()
+        to_create, to_update, valid = [], [], []
+        for sku, (line, row) in rows.items():
+            product_id = parents.get(row['product_sku'])
+            if product_id is None:
+                errors.append((line, f'unknown product_sku {row["product_sku"]!r}'))
+                continue
+            values = {field: row[field] for field in VARIANT_FIELDS if field in row}
+            values['product_id'] = product_id
+            variant = existing.get(sku)
+            if variant is None:
+                variant = ProductVariant(sku=sku, **values)
+                to_create.append(variant)
+            else:
+                for field, value in values.items():
+                    setattr(variant, field, value)
+                variant.updated_at = now
+                to_update.append(variant)
+            valid.append((variant, row))
+
+        ProductVariant.objects.bulk_create(to_create, batch_size=self.chunk_size)
+        ProductVariant.objects.bulk_update(to_update, VARIANT_FIELDS + ['updated_at'], batch_size=self.chunk_size)
+        counts['variants_created'] = len(to_create)
+        counts['variants_updated'] = len(to_update)
+
+        self.write_attribute_values(
+            VariantAttributeValue, 'variant', [(variant.pk, row) for variant, row in valid]
+        )
+        self.write_stock('variant', [(variant.pk, row) for variant, row in valid])
+        return {variant.product_id for variant, _ in valid}
+
+    def write_attribute_values(self, model, owner, rows):
+        values = [
+            model(**{f'{owner}_id': pk}, attribute_id=self.resolve(ProductAttribute, name), value=value)
+            for pk, row in rows
+            for name, value in row['attributes'].items()
+        ]
+        model.objects.bulk_create(
+            values, batch_size=self.chunk_size, update_conflicts=True,
+            unique_fields=[owner, 'attribute'], update_fields=['value'],
+        )
+
+    def write_stock(self, owner, rows):
+        inventory = [
+            Inventory(**{f'{owner}_id': pk}, quantity=row['stock'])
+            for pk, row in rows if row['stock'] is not None
+        ]
+        Inventory.objects.bulk_create(
+            inventory, batch_size=self.chunk_size, update_conflicts=True,
+            unique_fields=[owner], update_fields=['quantity', 'last_checked'],
+        )
+
+
+def detect_format(filename):
+    """Guess the import format from a file name; ``None`` when unknown."""
+    name = filename.lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+def import_products(stream, format, chunk_size=CHUNK_SIZE, dry_run=False, max_errors=MAX_REPORTED_ERRORS):
+    """Import a CSV or JSONL text stream; returns an ImportResult."""
+    importer = ProductImporter(chunk_size=chunk_size, dry_run=dry_run, max_errors=max_errors)
+    return importer.run(stream, format)
@@ -0,0 +1,155 @@
+"""
+Maintenance of the ProductListing read model.
+
+``refresh_listings`` recomputes listing rows for a set of products in a
+constant number of queries: one annotated SELECT over the source tables,
+one bulk write and one DELETE for products that are no longer active.
+Child-row signals only update existing rows (``create=False``), so a
+cascading product delete cannot resurrect the listing it just removed.
+Stock counts are available units: on hand minus held by checkout
+reservations (see products.stock).
+"""
+from django.db import transaction
+from django.db.models import F, IntegerField, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Inventory, Product, ProductImage, ProductListing, ProductVariant
+
+CHUNK_SIZE = 1000
+
+AVAILABLE = Greatest(F('quantity') - F('reserved'), Value(0))
+
+LISTING_FIELDS = [
+    'name', 'slug', 'sku', 'category', 'category_name', 'category_slug',
+    'brand', 'brand_name', 'brand_slug', 'short_description', 'price',
+    'sale_price', 'is_on_sale', 'effective_price', 'price_min', 'price_max',
+    'discount_percentage',
+    'primary_image', 'primary_image_derivatives', 'is_featured', 'availability', 'stock_quantity',
+    'in_stock', 'rating_avg', 'rating_count', 'created_at', 'updated_at',
+]
+
+
+def _aggregate(queryset, product_ref, **annotation):
+    """Correlated per-product aggregate, usable as a Subquery."""
+    (name, expression), = annotation.items()
+    return Subquery(
+        queryset.filter(**{product_ref: OuterRef('pk')}).order_by()
+        .values(product_ref).annotate(**{name: expression}).values(name)[:1]
+    )
+
+
+def annotate_listing_sources(queryset):
+    """Annotate products with everything a listing row needs, in one SELECT."""
+    return queryset.select_related('brand', 'category').annotate(
+        primary_image_name=Subquery(
+            ProductImage.objects.filter(product=OuterRef('pk'), is_primary=True)
+            .order_by('created_at').values('image')[:1]
+        ),
+        primary_image_derivatives=Subquery(
+            ProductImage.objects.filter(product=OuterRef('pk'), is_primary=True)
+            .order_by('created_at').values('derivatives_ready')[:1]
+        ),
+        product_stock=Coalesce(
+            Subquery(
+                Inventory.objects.filter(product=OuterRef('pk')).annotate(available=AVAILABLE).values('available')[:1]
+            ),
+            Value(0), output_field=IntegerField(),
+        ),
+        variant_stock=Coalesce(
+            _aggregate(
+                Inventory.objects.filter(variant__is_active=True), 'variant__product',
+                total=Sum(AVAILABLE),
+            ),
+            Value(0), output_field=IntegerField(),
+        ),
+        variant_price_min=_aggregate(
+            ProductVariant.objects.filter(is_active=True), 'product', low=Min('effective_price')
+        ),
+        variant_price_max=_aggregate(
+            ProductVariant.objects.filter(is_active=True), 'product', high=Max('effective_price')
+        ),
+    )
+
+
+def build_listing(product):
+    stock = product.product_stock + product.variant_stock
+    return ProductListing(
+        product=product,
+        name=product.name,
+        slug=product.slug,
+        sku=product.sku,
+        category=product.category,
+        category_name=product.category.name,
+        category_slug=product.category.slug,
+        brand=product.brand,
+        brand_name=product.brand.name,
+        brand_slug=product.brand.slug,
+        short_description=product.short_description,
+        price=product.price,
+        sale_price=product.sale_price,
+        is_on_sale=product.is_on_sale,
+        effective_price=product.effective_price,
+        price_min=product.variant_price_min if product.variant_price_min is not None else product.effective_price,
+        price_max=product.variant_price_max if product.variant_price_max is not None else product.effective_price,
+        discount_percentage=product.discount_percentage,
+        primary_image=product.primary_image_name or '',
+        primary_image_derivatives=bool(product.primary_image_derivatives),
+        is_featured=product.is_featured,
+        availability=product.availability,
+        stock_quantity=stock,
+        in_stock=stock > 0,
+        rating_avg=product.rating_avg,
+        rating_count=product.rating_count,
+        created_at=product.created_at,
+        # bulk_update() does not apply auto_now.
+        updated_at=timezone.now(),
+    )
+
+
+def refresh_listings(product_ids, create=False):
+    """
+    Recompute the listing rows of ``product_ids``.
+
+    With ``create=True`` missing rows are inserted (used when the product
+    itself is saved); otherwise only existing rows are updated. Rows of
+    products that are gone or inactive are deleted either way.
+    """
+    product_ids = list(set(product_ids))
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        chunk = product_ids[start:start + CHUNK_SIZE]
+        products = annotate_listing_sources(Product.objects.active().filter(pk__in=chunk))
+        listings = [build_listing(product) for product in products]
+        if create:
+            ProductListing.objects.bulk_create(
+                listings, update_conflicts=True,
+                unique_fields=['product'], update_fields=LISTING_FIELDS,
+            )
+        elif len(listings) == 1:
+            # A plain UPDATE is much cheaper to compile than bulk_update's CASE chains.
+            listing = listings[0]
+            ProductListing.objects.filter(pk=listing.pk).update(
+                **{field: getattr(listing, field) for field in LISTING_FIELDS}
+            )
+        elif listings:
+            ProductListing.objects.bulk_update(listings, LISTING_FIELDS)
+        active_ids = {listing.product_id for listing in listings}
+        stale = [pk for pk in chunk if pk not in active_ids]
+        if stale:
+            ProductListing.objects.filter(product_id__in=stale).delete()
+
+
+def rebuild_listings(chunk_size=CHUNK_SIZE):
+    """Rebuild every listing row; returns the number of active products."""
+    ProductListing.objects.exclude(product__is_active=True).delete()
+    ids = Product.objects.active().order_by('pk').values_list('pk', flat=True)
+    total = 0
+    last_pk = 0
+    while True:
+        chunk = list(ids.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return total
+        with transaction.atomic():
+            refresh_listings(chunk, create=True)
+        total += len(chunk)
+        last_pk = chunk[-1]
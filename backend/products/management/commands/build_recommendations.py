@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from products.recommendations import build_recommendations, TOP_K
+
+
+class Command(BaseCommand):
+    help = 'Build item-to-item product recommendations from co-views and co-purchases'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=TOP_K, help='Neighbours stored per product')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Building product recommendations...')
+        
+        count = build_recommendations(k=options['top_k'])
+        
+        self.stdout.write(self.style.SUCCESS(f'Stored {count} product recommendations'))
@@ -0,0 +1,30 @@
+import gzip
+
+from django.core.management.base import BaseCommand
+from products.exporting import EXPORTERS
+
+
+class Command(BaseCommand):
+    help = 'Export the catalog as gzip-compressed CSV, JSONL or a Google Shopping XML feed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Output file (".gz" is appended when compressing)')
+        parser.add_argument('--format', choices=sorted(EXPORTERS), default='jsonl', help='Output format')
+        parser.add_argument('--base-url', default='', help='Prefix for image URLs, e.g. https://shop.example.com')
+        parser.add_argument('--no-compress', action='store_true', help='Write plain text instead of gzip')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        compress = not options['no_compress']
+        if compress and not path.endswith('.gz'):
+            path += '.gz'
+        exporter, _ = EXPORTERS[options['format']]
+        
+        self.stdout.write(f'Exporting products to {path}...')
+        
+        opener = gzip.open if compress else open
+        with opener(path, 'wt', encoding='utf-8', newline='') as output:
+            for piece in exporter(options['base_url'].rstrip('/')):
+                output.write(piece)
+        
+        self.stdout.write(self.style.SUCCESS(f'Exported products to {path}'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from products.derivatives import DEFAULT_WORKERS, generate_derivatives
+from products.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Render thumbnail, card and detail sizes (WebP and JPEG) of product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-render images that already have derivatives')
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Images rendered in parallel')
+        parser.add_argument('--batch-size', type=int, default=100, help='Images marked ready per query')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rendering product image derivatives...')
+        
+        images = ProductImage.objects.exclude(image='')
+        if not options['all']:
+            images = images.filter(derivatives_ready=False)
+        ids = list(images.order_by('pk').values_list('pk', flat=True))
+        
+        rendered = 0
+        batch_size = options['batch_size']
+        for start in range(0, len(ids), batch_size):
+            rendered += generate_derivatives(ids[start:start + batch_size], workers=options['workers'])
+            self.stdout.write(f'Rendered {rendered} of {len(ids)} images')
+        
+        self.stdout.write(self.style.SUCCESS(f'Rendered derivatives of {rendered} images'))
@@ -2,18 +2,31 @@ import os
 import random
 import time
 from decimal import Decimal
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.utils.text import slugify
 from products.models import (
     Category, Brand, Product, ProductImage, 
     ProductAttribute, ProductAttributeValue,
     ProductVariant, VariantAttributeValue, Inventory
 )
+from products.synthetic import generate, BATCH_SIZE
 
 class Command(BaseCommand):
     help = 'Generate realistic laptop data for the store'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=int, metavar='PRODUCTS',
+            help='Generate a deterministic load-testing dataset of this many products (plus users, orders, ...)',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for --scale')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows per bulk insert for --scale')
+
     def handle(self, *args, **kwargs):
+        if kwargs.get('scale'):
+            self._generate_scale(kwargs['scale'], kwargs['seed'], kwargs['batch_size'])
+            return
+        
         self.stdout.write('Starting to generate laptop data...')
         
         # Create or get laptop category
@@ -36,6 +49,16 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.SUCCESS('Successfully generated laptop data!'))
         
+    def _generate_scale(self, products, seed, batch_size):
+        """Bulk-generate a production-shaped dataset for benchmarking."""
+        self.stdout.write(f'Generating synthetic data for {products} products (seed {seed})...')
+        started = time.monotonic()
+        try:
+            generate(products, seed=seed, batch_size=batch_size, log=self.stdout.write)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Generated synthetic data in {time.monotonic() - started:.1f}s'))
+        
     def _create_brands(self):
         """Create laptop brands if they don't exist"""
         brand_data = [
@@ -1,10 +1,8 @@
 import os
 import random
-import requests
-from io import BytesIO
-from django.core.management.base import BaseCommand
-from django.core.files.base import ContentFile
-from products.models import Product, ProductImage
+from django.core.management.base import BaseCommand, CommandError
+from products.image_ingest import WORKERS, TIMEOUT, ingest_images, is_url, list_directory, rebase_url
+from products.models import Product
 
 # List of laptop image URLs from Unsplash
 LAPTOP_IMAGES = [
@@ -50,60 +48,62 @@ BRAND_IMAGES = {
 class Command(BaseCommand):
     help = 'Generate images for laptop products'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            help='Local directory of images, or base URL of a server standing in for images.unsplash.com',
+        )
+        parser.add_argument('--workers', type=int, default=WORKERS, help='Concurrent downloads')
+        parser.add_argument('--timeout', type=float, default=TIMEOUT, help='Per-download timeout in seconds')
+        parser.add_argument('--seed', type=int, help='Random seed for picking images')
+
+    def handle(self, *args, **options):
         self.stdout.write('Starting to generate laptop images...')
         
-        products = Product.objects.filter(category__name='Laptops')
+        # Products that already have images are left alone.
+        products = Product.objects.filter(
+            category__name='Laptops', images__isnull=True
+        ).select_related('brand').order_by('pk')
         
         if not products.exists():
-            self.stdout.write(self.style.WARNING('No laptop products found. Run generate_laptop_data command first.'))
+            self.stdout.write(self.style.WARNING(
+                'No laptop products without images found. Run generate_laptop_data command first.'
+            ))
             return
-            
-        self.stdout.write(f'Found {products.count()} laptop products')
         
+        source = options['source']
+        local_images = None
+        if source and not is_url(source):
+            if not os.path.isdir(source):
+                raise CommandError(f'{source} is neither a directory nor an http(s) URL')
+            local_images = list_directory(source)
+            if not local_images:
+                raise CommandError(f'No images found in {source}')
+        
+        rng = random.Random(options['seed'])
+        assignments = {}
         for product in products:
-            self.add_images_to_product(product)
-            
-        self.stdout.write(self.style.SUCCESS('Successfully generated laptop images!'))
-    
-    def add_images_to_product(self, product):
-        # Check if product already has images
-        if ProductImage.objects.filter(product=product).exists():
-            self.stdout.write(f'Product {product.name} already has images, skipping...')
-            return
-            
-        # Get brand-specific images if available, otherwise use general images
-        brand_name = product.brand.name
-        image_urls = BRAND_IMAGES.get(brand_name, LAPTOP_IMAGES)
+            # Get brand-specific images if available, otherwise use general images
+            if local_images is not None:
+                candidates = local_images
+            else:
+                candidates = list(dict.fromkeys(BRAND_IMAGES.get(product.brand.name, LAPTOP_IMAGES)))
+                if source:
+                    candidates = [rebase_url(url, source) for url in candidates]
+            # Add 3-5 images to the product
+            assignments[product] = rng.sample(candidates, min(rng.randint(3, 5), len(candidates)))
+        
+        self.stdout.write(f'Found {len(assignments)} laptop products')
         
-        # Shuffle the image URLs to get random ones
-        random.shuffle(image_urls)
+        result = ingest_images(assignments, workers=options['workers'], timeout=options['timeout'])
         
-        # Add 3-5 images to the product
-        num_images = random.randint(3, 5)
-        for i in range(min(num_images, len(image_urls))):
-            image_url = image_urls[i]
-            is_primary = (i == 0)  # First image is primary
-            
-            try:
-                # Download the image
-                response = requests.get(image_url, timeout=10)
-                response.raise_for_status()
-                
-                # Generate a filename
-                filename = f"{product.slug}_{i+1}.jpg"
-                
-                # Create the ProductImage
-                image = ProductImage(
-                    product=product,
-                    is_primary=is_primary,
-                    alt_text=f"{product.name} - Image {i+1}"
-                )
-                
-                # Save the image file
-                image.image.save(filename, ContentFile(response.content), save=True)
-                
-                self.stdout.write(f'Added image {i+1} to {product.name}')
-                
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'Error adding image to {product.name}: {str(e)}'))
+        for location, error in result.failures.items():
+            self.stdout.write(self.style.ERROR(f'Error fetching {location}: {error}'))
+        self.stdout.write(
+            f'Fetched {result.fetched} images ({result.bytes_fetched / 1e6:.1f} MB) in {result.elapsed:.1f}s: '
+            f'{result.images_per_second:.1f} images/s, {result.megabytes_per_second:.2f} MB/s; '
+            f'{result.files_stored} files stored, {result.files_reused} already present'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully generated {result.images_created} laptop images!'
+        ))
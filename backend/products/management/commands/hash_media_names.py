@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from products.caching import bump_catalog_version
+from products.derivatives import generate_derivatives
+from products.listings import refresh_listings
+from products.models import Brand, Category, ProductImage
+from products.storage import is_hashed
+
+# (model, file field) pairs stored with ContentHashedStorage
+HASHED_FIELDS = [(Category, 'image'), (Brand, 'logo'), (ProductImage, 'image')]
+
+
+class Command(BaseCommand):
+    help = 'Rename media stored before content hashing to content-hashed names'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete-originals', action='store_true',
+            help='Delete the old files once no row refers to them',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Renaming media to content-hashed names...')
+        
+        renamed_images = []
+        for model, field_name in HASHED_FIELDS:
+            storage = model._meta.get_field(field_name).storage
+            rows = model.objects.exclude(**{f'{field_name}__isnull': True}).exclude(**{field_name: ''})
+            originals = set()
+            renamed = 0
+            for pk, name in rows.order_by('pk').values_list('pk', field_name).iterator():
+                if is_hashed(name):
+                    continue
+                if not storage.exists(name):
+                    self.stdout.write(self.style.WARNING(f'{model.__name__} {pk}: {name} is missing, skipped'))
+                    continue
+                with storage.open(name, 'rb') as handle:
+                    # The storage names the copy after its content (and reuses an identical one).
+                    hashed = storage.save(name, handle)
+                updates = {field_name: hashed}
+                if model is ProductImage:
+                    updates['derivatives_ready'] = False
+                    renamed_images.append(pk)
+                # update() keeps the save signals from rendering derivatives one by one.
+                model.objects.filter(pk=pk).update(**updates)
+                originals.add(name)
+                renamed += 1
+            if options['delete_originals']:
+                in_use = set(model.objects.filter(**{f'{field_name}__in': originals}).values_list(field_name, flat=True))
+                for name in originals - in_use:
+                    storage.delete(name)
+            self.stdout.write(f'{model.__name__}.{field_name}: renamed {renamed} files')
+        
+        if renamed_images:
+            # Derivatives live under the original's name, so they move with it.
+            rendered = generate_derivatives(renamed_images)
+            refresh_listings(ProductImage.objects.filter(pk__in=renamed_images).values_list('product_id', flat=True))
+            self.stdout.write(f'Rendered derivatives of {rendered} images')
+        bump_catalog_version('catalog', 'products', 'brands', 'categories')
+        
+        self.stdout.write(self.style.SUCCESS('Media now uses content-hashed names'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.importing import import_products, detect_format, CHUNK_SIZE, MAX_REPORTED_ERRORS
+
+
+class Command(BaseCommand):
+    help = 'Stream products, variants, attribute values and stock from a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Records per transaction')
+        parser.add_argument('--max-errors', type=int, default=MAX_REPORTED_ERRORS, help='Row errors to report')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Validate and write each chunk, then roll it back (chunks are checked independently)',
+        )
+
+    def handle(self, *args, **options):
+        format = options['format'] or detect_format(options['path'])
+        if format is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format csv or --format jsonl')
+        
+        self.stdout.write(f"Importing products from {options['path']}{' (dry run)' if options['dry_run'] else ''}...")
+        
+        with open(options['path'], encoding='utf-8', newline='') as stream:
+            result = import_products(
+                stream, format, chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'], max_errors=options['max_errors'],
+            )
+        
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        if result.error_count > len(result.errors):
+            self.stderr.write(f'... and {result.error_count - len(result.errors)} more errors')
+        
+        summary = (
+            f'Products: {result.products_created} created, {result.products_updated} updated; '
+            f'variants: {result.variants_created} created, {result.variants_updated} updated; '
+            f'{result.error_count} errors'
+        )
+        style = self.style.WARNING if result.error_count else self.style.SUCCESS
+        self.stdout.write(style(summary))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from products.hierarchy import rebuild_closure
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the category closure table from category parent links'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding category closure table...')
+        
+        count = rebuild_closure()
+        
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} category closure rows'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from products.listings import rebuild_listings, CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized ProductListing read model from the catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Products per bulk write')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding product listings...')
+        
+        count = rebuild_listings(chunk_size=options['chunk_size'])
+        
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} product listings'))
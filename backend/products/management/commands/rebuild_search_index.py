@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from products.models import Product
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index in bulk'
+
+    def handle(self, *args, **kwargs):
+        backend = get_search_backend()
+        self.stdout.write(f'Rebuilding search index with {backend.__class__.__name__}...')
+        
+        with transaction.atomic():
+            backend.rebuild()
+        
+        count = Product.objects.active().count()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} active products'))
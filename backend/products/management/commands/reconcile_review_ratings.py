@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from products.ratings import reconcile_ratings, CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Recompute product rating aggregates from approved reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Products per batch')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Reconciling review rating aggregates...')
+        
+        fixed = reconcile_ratings(chunk_size=options['chunk_size'])
+        
+        self.stdout.write(self.style.SUCCESS(f'Corrected rating aggregates on {fixed} products'))
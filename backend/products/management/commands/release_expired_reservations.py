@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from products.stock import SWEEP_BATCH_SIZE, reconcile_reserved, release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Return the stock held by expired checkout reservations and reconcile the reserved counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE, help='Reservations per transaction')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Releasing expired reservations...')
+        
+        count = release_expired_reservations(batch_size=options['batch_size'])
+        fixed = reconcile_reserved()
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Released {count} expired reservations, reconciled {fixed} reserved counters'
+        ))
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+FTS_TABLE_SQL = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts USING fts5(
+    name, sku, brand_name, category_name, short_description, description,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+'''
+
+
+def create_search_index(apps, schema_editor):
+    # The FTS5 index only exists on SQLite; other databases use the
+    # fallback search backend (see products.search).
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(FTS_TABLE_SQL)
+    schema_editor.execute(
+        '''
+        INSERT INTO products_product_fts
+            (rowid, name, sku, brand_name, category_name, short_description, description)
+        SELECT p.id, p.name, p.sku, b.name, c.name, p.short_description, p.description
+        FROM products_product p
+        JOIN products_brand b ON b.id = p.brand_id
+        JOIN products_category c ON c.id = p.category_id
+        WHERE p.is_active
+        '''
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS products_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
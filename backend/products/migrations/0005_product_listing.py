@@ -0,0 +1,121 @@
+# Generated by Django 5.2 on 2026-10-17 07:21
+
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+
+
+def populate_listings(apps, schema_editor):
+    # Mirrors products.listings.build_listing against the models as they
+    # stand at this migration; rebuild_product_listings recomputes the rows
+    # with the current builder.
+    Product = apps.get_model('products', 'Product')
+    ProductImage = apps.get_model('products', 'ProductImage')
+    Inventory = apps.get_model('products', 'Inventory')
+    Review = apps.get_model('products', 'Review')
+    ProductListing = apps.get_model('products', 'ProductListing')
+
+    primary_images = {}
+    for product_id, image in (
+        ProductImage.objects.filter(is_primary=True)
+        .order_by('-created_at').values_list('product_id', 'image')
+    ):
+        # Descending, so the oldest primary image wins as in build_listing.
+        primary_images[product_id] = image
+    stock = Counter()
+    for product_id, variant_product_id, quantity in (
+        Inventory.objects.filter(Q(product__isnull=False) | Q(variant__is_active=True))
+        .values_list('product_id', 'variant__product_id', 'quantity')
+    ):
+        stock[product_id or variant_product_id] += quantity
+    ratings = {
+        row['product']: row
+        for row in Review.objects.filter(is_approved=True).order_by()
+        .values('product').annotate(avg=Avg('rating'), count=Count('pk'))
+    }
+
+    now = timezone.now()
+    rows = []
+    for product in Product.objects.filter(is_active=True).select_related('category', 'brand').iterator():
+        on_sale = product.is_on_sale and product.sale_price
+        current_price = product.sale_price if on_sale else product.price
+        discount = 0
+        if on_sale and product.price > 0:
+            discount = round((product.price - product.sale_price) / product.price * 100, 2)
+        rating = ratings.get(product.pk, {})
+        rows.append(ProductListing(
+            product=product,
+            name=product.name,
+            slug=product.slug,
+            sku=product.sku,
+            category=product.category,
+            category_name=product.category.name,
+            category_slug=product.category.slug,
+            brand=product.brand,
+            brand_name=product.brand.name,
+            brand_slug=product.brand.slug,
+            short_description=product.short_description,
+            price=product.price,
+            sale_price=product.sale_price,
+            is_on_sale=product.is_on_sale,
+            current_price=current_price,
+            discount_percentage=discount,
+            primary_image=primary_images.get(product.pk, ''),
+            is_featured=product.is_featured,
+            availability=product.availability,
+            stock_quantity=stock[product.pk],
+            in_stock=stock[product.pk] > 0,
+            rating_avg=round(rating.get('avg') or 0, 2),
+            rating_count=rating.get('count', 0),
+            created_at=product.created_at,
+            updated_at=now,
+        ))
+    ProductListing.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductListing',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing', serialize=False, to='products.product')),
+                ('name', models.CharField(max_length=255)),
+                ('slug', models.SlugField(max_length=280)),
+                ('sku', models.CharField(max_length=50)),
+                ('category_name', models.CharField(max_length=100)),
+                ('category_slug', models.SlugField(max_length=120)),
+                ('brand_name', models.CharField(max_length=100)),
+                ('brand_slug', models.SlugField(max_length=120)),
+                ('short_description', models.TextField(blank=True)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('sale_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('is_on_sale', models.BooleanField(default=False)),
+                ('current_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('discount_percentage', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('primary_image', models.ImageField(blank=True, upload_to='products/')),
+                ('is_featured', models.BooleanField(default=False)),
+                ('availability', models.CharField(choices=[('in_stock', 'In Stock'), ('limited_stock', 'Limited Stock'), ('out_of_stock', 'Out of Stock'), ('pre_order', 'Pre-Order'), ('back_order', 'Back-Order')], max_length=20)),
+                ('stock_quantity', models.PositiveIntegerField(default=0)),
+                ('in_stock', models.BooleanField(default=False)),
+                ('rating_avg', models.DecimalField(decimal_places=2, default=0, max_digits=3)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('brand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.brand')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.category')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at', 'product'], name='listing_created_idx'), models.Index(fields=['current_price', 'product'], name='listing_price_idx'), models.Index(fields=['name', 'product'], name='listing_name_idx'), models.Index(fields=['category', 'created_at'], name='listing_category_idx'), models.Index(fields=['brand', 'created_at'], name='listing_brand_idx'), models.Index(fields=['is_featured', 'created_at'], name='listing_featured_idx')],
+            },
+        ),
+        migrations.RunPython(populate_listings, migrations.RunPython.noop),
+    ]
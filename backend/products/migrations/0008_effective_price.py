@@ -0,0 +1,64 @@
+# Generated by Django 5.2 on 2026-10-17 07:39
+
+from django.db import migrations, models
+
+
+def seed_price_range(apps, schema_editor):
+    # Start every range at the product's own price; rebuild_product_listings
+    # widens it to the variants' prices.
+    ProductListing = apps.get_model('products', 'ProductListing')
+    ProductListing.objects.update(price_min=models.F('effective_price'), price_max=models.F('effective_price'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_review_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='productlisting',
+            name='listing_price_idx',
+        ),
+        migrations.RenameField(
+            model_name='productlisting',
+            old_name='current_price',
+            new_name='effective_price',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(is_on_sale=True, sale_price__isnull=False, then=models.F('sale_price')), default=models.F('price')), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='price_max',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='price_min',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='productvariant',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(is_on_sale=True, sale_price__isnull=False, then=models.F('sale_price')), default=models.F('price')), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'effective_price', 'id'], name='product_active_eprice_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['effective_price', 'product'], name='listing_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['product', 'effective_price'], name='variant_effective_price_idx'),
+        ),
+        migrations.RunPython(seed_price_range, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_recently_viewed_buffer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='derivatives_ready',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='primary_image_derivatives',
+            field=models.BooleanField(default=False),
+        ),
+    ]
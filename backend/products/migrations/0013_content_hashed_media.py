@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-17 08:06
+
+import products.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='brand',
+            name='logo',
+            field=models.ImageField(blank=True, null=True, storage=products.storage.ContentHashedStorage(), upload_to='brands/'),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=products.storage.ContentHashedStorage(), upload_to='categories/'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=products.storage.ContentHashedStorage(), upload_to='products/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_listing_price_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventory',
+            name='reserved',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2 on 2026-10-17 09:00
+
+from django.db import migrations, models
+
+
+def effective_price():
+    return models.GeneratedField(
+        db_persist=True,
+        expression=models.Case(models.When(is_on_sale=True, sale_price__gt=0, then=models.F('sale_price')), default=models.F('price')),
+        output_field=models.DecimalField(decimal_places=2, max_digits=10),
+    )
+
+
+def reprice_zero_sales(apps, schema_editor):
+    # Listings copied a zero sale price as what the customer pays. Products
+    # with variants get their range back from rebuild_product_listings.
+    ProductListing = apps.get_model('products', 'ProductListing')
+    affected = ProductListing.objects.filter(is_on_sale=True, sale_price__lte=0)
+    affected.update(effective_price=models.F('price'))
+    affected.exclude(product__variants__is_active=True).update(
+        price_min=models.F('price'), price_max=models.F('price'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_inventory_reserved_not_editable'),
+    ]
+
+    # Generated columns cannot be altered in place; drop and re-add them.
+    operations = [
+        migrations.RemoveIndex(
+            model_name='productvariant',
+            name='variant_effective_price_idx',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='effective_price',
+        ),
+        migrations.RemoveField(
+            model_name='productvariant',
+            name='effective_price',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=effective_price(),
+        ),
+        migrations.AddField(
+            model_name='productvariant',
+            name='effective_price',
+            field=effective_price(),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['product', 'effective_price'], name='variant_effective_price_idx'),
+        ),
+        migrations.RunPython(reprice_zero_sales, migrations.RunPython.noop),
+    ]
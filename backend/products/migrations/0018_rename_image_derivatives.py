@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-17 09:20
+
+from django.db import migrations
+
+
+def reset_derivatives(apps, schema_editor):
+    # Derivative names now carry a hash of the encoder options, so files
+    # rendered under the old names are unreachable. Serve originals until
+    # generate_image_derivatives renders them again.
+    ProductImage = apps.get_model('products', 'ProductImage')
+    ProductListing = apps.get_model('products', 'ProductListing')
+    ProductImage.objects.filter(derivatives_ready=True).update(derivatives_ready=False)
+    ProductListing.objects.filter(primary_image_derivatives=True).update(primary_image_derivatives=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_sale_price_rule'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_derivatives, migrations.RunPython.noop),
+    ]
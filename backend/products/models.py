@@ -1,7 +1,13 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.text import slugify
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth import get_user_model
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .storage import ContentHashedStorage
 
 User = get_user_model()
 
@@ -13,7 +19,7 @@ class Category(models.Model):
     slug = models.SlugField(max_length=120, unique=True, blank=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
     description = models.TextField(blank=True)
-    image = models.ImageField(upload_to='categories/', blank=True, null=True)
+    image = models.ImageField(upload_to='categories/', storage=ContentHashedStorage(), blank=True, null=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -25,10 +31,49 @@ class Category(models.Model):
     def __str__(self):
         return self.name
     
+    def clean(self):
+        # Forms and the admin validate here; the API does the same in CategorySerializer.
+        if self.pk and self.parent_id and CategoryClosure.objects.filter(
+            ancestor_id=self.pk, descendant_id=self.parent_id
+        ).exists():
+            raise ValidationError({'parent': 'A category cannot be moved under its own subtree.'})
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        # Keep the closure rows in the same transaction as the category
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
+    def subtree(self):
+        """Active categories at or below this one, resolved through the closure table."""
+        return Category.objects.filter(
+            is_active=True,
+            pk__in=CategoryClosure.objects.filter(ancestor=self).values('descendant'),
+        )
+
+
+class CategoryClosure(models.Model):
+    """
+    Closure table of the category hierarchy.
+    
+    One row per (ancestor, descendant) pair, including each category paired
+    with itself at depth 0, so a whole subtree is a single indexed lookup on
+    ``ancestor``. Rows are maintained on save (see products/hierarchy.py).
+    """
+    
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+    
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            models.Index(fields=['descendant', 'depth'], name='category_ancestors_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.ancestor} > {self.descendant} ({self.depth})"
 
 
 class Brand(models.Model):
@@ -37,7 +82,7 @@ class Brand(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=120, unique=True, blank=True)
     description = models.TextField(blank=True)
-    logo = models.ImageField(upload_to='brands/', blank=True, null=True)
+    logo = models.ImageField(upload_to='brands/', storage=ContentHashedStorage(), blank=True, null=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -54,6 +99,52 @@ class Brand(models.Model):
         super().save(*args, **kwargs)
 
 
+def effective_price_expression():
+    """
+    SQL for what the customer pays: the sale price while on sale, else the list price.
+
+    A missing or zero sale price does not count; ``current_price`` and
+    ``discount_percentage`` apply the same rule in Python.
+    """
+    return models.Case(
+        models.When(is_on_sale=True, sale_price__gt=0, then=models.F('sale_price')),
+        default=models.F('price'),
+    )
+
+
+def _has_sale_price(item):
+    """Python twin of the condition in ``effective_price_expression``."""
+    return item.is_on_sale and item.sale_price is not None and item.sale_price > 0
+
+
+class ProductQuerySet(models.QuerySet):
+    """Query helpers shared by the product endpoints."""
+    
+    def active(self):
+        return self.filter(is_active=True)
+    
+    def for_listing(self):
+        """Join brand/category and prefetch only the primary image for list serializers."""
+        return self.select_related('category', 'brand').prefetch_related(
+            models.Prefetch(
+                'images',
+                queryset=ProductImage.objects.filter(is_primary=True),
+                to_attr='primary_images',
+            )
+        )
+    
+    def for_detail(self):
+        """Load the whole ProductDetailSerializer tree in a fixed number of queries."""
+        return self.select_related('category', 'brand', 'inventory').prefetch_related(
+            'images',
+            models.Prefetch(
+                'attribute_values',
+                queryset=ProductAttributeValue.objects.select_related('attribute'),
+            ),
+            models.Prefetch('variants', queryset=ProductVariant.objects.for_detail()),
+        )
+
+
 class Product(models.Model):
     """Model for products."""
     
@@ -79,9 +170,25 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     availability = models.CharField(max_length=20, choices=AVAILABILITY_CHOICES, default='in_stock')
     warranty_info = models.CharField(max_length=255, blank=True)
+    # Stored generated column mirroring current_price, so it can be sorted and indexed
+    effective_price = models.GeneratedField(
+        expression=effective_price_expression(),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
+    # Approved-review aggregates, maintained incrementally (see products/ratings.py)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
     
@@ -92,30 +199,53 @@ class Product(models.Model):
         if not self.slug:
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
+        # UPDATE does not return generated columns; reload effective_price on next access
+        self.__dict__.pop('effective_price', None)
     
     @property
     def current_price(self):
         """Return the current price (sale price if on sale, otherwise regular price)."""
-        if self.is_on_sale and self.sale_price:
+        if _has_sale_price(self):
             return self.sale_price
         return self.price
     
     @property
     def discount_percentage(self):
         """Calculate discount percentage if the product is on sale."""
-        if self.is_on_sale and self.sale_price and self.price > 0:
+        if _has_sale_price(self) and self.price > 0:
             discount = ((self.price - self.sale_price) / self.price) * 100
             return round(discount, 2)
         return 0
+    
+    def _variant_prices(self):
+        # Reads the prefetched variants when loaded through for_detail()
+        return [variant.effective_price for variant in self.variants.all() if variant.is_active]
+    
+    @property
+    def price_min(self):
+        """Lowest effective price across active variants, or the product's own price without any."""
+        return min(self._variant_prices(), default=self.effective_price)
+    
+    @property
+    def price_max(self):
+        """Highest effective price across active variants, or the product's own price without any."""
+        return max(self._variant_prices(), default=self.effective_price)
+    
+    @property
+    def rating_histogram(self):
+        """Approved review counts keyed by star rating."""
+        return {star: getattr(self, f'rating_{star}') for star in range(1, 6)}
 
 
 class ProductImage(models.Model):
     """Model for product images."""
     
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='products/')
+    image = models.ImageField(upload_to='products/', storage=ContentHashedStorage())
     alt_text = models.CharField(max_length=255, blank=True)
     is_primary = models.BooleanField(default=False)
+    # Set once the thumbnail/card/detail renditions exist (see products.derivatives)
+    derivatives_ready = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -128,6 +258,9 @@ class ProductImage(models.Model):
         # If this image is being set as primary, unset any other primary images
         if self.is_primary:
             ProductImage.objects.filter(product=self.product, is_primary=True).update(is_primary=False)
+        # A newly uploaded file needs its derivatives rendered again.
+        if self.image and not self.image._committed:
+            self.derivatives_ready = False
         super().save(*args, **kwargs)
 
 
@@ -155,6 +288,19 @@ class ProductAttributeValue(models.Model):
         return f"{self.attribute.name}: {self.value}"
 
 
+class ProductVariantQuerySet(models.QuerySet):
+    """Query helpers for product variants."""
+    
+    def for_detail(self):
+        """Load inventory and attribute names for ProductVariantSerializer."""
+        return self.select_related('inventory').prefetch_related(
+            models.Prefetch(
+                'attribute_values',
+                queryset=VariantAttributeValue.objects.select_related('attribute'),
+            )
+        )
+
+
 class ProductVariant(models.Model):
     """Model for product variants (e.g., different configurations of the same product)."""
     
@@ -166,14 +312,36 @@ class ProductVariant(models.Model):
     is_on_sale = models.BooleanField(default=False)
     is_default = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
+    effective_price = models.GeneratedField(
+        expression=effective_price_expression(),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductVariantQuerySet.as_manager()
+    
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['product', 'effective_price'], name='variant_effective_price_idx'),
+        ]
     
     def __str__(self):
         return f"{self.product.name} - {self.name}"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # UPDATE does not return generated columns; reload effective_price on next access
+        self.__dict__.pop('effective_price', None)
+    
+    @property
+    def current_price(self):
+        """Return the current price (sale price if on sale, otherwise regular price)."""
+        if _has_sale_price(self):
+            return self.sale_price
+        return self.price
 
 
 class VariantAttributeValue(models.Model):
@@ -196,6 +364,8 @@ class Inventory(models.Model):
     product = models.OneToOneField(Product, on_delete=models.CASCADE, null=True, blank=True, related_name='inventory')
     variant = models.OneToOneField(ProductVariant, on_delete=models.CASCADE, null=True, blank=True, related_name='inventory')
     quantity = models.PositiveIntegerField(default=0)
+    # Units held by checkout reservations; maintained by products.stock
+    reserved = models.PositiveIntegerField(default=0, editable=False)
     low_stock_threshold = models.PositiveIntegerField(default=5)
     last_checked = models.DateTimeField(auto_now=True)
     
@@ -207,15 +377,66 @@ class Inventory(models.Model):
             return f"Inventory for {self.product.name}"
         return f"Inventory for {self.variant.product.name} - {self.variant.name}"
     
+    def save(self, *args, **kwargs):
+        # An instance's copy of reserved goes stale as carts hold stock; never write it back.
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'reserved'
+            ]
+        super().save(*args, **kwargs)
+    
     @property
     def is_low_stock(self):
         """Check if the inventory is below the low stock threshold."""
         return self.quantity <= self.low_stock_threshold
     
+    @property
+    def available(self):
+        """Units that can still be sold: on hand minus held by reservations."""
+        return max(0, self.quantity - self.reserved)
+    
     @property
     def is_in_stock(self):
         """Check if the product is in stock."""
-        return self.quantity > 0
+        return self.available > 0
+
+
+class Reservation(models.Model):
+    """Model for stock held for a cart during checkout, until expires_at."""
+    
+    inventory = models.ForeignKey(Inventory, on_delete=models.CASCADE, related_name='reservations')
+    cart = models.ForeignKey('cart.Cart', on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'inventory'], name='unique_cart_reservation'),
+        ]
+        indexes = [
+            # Sweeper scans and per-inventory expiry checks (see products.stock)
+            models.Index(fields=['expires_at'], name='reservation_expiry_idx'),
+            models.Index(fields=['inventory', 'expires_at'], name='reservation_inventory_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.inventory} for cart {self.cart_id}"
+
+
+class ReviewQuerySet(models.QuerySet):
+    """Query helpers for review feeds."""
+    
+    def approved(self):
+        return self.filter(is_approved=True)
+    
+    def pending(self):
+        return self.filter(is_approved=False)
+    
+    def for_feed(self):
+        """Join the author so serializing a page costs no per-row user queries."""
+        return self.select_related('user')
 
 
 class Review(models.Model):
@@ -231,12 +452,29 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ReviewQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         unique_together = ('product', 'user')
+        indexes = [
+            # Per-product approved feed, newest first
+            models.Index(fields=['product', 'is_approved', 'created_at', 'id'], name='review_feed_idx'),
+            # Staff moderation queue
+            models.Index(fields=['is_approved', 'created_at', 'id'], name='review_moderation_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.email}'s review for {self.product.name}"
+    
+    def save(self, *args, **kwargs):
+        # Keep the product's rating aggregates in the same transaction as the review
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
 
 
 class Wishlist(models.Model):
@@ -259,11 +497,278 @@ class RecentlyViewed(models.Model):
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recently_viewed')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
-    viewed_at = models.DateTimeField(auto_now=True)
+    # Set by the view buffer to when the view happened, not when it was flushed
+    viewed_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         unique_together = ('user', 'product')
         ordering = ['-viewed_at']
+        indexes = [
+            models.Index(fields=['user', 'viewed_at'], name='recently_viewed_user_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.email} viewed {self.product.name}"
+
+
+class ProductRecommendation(models.Model):
+    """
+    Precomputed "customers also viewed/bought" neighbours of a product.
+    
+    Holds the top-k most similar products per product, ranked from 1, as
+    built offline by the build_recommendations command.
+    """
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_by')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    
+    class Meta:
+        ordering = ['product', 'rank']
+        unique_together = ('product', 'rank')
+    
+    def __str__(self):
+        return f"{self.product} -> {self.recommended} (#{self.rank})"
+
+
+class ProductListing(models.Model):
+    """
+    Denormalized read model backing the product list endpoints.
+    
+    One row per active product with everything a listing card shows, so
+    list endpoints read a single table with no joins. Rows are kept current
+    by signals on the source models (see products/listings.py).
+    """
+    
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='listing')
+    name = models.CharField(max_length=255)
+    slug = models.SlugField(max_length=280)
+    sku = models.CharField(max_length=50)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    category_name = models.CharField(max_length=100)
+    category_slug = models.SlugField(max_length=120)
+    brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name='+')
+    brand_name = models.CharField(max_length=100)
+    brand_slug = models.SlugField(max_length=120)
+    short_description = models.TextField(blank=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    sale_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    is_on_sale = models.BooleanField(default=False)
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # "From $X" range across active variants (the product's own price without any)
+    price_min = models.DecimalField(max_digits=10, decimal_places=2)
+    price_max = models.DecimalField(max_digits=10, decimal_places=2)
+    discount_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    primary_image = models.ImageField(upload_to='products/', blank=True)
+    primary_image_derivatives = models.BooleanField(default=False)
+    is_featured = models.BooleanField(default=False)
+    availability = models.CharField(max_length=20, choices=Product.AVAILABILITY_CHOICES)
+    stock_quantity = models.PositiveIntegerField(default=0)
+    in_stock = models.BooleanField(default=False)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Composite keys for keyset pagination (see products.pagination)
+            models.Index(fields=['created_at', 'product'], name='listing_created_idx'),
+            models.Index(fields=['effective_price', 'product'], name='listing_price_idx'),
+            models.Index(fields=['price', 'product'], name='listing_list_price_idx'),
+            models.Index(fields=['name', 'product'], name='listing_name_idx'),
+            models.Index(fields=['rating_avg', 'product'], name='listing_rating_idx'),
+            models.Index(fields=['category', 'created_at'], name='listing_category_idx'),
+            models.Index(fields=['brand', 'created_at'], name='listing_brand_idx'),
+            models.Index(fields=['is_featured', 'created_at'], name='listing_featured_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Listing for {self.name}"
+
+# Signal handlers to keep the search index in sync with the catalog
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    """Reindex a product after it is saved (drops it if it became inactive)."""
+    from .search import get_search_backend
+    get_search_backend().index_products(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """Remove a deleted product from the search index."""
+    from .search import get_search_backend
+    get_search_backend().remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def reindex_related_products(sender, instance, **kwargs):
+    """Reindex the products that carry a brand or category name."""
+    from .search import get_search_backend
+    lookup = 'brand' if sender is Brand else 'category'
+    get_search_backend().index_products(Product.objects.filter(**{lookup: instance}))
+
+
+# Version stamps (see products/caching.py) invalidated by writes to each model:
+# 'catalog' feeds the autocomplete/facet indexes, 'attributes' the facet index,
+# and the rest key the cached API responses of each resource family.
+CATALOG_VERSION_FAMILIES = {
+    Product: ('catalog', 'products'),
+    Brand: ('catalog', 'brands', 'products'),
+    Category: ('catalog', 'categories', 'products'),
+    ProductImage: ('products',),
+    ProductVariant: ('attributes', 'products'),
+    ProductAttributeValue: ('attributes', 'products'),
+    VariantAttributeValue: ('attributes', 'products'),
+    Inventory: ('products',),
+    Review: ('products',),
+}
+
+
+def bump_catalog_versions_on_change(sender, instance, **kwargs):
+    """Bump the version stamps that depend on the changed model."""
+    from .caching import bump_catalog_version
+    bump_catalog_version(*CATALOG_VERSION_FAMILIES[sender])
+
+
+for _model in CATALOG_VERSION_FAMILIES:
+    post_save.connect(bump_catalog_versions_on_change, sender=_model)
+    post_delete.connect(bump_catalog_versions_on_change, sender=_model)
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_listing(sender, instance, **kwargs):
+    """Create, update or drop the product's listing row."""
+    from .listings import refresh_listings
+    refresh_listings([instance.pk], create=True)
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def refresh_listing_names(sender, instance, **kwargs):
+    """Copy a renamed brand or category into its products' listing rows."""
+    prefix = 'brand' if sender is Brand else 'category'
+    ProductListing.objects.filter(**{prefix: instance}).update(**{
+        f'{prefix}_name': instance.name,
+        f'{prefix}_slug': instance.slug,
+    })
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def refresh_listing_for_child(sender, instance, **kwargs):
+    """Refresh the listing row of the product a child row belongs to."""
+    from .listings import refresh_listings
+    refresh_listings([instance.product_id])
+
+
+@receiver(post_save, sender=ProductImage)
+def schedule_image_derivatives(sender, instance, **kwargs):
+    """Render the image's responsive sizes once the upload has committed."""
+    from .derivatives import schedule_derivatives
+    if instance.image and not instance.derivatives_ready:
+        transaction.on_commit(lambda: schedule_derivatives([instance.pk]))
+
+
+@receiver(post_save, sender=Inventory)
+@receiver(post_delete, sender=Inventory)
+def refresh_listing_for_inventory(sender, instance, **kwargs):
+    """Refresh the stock status of the product an inventory row belongs to."""
+    from .listings import refresh_listings
+    if instance.product_id:
+        refresh_listings([instance.product_id])
+    elif instance.variant_id:
+        product_id = ProductVariant.objects.filter(pk=instance.variant_id).values_list('product_id', flat=True).first()
+        if product_id:
+            refresh_listings([product_id])
+
+
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_delete, sender=Inventory)
+@receiver(post_save, sender=ProductAttributeValue)
+@receiver(post_delete, sender=ProductAttributeValue)
+@receiver(post_save, sender=VariantAttributeValue)
+@receiver(post_delete, sender=VariantAttributeValue)
+def touch_product(sender, instance, **kwargs):
+    """
+    Bump the parent product's updated_at when a child row it embeds changes
+    without leaving a newer timestamp of its own, so Last-Modified moves.
+    """
+    product_id = getattr(instance, 'product_id', None)
+    if product_id is None and getattr(instance, 'variant_id', None):
+        product_id = ProductVariant.objects.filter(pk=instance.variant_id).values_list('product_id', flat=True).first()
+    if product_id:
+        Product.objects.filter(pk=product_id).update(updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    """Remember what the review contributed to the aggregates before this save."""
+    previous = None
+    if instance.pk:
+        previous = Review.objects.filter(pk=instance.pk).values_list('is_approved', 'rating', 'product_id').first()
+    instance._rating_previous = previous
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, **kwargs):
+    """Apply the review's change in contribution to the product's rating aggregates."""
+    from .ratings import apply_rating_delta
+    previous = getattr(instance, '_rating_previous', None)
+    if previous and previous[0]:
+        removed_product, removed = previous[2], previous[1]
+    else:
+        removed_product, removed = None, None
+    added = instance.rating if instance.is_approved else None
+    if removed_product is not None and removed_product != instance.product_id:
+        apply_rating_delta(removed_product, removed=removed)
+        removed = None
+    apply_rating_delta(instance.product_id, removed=removed, added=added)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    """Withdraw a deleted approved review from the product's rating aggregates."""
+    from .ratings import apply_rating_delta
+    if instance.is_approved:
+        apply_rating_delta(instance.product_id, removed=instance.rating)
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_parent(sender, instance, **kwargs):
+    """Remember the parent before this save to detect moves."""
+    previous = None
+    if instance.pk:
+        previous = Category.objects.filter(pk=instance.pk).values_list('parent_id', flat=True).first()
+    instance._parent_previous = previous
+
+
+@receiver(post_save, sender=Category)
+def update_category_closure(sender, instance, created, **kwargs):
+    """Link a new category under its ancestors, or relink a moved subtree."""
+    from .hierarchy import insert_category, move_category
+    if created:
+        insert_category(instance)
+    elif getattr(instance, '_parent_previous', None) != instance.parent_id:
+        move_category(instance)
+
+
+@receiver(pre_delete, sender='cart.Cart')
+def release_cart_reservations(sender, instance, **kwargs):
+    """Return a deleted cart's held stock before the cascade drops its reservations."""
+    from .stock import release_reservations
+    release_reservations(Reservation.objects.filter(cart=instance))
+
+
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def invalidate_wishlist_ids(sender, instance, **kwargs):
+    """Drop the user's cached wishlist id set."""
+    from .wishlists import invalidate_wishlist
+    invalidate_wishlist(instance.user_id)
@@ -0,0 +1,221 @@
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over an ``(ordering field, pk)`` pair.
+
+    Each page is fetched with a ``WHERE (field, pk) < (last_field, last_pk)``
+    style predicate instead of an OFFSET, so page N costs the same as page 1,
+    and no COUNT(*) is run. The cursor is an opaque base64 token holding the
+    boundary row's key. Subclasses list the orderings clients may request.
+    """
+
+    page_size = api_settings.PAGE_SIZE or 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_param = 'ordering'
+    ordering_fields = ('created_at',)
+    default_ordering = '-created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request)
+        self.model = queryset.model
+
+        cursor = self.decode_cursor(request)
+        self.reverse = bool(cursor and cursor.get('r'))
+        # Walking backwards flips both the comparison and the sort direction.
+        descending = self.descending != self.reverse
+
+        if cursor is not None:
+            queryset = queryset.filter(self.get_seek_filter(cursor, descending))
+
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(prefix + self.field, prefix + 'pk')
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.reverse:
+            results.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = cursor is not None, has_more
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_param, '').strip()
+        if ordering.lstrip('-') not in self.ordering_fields:
+            ordering = self.default_ordering
+        return ordering.lstrip('-'), ordering.startswith('-')
+
+    def get_seek_filter(self, cursor, descending):
+        lookup = 'lt' if descending else 'gt'
+        value, pk = cursor['v'], cursor['pk']
+        return (
+            Q(**{f'{self.field}__{lookup}': value}) |
+            Q(**{self.field: value, f'pk__{lookup}': pk})
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(cursor, dict) or 'v' not in cursor or 'pk' not in cursor:
+            raise NotFound(self.invalid_cursor_message)
+        if cursor.get('o') != self.get_ordering_token():
+            # A cursor minted for another ordering cannot seek this one.
+            raise NotFound(self.invalid_cursor_message)
+        # Cursors come from the client; a tampered value must not reach the query.
+        try:
+            cursor['pk'] = int(cursor['pk'])
+            cursor['v'] = self.parse_cursor_value(cursor['v'])
+        except (TypeError, ValueError, OverflowError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if cursor['v'] is None or not 0 <= cursor['pk'] < 2 ** 63:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def parse_cursor_value(self, value):
+        return self.model._meta.get_field(self.field).to_python(value)
+
+    def encode_cursor(self, obj, reverse=False):
+        value = getattr(obj, self.field)
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        cursor = {'v': value, 'pk': obj.pk, 'o': self.get_ordering_token()}
+        if reverse:
+            cursor['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode('utf-8'))
+        return encoded.decode('ascii')
+
+    def get_ordering_token(self):
+        return ('-' if self.descending else '') + self.field
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(self.page[0], reverse=True)
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ProductKeysetPagination(KeysetPagination):
+    """Keyset pagination for product lists, matching the ProductViewSet ordering fields."""
+
+    ordering_fields = ('created_at', 'price', 'effective_price', 'name', 'rating_avg')
+    default_ordering = '-created_at'
+
+
+class ReviewKeysetPagination(KeysetPagination):
+    """Keyset pagination for review feeds, newest first."""
+
+    ordering_fields = ('created_at',)
+    default_ordering = '-created_at'
+
+
+class SearchPagination(KeysetPagination):
+    """
+    Keyset pagination over relevance-ranked search hits.
+
+    The cursor holds the ``(score, pk)`` of the last hit and the search
+    backend seeks past it, so deep pages stay as cheap as the first one.
+    Relevance feeds only page forwards.
+    """
+
+    def paginate_search(self, backend, query, queryset, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        after = (cursor['v'], cursor['pk']) if cursor else None
+        hits = backend.search(query, limit=self.page_size + 1, after=after)
+        self.has_next = len(hits) > self.page_size
+        hits = hits[:self.page_size]
+
+        products = queryset.in_bulk([pk for pk, _ in hits])
+        self.page = []
+        for pk, score in hits:
+            # Hits can briefly outlive their product; skip those.
+            if pk in products:
+                products[pk].search_score = score
+                self.page.append(products[pk])
+        self.last_hit = hits[-1] if hits else None
+        return self.page
+
+    def parse_cursor_value(self, value):
+        return float(value)
+
+    def get_ordering_token(self):
+        return 'score'
+
+    def get_next_link(self):
+        if not self.has_next or self.last_hit is None:
+            return None
+        pk, score = self.last_hit
+        cursor = {'v': score, 'pk': pk, 'o': self.get_ordering_token()}
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_previous_link(self):
+        return None
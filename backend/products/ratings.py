@@ -0,0 +1,92 @@
+"""
+Incremental review rating aggregates on Product.
+
+Each approved review adds one to ``rating_count`` and to its star's
+``rating_N`` bucket. Approvals, edits and deletes apply the difference
+with ``F()`` expressions in the review's own transaction, and
+``rating_avg`` is then derived from the histogram in SQL. Nothing is
+re-aggregated at read time. ``reconcile_ratings`` recomputes everything
+from the review table, for drift or bulk loads that bypass signals.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, FloatField, Value, When
+from django.db.models.functions import Cast, Now
+
+from .models import Product, Review
+
+STARS = range(1, 6)
+CHUNK_SIZE = 1000
+
+# AVG = sum(star * bucket) / count, computed from the stored histogram.
+RATING_AVG = Case(
+    When(rating_count=0, then=Value(0)),
+    default=Cast(
+        Cast(sum(star * F(f'rating_{star}') for star in STARS), FloatField()) / F('rating_count'),
+        DecimalField(max_digits=3, decimal_places=2),
+    ),
+    output_field=DecimalField(max_digits=3, decimal_places=2),
+)
+
+
+def apply_rating_delta(product_id, removed=None, added=None):
+    """Move one review's contribution from star ``removed`` to star ``added`` (either may be None)."""
+    deltas = defaultdict(int)
+    if removed:
+        deltas[removed] -= 1
+    if added:
+        deltas[added] += 1
+    deltas = {star: delta for star, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    updates = {f'rating_{star}': F(f'rating_{star}') + delta for star, delta in deltas.items()}
+    updates['rating_count'] = F('rating_count') + sum(deltas.values())
+    with transaction.atomic():
+        products = Product.objects.filter(pk=product_id)
+        products.update(**updates)
+        # update() skips auto_now; the detail Last-Modified reads updated_at.
+        products.update(rating_avg=RATING_AVG, updated_at=Now())
+        from .listings import refresh_listings
+        refresh_listings([product_id])
+
+
+def reconcile_ratings(chunk_size=CHUNK_SIZE):
+    """Recompute every product's rating aggregates from approved reviews; returns products fixed."""
+    from .listings import refresh_listings
+
+    fields = ['rating_count'] + [f'rating_{star}' for star in STARS]
+    fixed = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            products = list(
+                Product.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', *fields)[:chunk_size]
+            )
+            if not products:
+                return fixed
+            last_pk = products[-1].pk
+
+            histograms = defaultdict(dict)
+            counts = Review.objects.filter(
+                is_approved=True, product__in=products
+            ).order_by().values_list('product_id', 'rating').annotate(n=Count('pk'))
+            for product_id, rating, n in counts:
+                histograms[product_id][rating] = n
+
+            stale = []
+            for product in products:
+                histogram = histograms.get(product.pk, {})
+                expected = {f'rating_{star}': histogram.get(star, 0) for star in STARS}
+                expected['rating_count'] = sum(histogram.values())
+                if any(getattr(product, field) != value for field, value in expected.items()):
+                    for field, value in expected.items():
+                        setattr(product, field, value)
+                    stale.append(product)
+            if stale:
+                Product.objects.bulk_update(stale, fields)
+                ids = [product.pk for product in stale]
+                Product.objects.filter(pk__in=ids).update(rating_avg=RATING_AVG, updated_at=Now())
+                refresh_listings(ids)
+                fixed += len(stale)
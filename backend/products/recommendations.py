@@ -0,0 +1,138 @@
+"""
+Offline item-to-item recommendations from co-views and co-purchases.
+
+Each user's recently viewed products and each order's products form a
+"basket". A ``Counter`` tallies every product and, through
+``itertools.combinations``, every pair of products within a basket; the
+counts are turned into cosine similarities, ``co(i, j) / sqrt(n(i) * n(j))``,
+with purchases weighted above views. The top-k neighbours of every product are stored in
+ProductRecommendation, so serving them is a single indexed read.
+Products without behavioural data fall back to brand/category similarity.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from itertools import combinations, islice
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Coalesce
+
+from .caching import bump_catalog_version
+from .models import ProductListing, ProductRecommendation, RecentlyViewed
+
+TOP_K = 10
+PURCHASE_WEIGHT = 2.0
+VIEW_WEIGHT = 1.0
+# Pairs grow quadratically with basket size; very long histories add little signal.
+MAX_BASKET_SIZE = 50
+
+
+def view_baskets():
+    """Product ids viewed by the same user, most recent first."""
+    baskets = defaultdict(dict)
+    rows = RecentlyViewed.objects.filter(product__is_active=True).order_by('-viewed_at', '-pk').values_list(
+        'user_id', 'product_id'
+    )
+    for user_id, product_id in rows.iterator(chunk_size=5000):
+        # dict keys: unique and in insertion order.
+        baskets[user_id][product_id] = None
+    return baskets.values()
+
+
+def purchase_baskets():
+    """Product ids bought together in the same (non-cancelled) order, last line first."""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    baskets = defaultdict(dict)
+    rows = OrderItem.objects.exclude(
+        order__status__in=['cancelled', 'refunded']
+    ).annotate(
+        item_product=Coalesce('product_id', 'variant__product_id')
+    ).filter(item_product__isnull=False).order_by('-pk').values_list('order_id', 'item_product')
+    for order_id, product_id in rows.iterator(chunk_size=5000):
+        baskets[order_id][product_id] = None
+    return baskets.values()
+
+
+def cooccurrence(baskets):
+    """
+    Return ``(pair_counts, item_counts)`` over ``baskets``; pairs are keyed ``(low, high)``.
+
+    Baskets list their products most recent first; only the first
+    ``MAX_BASKET_SIZE`` of each are counted.
+    """
+    pairs = Counter()
+    items = Counter()
+    for basket in baskets:
+        basket = sorted(islice(basket, MAX_BASKET_SIZE))
+        items.update(basket)
+        pairs.update(combinations(basket, 2))
+    return pairs, items
+
+
+def similarities(weighted_baskets):
+    """Cosine similarity per unordered product pair, summed over weighted basket sources."""
+    scores = Counter()
+    for weight, baskets in weighted_baskets:
+        pairs, items = cooccurrence(baskets)
+        for (a, b), count in pairs.items():
+            scores[a, b] += weight * count / math.sqrt(items[a] * items[b])
+    return scores
+
+
+def top_neighbours(scores, k=TOP_K):
+    """``{product_id: [(score, neighbour_id), ...]}`` best first, at most ``k`` each."""
+    neighbours = defaultdict(list)
+    for (a, b), score in scores.items():
+        neighbours[a].append((score, b))
+        neighbours[b].append((score, a))
+    # Ties go to the lower product id so rebuilds are deterministic.
+    return {
+        pk: heapq.nsmallest(k, candidates, key=lambda item: (-item[0], item[1]))
+        for pk, candidates in neighbours.items()
+    }
+
+
+def build_recommendations(k=TOP_K):
+    """Recompute and store every product's top-k neighbours; returns the number of rows."""
+    scores = similarities([
+        (VIEW_WEIGHT, view_baskets()),
+        (PURCHASE_WEIGHT, purchase_baskets()),
+    ])
+    rows = [
+        ProductRecommendation(product_id=pk, recommended_id=neighbour, rank=rank, score=score)
+        for pk, candidates in top_neighbours(scores, k).items()
+        for rank, (score, neighbour) in enumerate(candidates, start=1)
+    ]
+    with transaction.atomic():
+        ProductRecommendation.objects.all().delete()
+        ProductRecommendation.objects.bulk_create(rows, batch_size=1000)
+    bump_catalog_version('products')
+    return len(rows)
+
+
+def related_listings(product, limit=TOP_K):
+    """
+    Return ``(source, listings)`` for the product page's related products.
+
+    ``source`` is ``'behaviour'`` when precomputed neighbours exist and
+    ``'similar'`` for the brand/category fallback.
+    """
+    listings = list(
+        ProductListing.objects.filter(product__recommended_by__product=product)
+        .order_by('product__recommended_by__rank')[:limit]
+    )
+    if listings:
+        return 'behaviour', listings
+
+    same_category = Q(category_id=product.category_id)
+    same_brand = Q(brand_id=product.brand_id)
+    listings = ProductListing.objects.filter(same_category | same_brand).exclude(pk=product.pk).annotate(
+        affinity=Case(
+            When(same_category & same_brand, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    ).order_by('-affinity', '-rating_avg', '-created_at')[:limit]
+    return 'similar', list(listings)
@@ -0,0 +1,162 @@
+"""
+Full-text search over the product catalog.
+
+Search goes through a pluggable backend chosen by ``PRODUCT_SEARCH_BACKEND``.
+The default keeps an SQLite FTS5 inverted index (``products_product_fts``)
+in sync from model signals; on databases without FTS5 it falls back to
+plain ``icontains`` matching so the endpoint keeps working. A Postgres
+``tsvector`` backend only has to implement the same four methods.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Product
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+DEFAULT_SEARCH_BACKEND = 'products.search.SQLiteFTS5Backend'
+
+
+def tokenize(query):
+    """Split a free-text query into lower-cased word tokens."""
+    return TOKEN_RE.findall(query.lower())
+
+
+class BaseSearchBackend:
+    """Interface every product search backend implements."""
+
+    def is_supported(self):
+        return True
+
+    def index_products(self, queryset):
+        """(Re)index the products in ``queryset``; inactive ones are dropped from the index."""
+        raise NotImplementedError
+
+    def remove_products(self, product_ids):
+        raise NotImplementedError
+
+    def rebuild(self):
+        """Rebuild the whole index from the product table."""
+        raise NotImplementedError
+
+    def search(self, query, limit, after=None):
+        """
+        Return up to ``limit`` ``(product_id, score)`` pairs best match first.
+
+        ``after`` is the ``(score, product_id)`` of the last hit of the
+        previous page; results continue strictly after it.
+        """
+        raise NotImplementedError
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Unranked ``icontains`` search used when no index is available."""
+
+    def index_products(self, queryset):
+        pass
+
+    def remove_products(self, product_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, query, limit, after=None):
+        products = Product.objects.active().filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(short_description__icontains=query) |
+            Q(sku__icontains=query) |
+            Q(category__name__icontains=query) |
+            Q(brand__name__icontains=query)
+        )
+        if after is not None:
+            products = products.filter(pk__gt=after[1])
+        ids = products.order_by('pk').values_list('pk', flat=True)[:limit]
+        return [(pk, 0.0) for pk in ids]
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """
+    BM25-ranked search on an FTS5 virtual table keyed by product id.
+
+    Column weights favour names and SKUs over long descriptions, and every
+    query token is matched as a prefix so partial words still hit.
+    """
+
+    table = 'products_product_fts'
+    # Same order as the virtual table columns.
+    columns = ('name', 'sku', 'brand_name', 'category_name', 'short_description', 'description')
+    source_fields = ('pk', 'name', 'sku', 'brand__name', 'category__name', 'short_description', 'description')
+    weights = (10.0, 8.0, 4.0, 3.0, 2.0, 1.0)
+
+    def is_supported(self):
+        return connection.vendor == 'sqlite'
+
+    def index_products(self, queryset):
+        ids = queryset.values('pk')
+        ids_sql, ids_params = ids.query.sql_with_params()
+        rows = Product.objects.active().filter(pk__in=queryset.values('pk')).values_list(*self.source_fields)
+        rows_sql, rows_params = rows.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({ids_sql})', ids_params)
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, {", ".join(self.columns)}) {rows_sql}', rows_params
+            )
+
+    def remove_products(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', product_ids)
+
+    def rebuild(self):
+        rows = Product.objects.active().values_list(*self.source_fields)
+        rows_sql, rows_params = rows.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, {", ".join(self.columns)}) {rows_sql}', rows_params
+            )
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+
+    def build_match(self, query):
+        # Quote every token so FTS5 operators in user input are treated as text.
+        return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+    def search(self, query, limit, after=None):
+        match = self.build_match(query)
+        if not match:
+            return []
+        score = f'bm25({self.table}, {", ".join(str(w) for w in self.weights)})'
+        sql = f'SELECT rowid, {score} AS score FROM {self.table} WHERE {self.table} MATCH %s'
+        params = [match]
+        if after is not None:
+            sql += f' AND ({score} > %s OR ({score} = %s AND rowid > %s))'
+            params += [after[0], after[0], after[1]]
+        sql += ' ORDER BY score, rowid LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [(row[0], row[1]) for row in cursor.fetchall()]
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the configured search backend, falling back to plain database matching."""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', DEFAULT_SEARCH_BACKEND)
+        backend = import_string(path)()
+        if not backend.is_supported():
+            backend = DatabaseSearchBackend()
+        _backend = backend
+    return _backend
@@ -2,8 +2,11 @@ from rest_framework import serializers
 from .models import (
     Category, Brand, Product, ProductImage, ProductAttribute, 
     ProductAttributeValue, ProductVariant, VariantAttributeValue, 
-    Inventory, Review, Wishlist, RecentlyViewed
+    Inventory, Review, Wishlist, RecentlyViewed, ProductListing
 )
+from .derivatives import image_set
+from .hierarchy import is_descendant
+from .wishlists import wishlist_ids_for_context
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -16,6 +19,12 @@ class CategorySerializer(serializers.ModelSerializer):
             'image', 'is_active', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'slug', 'created_at', 'updated_at']
+    
+    def validate_parent(self, parent):
+        """Reject moving a category under itself or one of its descendants."""
+        if parent is not None and self.instance is not None and is_descendant(self.instance, parent):
+            raise serializers.ValidationError('A category cannot be moved under its own subtree.')
+        return parent
 
 
 class BrandSerializer(serializers.ModelSerializer):
@@ -33,10 +42,18 @@ class BrandSerializer(serializers.ModelSerializer):
 class ProductImageSerializer(serializers.ModelSerializer):
     """Serializer for the ProductImage model."""
     
+    sizes = serializers.SerializerMethodField()
+    
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'alt_text', 'is_primary', 'created_at']
+        fields = ['id', 'image', 'alt_text', 'is_primary', 'sizes', 'created_at']
         read_only_fields = ['id', 'created_at']
+    
+    def get_sizes(self, obj):
+        """Responsive renditions and srcsets, once they have been rendered."""
+        if obj.derivatives_ready:
+            return image_set(obj.image.name, self.context['request'])
+        return None
 
 
 class ProductAttributeSerializer(serializers.ModelSerializer):
@@ -75,14 +92,15 @@ class InventorySerializer(serializers.ModelSerializer):
     
     is_low_stock = serializers.BooleanField(read_only=True)
     is_in_stock = serializers.BooleanField(read_only=True)
+    available = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Inventory
         fields = [
-            'id', 'quantity', 'low_stock_threshold', 
+            'id', 'quantity', 'reserved', 'available', 'low_stock_threshold', 
             'is_low_stock', 'is_in_stock', 'last_checked'
         ]
-        read_only_fields = ['id', 'last_checked']
+        read_only_fields = ['id', 'reserved', 'available', 'last_checked']
 
 
 class ProductVariantSerializer(serializers.ModelSerializer):
@@ -90,15 +108,16 @@ class ProductVariantSerializer(serializers.ModelSerializer):
     
     attribute_values = VariantAttributeValueSerializer(many=True, read_only=True)
     inventory = InventorySerializer(read_only=True)
+    effective_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     
     class Meta:
         model = ProductVariant
         fields = [
             'id', 'name', 'sku', 'price', 'sale_price', 'is_on_sale',
-            'is_default', 'is_active', 'attribute_values', 'inventory',
+            'effective_price', 'is_default', 'is_active', 'attribute_values', 'inventory',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'effective_price', 'created_at', 'updated_at']
 
 
 class ProductListSerializer(serializers.ModelSerializer):
@@ -107,8 +126,12 @@ class ProductListSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     brand_name = serializers.CharField(source='brand.name', read_only=True)
     primary_image = serializers.SerializerMethodField()
+    primary_image_sizes = serializers.SerializerMethodField()
     discount_percentage = serializers.FloatField(read_only=True)
     current_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    rating_avg = serializers.FloatField(read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+    in_wishlist = serializers.SerializerMethodField()
     
     class Meta:
         model = Product
@@ -116,16 +139,85 @@ class ProductListSerializer(serializers.ModelSerializer):
             'id', 'name', 'slug', 'sku', 'category', 'category_name',
             'brand', 'brand_name', 'short_description', 'price',
             'sale_price', 'is_on_sale', 'current_price', 'discount_percentage',
-            'primary_image', 'is_featured', 'availability', 'created_at'
+            'primary_image', 'primary_image_sizes', 'is_featured', 'availability', 'rating_avg',
+            'rating_count', 'rating_histogram', 'in_wishlist', 'created_at'
         ]
         read_only_fields = ['id', 'slug', 'created_at']
     
+    def get_in_wishlist(self, obj):
+        return obj.pk in wishlist_ids_for_context(self.context)
+    
+    def _primary_image(self, obj):
+        if not hasattr(obj, '_primary_image_cache'):
+            if hasattr(obj, 'primary_images'):
+                # Prefetched by Product.objects.for_listing()
+                obj._primary_image_cache = obj.primary_images[0] if obj.primary_images else None
+            else:
+                obj._primary_image_cache = obj.images.filter(is_primary=True).first()
+        return obj._primary_image_cache
+    
     def get_primary_image(self, obj):
         """Get the primary image URL for the product."""
-        primary_image = obj.images.filter(is_primary=True).first()
+        primary_image = self._primary_image(obj)
         if primary_image:
             return self.context['request'].build_absolute_uri(primary_image.image.url)
         return None
+    
+    def get_primary_image_sizes(self, obj):
+        """Card/thumbnail/detail renditions of the primary image, once rendered."""
+        primary_image = self._primary_image(obj)
+        if primary_image and primary_image.derivatives_ready:
+            return image_set(primary_image.image.name, self.context['request'])
+        return None
+
+
+class ProductListingSerializer(serializers.ModelSerializer):
+    """Serializer for listing products from the denormalized ProductListing table."""
+    
+    id = serializers.IntegerField(source='product_id', read_only=True)
+    primary_image = serializers.SerializerMethodField()
+    primary_image_sizes = serializers.SerializerMethodField()
+    in_wishlist = serializers.SerializerMethodField()
+    current_price = serializers.DecimalField(
+        source='effective_price', max_digits=10, decimal_places=2, read_only=True
+    )
+    discount_percentage = serializers.FloatField(read_only=True)
+    rating_avg = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = ProductListing
+        fields = [
+            'id', 'name', 'slug', 'sku', 'category', 'category_name',
+            'brand', 'brand_name', 'short_description', 'price',
+            'sale_price', 'is_on_sale', 'current_price', 'price_min',
+            'price_max', 'discount_percentage',
+            'primary_image', 'primary_image_sizes', 'is_featured', 'availability', 'in_stock',
+            'rating_avg', 'rating_count', 'in_wishlist', 'created_at'
+        ]
+        read_only_fields = fields
+    
+    def get_in_wishlist(self, obj):
+        return obj.product_id in wishlist_ids_for_context(self.context)
+    
+    def get_primary_image(self, obj):
+        """Get the primary image URL for the product."""
+        if obj.primary_image:
+            return self.context['request'].build_absolute_uri(obj.primary_image.url)
+        return None
+    
+    def get_primary_image_sizes(self, obj):
+        """Card/thumbnail/detail renditions of the primary image, once rendered."""
+        if obj.primary_image and obj.primary_image_derivatives:
+            return image_set(obj.primary_image.name, self.context['request'])
+        return None
+
+
+class ProductComparisonSerializer(ProductListingSerializer):
+    """Listing fields plus the stock level, for the comparison view."""
+    
+    class Meta(ProductListingSerializer.Meta):
+        fields = ProductListingSerializer.Meta.fields + ['stock_quantity']
+        read_only_fields = fields
 
 
 class ProductDetailSerializer(serializers.ModelSerializer):
@@ -139,18 +231,27 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     inventory = InventorySerializer(read_only=True)
     discount_percentage = serializers.FloatField(read_only=True)
     current_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    price_min = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    price_max = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    in_wishlist = serializers.SerializerMethodField()
+    rating_avg = serializers.FloatField(read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
     
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'slug', 'sku', 'category', 'brand',
             'short_description', 'description', 'price', 'sale_price',
-            'is_on_sale', 'current_price', 'discount_percentage',
-            'is_featured', 'is_active', 'availability', 'warranty_info',
+            'is_on_sale', 'current_price', 'price_min', 'price_max',
+            'discount_percentage', 'is_featured', 'is_active', 'availability', 'warranty_info',
+            'rating_avg', 'rating_count', 'rating_histogram', 'in_wishlist',
             'images', 'attribute_values', 'variants', 'inventory',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'slug', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'slug', 'rating_count', 'created_at', 'updated_at']
+    
+    def get_in_wishlist(self, obj):
+        return obj.pk in wishlist_ids_for_context(self.context)
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -170,9 +271,7 @@ class ReviewSerializer(serializers.ModelSerializer):
     
     def get_user_name(self, obj):
         """Get the user's full name or email if not available."""
-        if obj.user.get_full_name():
-            return obj.user.get_full_name()
-        return obj.user.email
+        return obj.user.get_full_name() or obj.user.email
 
 
 class WishlistSerializer(serializers.ModelSerializer):
@@ -186,6 +285,18 @@ class WishlistSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'added_at']
 
 
+class WishlistBulkSerializer(serializers.Serializer):
+    """Product ids to add to and remove from the user's wishlist in one call."""
+    
+    add = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, max_length=100)
+    remove = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, max_length=100)
+    
+    def validate(self, data):
+        if not data.get('add') and not data.get('remove'):
+            raise serializers.ValidationError('Provide product ids to add and/or remove.')
+        return data
+
+
 class RecentlyViewedSerializer(serializers.ModelSerializer):
     """Serializer for recently viewed products."""
     
@@ -0,0 +1,276 @@
+"""
+Race-free stock movements and checkout reservations.
+
+Every movement is one conditional UPDATE over the inventory rows it
+touches: ``quantity`` drops by what is taken, the ``reserved`` counter
+moves by what is held or released, and rows only match where
+``quantity - reserved`` still covers the net demand, so concurrent
+checkouts can never oversell. If fewer rows change than there are lines,
+the statement is rolled back (it runs in a savepoint) and the lines that
+are short raise ``InsufficientStock``, which rolls back the caller's
+transaction too. Lines without an inventory row are not stock-tracked
+and always succeed. Stock belongs to the variant when a line has one,
+otherwise to the product.
+
+``reserve_cart`` holds a cart's stock for ``RESERVATION_TTL`` seconds;
+available stock is ``quantity - reserved``. Placing the order passes the
+cart's reservations to ``decrement_stock``, which converts them in the
+same statement. ``release_expired_reservations`` sweeps stale holds in
+batches (``release_expired_reservations`` command), and the rows a
+movement touches are swept first so a lapsed hold never blocks a sale.
+Should concurrent movements keep claiming the same reservations first,
+``ReservationConflict`` is raised; nothing changed, so the caller can
+simply retry. ``reserved`` is never written by ordinary saves; ``reconcile_reserved``
+resets it to the sum of the existing reservations should it drift.
+
+As every movement is an ``update()``, the Inventory signals never fire:
+each one sets ``last_checked`` itself, refreshes the affected listing rows
+(whose stock counts are available units) and bumps the ``products`` stamp
+once its transaction commits.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Now
+from django.utils import timezone
+
+from .caching import bump_catalog_version
+from .listings import refresh_listings
+from .models import Inventory, ProductVariant, Reservation
+
+DEFAULT_RESERVATION_TTL = 15 * 60
+SWEEP_BATCH_SIZE = 500
+
+
+class InsufficientStock(Exception):
+    """Some lines ask for more than is in stock; ``shortages`` has the details."""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__('; '.join(
+            f"{shortage['sku'] or shortage['owner']}: {shortage['requested']} requested, "
+            f"{shortage['available']} available"
+            for shortage in shortages
+        ))
+
+
+class ReservationConflict(Exception):
+    """Concurrent movements kept claiming the same reservations first; safe to retry."""
+
+
+def stock_lines(items):
+    """Sum ``(product_id, variant_id, quantity)`` rows into ``{('variant'|'product', id): quantity}``."""
+    lines = Counter()
+    for product_id, variant_id, quantity in items:
+        if variant_id:
+            lines['variant', variant_id] += quantity
+        elif product_id:
+            lines['product', product_id] += quantity
+    return dict(lines)
+
+
+def _owner_filter(keys, prefix=''):
+    query = Q(pk__in=[])
+    for kind in ('product', 'variant'):
+        ids = [owner_id for owner_kind, owner_id in keys if owner_kind == kind]
+        if ids:
+            query |= Q(**{f'{prefix}{kind}_id__in': ids})
+    return query
+
+
+def _per_row(amounts):
+    """``amounts`` per product/variant as a CASE over the inventory row's owner (0 elsewhere)."""
+    if not amounts:
+        return Value(0)
+    return Case(
+        *[When(**{f'{kind}_id': owner_id}, then=Value(amount)) for (kind, owner_id), amount in amounts.items()],
+        default=Value(0), output_field=IntegerField(),
+    )
+
+
+class _Short(Exception):
+    pass
+
+
+def _shortages(take, need):
+    """Lines that cannot be met from current stock, plus the keys that are tracked at all."""
+    rows = Inventory.objects.filter(_owner_filter(need)).values_list(
+        'product_id', 'variant_id', 'quantity', 'reserved', 'product__sku', 'variant__sku'
+    )
+    shortages, tracked = [], set()
+    for product_id, variant_id, quantity, reserved, product_sku, variant_sku in rows:
+        key = ('variant', variant_id) if variant_id else ('product', product_id)
+        tracked.add(key)
+        if quantity < take.get(key, 0) or (need[key] > 0 and quantity - reserved < need[key]):
+            shortages.append({
+                'owner': f'{key[0]} {key[1]}', 'sku': variant_sku or product_sku,
+                'requested': need[key], 'available': max(0, quantity - reserved),
+            })
+    return shortages, tracked
+
+
+def _move(take=None, hold=None, release=None):
+    """
+    Apply one stock movement in a single UPDATE; returns the tracked keys.
+
+    ``take`` leaves stock for good, ``hold`` is reserved and ``release``
+    returns earlier holds. Raises InsufficientStock, changing nothing, if
+    any tracked line cannot be met.
+    """
+    take, hold, release = take or {}, hold or {}, release or {}
+    keys = set(take) | set(hold) | set(release)
+    need = {key: take.get(key, 0) + hold.get(key, 0) - release.get(key, 0) for key in keys}
+    # update() skips auto_now; the detail Last-Modified reads last_checked.
+    updates = {'last_checked': Now()}
+    if take:
+        updates['quantity'] = F('quantity') - _per_row(take)
+    if hold or release:
+        updates['reserved'] = Greatest(F('reserved') + _per_row(hold) - _per_row(release), Value(0))
+    # One retry: the first failure may only mean some lines are untracked.
+    for _ in range(2):
+        if not keys:
+            return set()
+        demanding = [key for key in keys if need[key] > 0]
+        condition = Q(quantity__gte=_per_row(take))
+        if demanding:
+            condition &= (
+                _owner_filter(keys - set(demanding)) |
+                Q(_owner_filter(demanding), quantity__gte=F('reserved') + _per_row(need))
+            )
+        try:
+            with transaction.atomic():
+                updated = Inventory.objects.filter(_owner_filter(keys), condition).update(**updates)
+                if updated != len(keys):
+                    raise _Short
+        except _Short:
+            shortages, tracked = _shortages(take, need)
+            if shortages:
+                raise InsufficientStock(shortages)
+            keys = keys & tracked
+            continue
+        return keys
+    # Stock changed under us twice in a row; report it as it stands now.
+    raise InsufficientStock(_shortages(take, need)[0])
+
+
+def _refresh(keys):
+    # update() bypasses the Inventory signals that keep listings and caches in step.
+    if not keys:
+        return
+    product_ids = {owner_id for kind, owner_id in keys if kind == 'product'}
+    variant_ids = [owner_id for kind, owner_id in keys if kind == 'variant']
+    if variant_ids:
+        product_ids.update(ProductVariant.objects.filter(pk__in=variant_ids).values_list('product_id', flat=True))
+    refresh_listings(product_ids)
+    # Bumping before commit would let a reader cache the old stock under the new stamp.
+    transaction.on_commit(lambda: bump_catalog_version('products'))
+
+
+def claim_reservations(reservations):
+    """
+    Delete ``reservations`` and return their quantities per stock key (run inside a transaction).
+
+    Raises ``ReservationConflict`` if concurrent claims win three times running.
+    """
+    for _ in range(3):
+        rows = list(reservations.values_list('pk', 'inventory__product_id', 'inventory__variant_id', 'quantity'))
+        if not rows:
+            return {}
+        try:
+            with transaction.atomic():
+                # A concurrent sweep or checkout may have claimed some of them first.
+                if Reservation.objects.filter(pk__in=[row[0] for row in rows]).delete()[0] != len(rows):
+                    raise _Short
+        except _Short:
+            continue
+        return stock_lines(row[1:] for row in rows)
+    raise ReservationConflict('The stock held for this cart changed while it was being claimed; please retry.')
+
+
+def release_expired_reservations(keys=None, batch_size=SWEEP_BATCH_SIZE, now=None):
+    """Return the stock of lapsed holds, a batch per transaction; returns reservations released."""
+    now = now or timezone.now()
+    expired = Reservation.objects.filter(expires_at__lte=now)
+    if keys is not None:
+        expired = expired.filter(_owner_filter(keys, prefix='inventory__'))
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(expired.order_by('expires_at').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return released
+            _refresh(_move(release=claim_reservations(Reservation.objects.filter(pk__in=batch))))
+        released += len(batch)
+
+
+def release_reservations(reservations):
+    """Drop ``reservations`` and return their stock."""
+    with transaction.atomic():
+        _refresh(_move(release=claim_reservations(reservations)))
+
+
+def reconcile_reserved():
+    """Reset ``reserved`` to the sum of each row's reservations; returns the rows fixed."""
+    held = Coalesce(
+        Subquery(
+            Reservation.objects.filter(inventory=OuterRef('pk')).order_by()
+            .values('inventory').annotate(total=Sum('quantity')).values('total')[:1]
+        ),
+        Value(0), output_field=IntegerField(),
+    )
+    with transaction.atomic():
+        drifted = list(
+            Inventory.objects.annotate(held=held).exclude(reserved=F('held'))
+            .values_list('pk', 'product_id', 'variant_id')
+        )
+        if not drifted:
+            return 0
+        Inventory.objects.filter(pk__in=[pk for pk, _, _ in drifted]).update(reserved=held, last_checked=Now())
+        _refresh({
+            ('variant', variant_id) if variant_id else ('product', product_id)
+            for _, product_id, variant_id in drifted
+        })
+    return len(drifted)
+
+
+def reserve_cart(cart, ttl=None):
+    """
+    Hold the stock of ``cart``'s items, replacing its earlier holds.
+
+    Returns when the hold expires; raises InsufficientStock (keeping the
+    earlier holds) if the cart asks for more than is available.
+    """
+    ttl = ttl or getattr(settings, 'RESERVATION_TTL', DEFAULT_RESERVATION_TTL)
+    lines = stock_lines(cart.items.filter(saved_for_later=False).values_list('product_id', 'variant_id', 'quantity'))
+    expires_at = timezone.now() + timedelta(seconds=ttl)
+    with transaction.atomic():
+        release_expired_reservations(keys=lines)
+        held = claim_reservations(Reservation.objects.filter(cart=cart))
+        tracked = _move(hold=lines, release=held)
+        _refresh(tracked)
+        owners = Inventory.objects.filter(_owner_filter(tracked)).values_list('pk', 'product_id', 'variant_id')
+        Reservation.objects.bulk_create([
+            Reservation(
+                inventory_id=pk, cart=cart, expires_at=expires_at,
+                quantity=lines[('variant', variant_id) if variant_id else ('product', product_id)],
+            )
+            for pk, product_id, variant_id in owners
+        ])
+    return expires_at
+
+
+def decrement_stock(lines, reservations=None):
+    """
+    Take the stock of ``lines`` (see ``stock_lines``) atomically, or raise InsufficientStock.
+
+    ``reservations`` (a queryset, typically the cart's) are converted in
+    the same statement: their holds are released as the stock is taken.
+    """
+    lines = {key: quantity for key, quantity in lines.items() if quantity > 0}
+    with transaction.atomic():
+        release_expired_reservations(keys=lines)
+        held = claim_reservations(reservations) if reservations is not None else {}
+        _refresh(_move(take=lines, release=held))
@@ -0,0 +1,69 @@
+"""
+Content-addressed media storage and serving.
+
+``ContentHashedStorage`` saves every file as ``<upload dir>/<sha256><ext>``,
+so a file's name changes exactly when its bytes do and identical uploads
+share one file. Such URLs can be cached forever: ``serve_media`` answers
+any path with a hashed component (including the derivatives of
+products.derivatives, which live under their original's hashed name) with
+``Cache-Control: immutable`` for ``MEDIA_CACHE_MAX_AGE``, and everything
+else (profile pictures, files stored before this backend) revalidating.
+The ``hash_media_names`` command renames such older files.
+"""
+import hashlib
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.cache import patch_cache_control
+from django.utils.deconstruct import deconstructible
+from django.views.static import serve
+
+DEFAULT_MAX_AGE = 60 * 60 * 24 * 365
+# A path component that is a SHA-256 hex digest, with or without an extension.
+HASHED_COMPONENT = re.compile(r'(?:^|/)[0-9a-f]{64}(?:\.[A-Za-z0-9]+)?(?:/|$)')
+
+
+def is_hashed(name):
+    return bool(name and HASHED_COMPONENT.search(name))
+
+
+@deconstructible
+class ContentHashedStorage(FileSystemStorage):
+    """FileSystemStorage naming files after the SHA-256 of their content."""
+
+    def hashed_name(self, name, content):
+        """``name``'s directory and extension around the digest of ``content``."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(posixpath.dirname(name), digest.hexdigest() + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        # Same name means same bytes: keep the stored copy.
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+def serve_media(request, path):
+    """Serve a file from MEDIA_ROOT; content-hashed paths are marked immutable."""
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_hashed(path):
+        patch_cache_control(
+            response, public=True, immutable=True,
+            max_age=getattr(settings, 'MEDIA_CACHE_MAX_AGE', DEFAULT_MAX_AGE),
+        )
+    else:
+        patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    return response
@@ -0,0 +1,268 @@
+"""
+Deterministic, production-shaped synthetic data for load testing.
+
+``generate(products=N, seed=S)`` derives every other volume from N
+(brands, a two-level category tree, 0-4 variants per product, attribute
+values, inventory, reviews, N/10 users, carts, 2N orders of 1-9 items)
+and writes them with ``bulk_create`` in fixed-size batches, one
+transaction per batch. Primary keys are assigned up front from the
+current maxima, so rows reference each other without reading anything
+back. The same seed on an empty database always yields the same data.
+
+Bulk writes skip model signals: rating aggregates are computed alongside
+the reviews, and the category closure, listings and search index are
+rebuilt once at the end.
+"""
+import random
+from decimal import Decimal
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+
+from .caching import bump_catalog_version
+from .hierarchy import rebuild_closure
+from .listings import rebuild_listings
+from .models import (
+    Brand, Category, Inventory, Product, ProductAttribute, ProductAttributeValue,
+    ProductVariant, Review, VariantAttributeValue,
+)
+from .search import get_search_backend
+
+BATCH_SIZE = 5000
+SKU_PREFIX = 'LT'
+
+ATTRIBUTES = {
+    'Processor': ['Intel Core i5', 'Intel Core i7', 'Intel Core i9', 'AMD Ryzen 5', 'AMD Ryzen 7', 'Apple M3'],
+    'RAM': ['8GB', '16GB', '32GB', '64GB'],
+    'Storage': ['256GB SSD', '512GB SSD', '1TB SSD', '2TB SSD'],
+    'Display': ['13.3-inch FHD', '14-inch QHD', '15.6-inch FHD', '16-inch 4K'],
+    'Graphics': ['Integrated', 'RTX 4050', 'RTX 4060', 'RTX 4070', 'Radeon 780M'],
+    'Operating System': ['Windows 11 Home', 'Windows 11 Pro', 'macOS', 'Ubuntu'],
+    'Color': ['Silver', 'Black', 'Space Gray', 'Blue'],
+    'Battery Life': ['8 hours', '10 hours', '12 hours', '18 hours'],
+}
+VARIANT_ATTRIBUTES = ['Storage', 'RAM', 'Color']
+ORDER_STATUSES = ['delivered'] * 6 + ['shipped', 'processing', 'pending', 'cancelled']
+RATING_WEIGHTS = [5, 7, 15, 33, 40]
+
+
+def product_price(index):
+    """List price of the index-th generated product, recomputable without a query."""
+    return Decimal(399 + (index * 7919) % 3200) + Decimal('0.99')
+
+
+class SyntheticCatalog:
+    """One generation run; see the module docstring."""
+
+    def __init__(self, products, seed=0, batch_size=BATCH_SIZE, log=None):
+        self.products = products
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.brands = max(8, min(500, products // 2000))
+        self.roots = 8
+        self.children_per_root = max(2, min(50, products // 20000))
+        self.users = max(10, products // 10)
+        self.orders = products * 2
+        self.carts = self.users // 2
+
+    def next_id(self, model):
+        return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+    def write(self, model, rows):
+        """bulk_create ``rows`` (an iterable) in batches, one transaction each; returns the count."""
+        total = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                total += self.flush(model, batch)
+                batch = []
+        if batch:
+            total += self.flush(model, batch)
+        self.log(f'{model.__name__}: {total} rows')
+        return total
+
+    def flush(self, model, batch):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, batch_size=self.batch_size)
+        return len(batch)
+
+    def run(self):
+        if Product.objects.filter(sku__startswith=f'{SKU_PREFIX}-').exists():
+            raise ValueError('Synthetic data is already present; start from an empty database.')
+        self.generate_taxonomy()
+        self.generate_users()
+        self.generate_products()
+        self.generate_orders()
+        self.generate_carts()
+        self.rebuild_derived()
+
+    def generate_taxonomy(self):
+        start = self.next_id(Brand)
+        self.brand_ids = list(range(start, start + self.brands))
+        self.write(Brand, (
+            Brand(id=pk, name=f'Brand {n:04d}', slug=f'brand-{n:04d}', description=f'Synthetic brand {n}')
+            for n, pk in enumerate(self.brand_ids)
+        ))
+
+        start = self.next_id(Category)
+        categories = []
+        self.leaf_category_ids = []
+        for root in range(self.roots):
+            root_id = start + len(categories)
+            categories.append(Category(id=root_id, name=f'Department {root:02d}', slug=f'department-{root:02d}'))
+            for child in range(self.children_per_root):
+                child_id = start + len(categories)
+                categories.append(Category(
+                    id=child_id, parent_id=root_id,
+                    name=f'Department {root:02d} / {child:02d}', slug=f'department-{root:02d}-{child:02d}',
+                ))
+                self.leaf_category_ids.append(child_id)
+        self.write(Category, categories)
+
+        existing = dict(ProductAttribute.objects.filter(name__in=ATTRIBUTES).values_list('name', 'pk'))
+        missing = [ProductAttribute(name=name) for name in ATTRIBUTES if name not in existing]
+        ProductAttribute.objects.bulk_create(missing)
+        self.attribute_ids = dict(ProductAttribute.objects.filter(name__in=ATTRIBUTES).values_list('name', 'pk'))
+
+    def generate_products(self):
+        rng = self.rng
+        self.product_start = self.next_id(Product)
+        variant_id = self.next_id(ProductVariant)
+        products, variants, values, variant_values, inventory, reviews = [], [], [], [], [], []
+
+        def flush():
+            for model, rows in (
+                (Product, products), (ProductVariant, variants), (ProductAttributeValue, values),
+                (VariantAttributeValue, variant_values), (Inventory, inventory), (Review, reviews),
+            ):
+                if rows:
+                    self.flush(model, rows)
+                    rows.clear()
+
+        for index in range(self.products):
+            pk = self.product_start + index
+            price = product_price(index)
+            on_sale = rng.random() < 0.2
+            sku = f'{SKU_PREFIX}-{index:08d}'
+            ratings = self.generate_reviews(pk, reviews)
+            products.append(Product(
+                id=pk, sku=sku, name=f'Laptop {index:08d}', slug=f'laptop-{index:08d}',
+                category_id=rng.choice(self.leaf_category_ids), brand_id=rng.choice(self.brand_ids),
+                short_description=f'Synthetic laptop {index}', description=f'Synthetic laptop number {index}.',
+                price=price, sale_price=(price * Decimal('0.85')).quantize(Decimal('0.01')) if on_sale else None,
+                is_on_sale=on_sale, is_featured=rng.random() < 0.02,
+                availability=rng.choice(['in_stock', 'in_stock', 'in_stock', 'limited_stock', 'out_of_stock']),
+                **ratings,
+            ))
+            for name in rng.sample(list(ATTRIBUTES), 6):
+                values.append(ProductAttributeValue(
+                    product_id=pk, attribute_id=self.attribute_ids[name], value=rng.choice(ATTRIBUTES[name]),
+                ))
+            inventory.append(Inventory(product_id=pk, quantity=rng.randint(0, 50)))
+            for position in range(rng.randint(0, 4)):
+                variants.append(ProductVariant(
+                    id=variant_id, product_id=pk, sku=f'{sku}-{position}', name=f'Configuration {position + 1}',
+                    price=price + 100 * position, is_default=position == 0,
+                ))
+                for name in VARIANT_ATTRIBUTES:
+                    variant_values.append(VariantAttributeValue(
+                        variant_id=variant_id, attribute_id=self.attribute_ids[name],
+                        value=rng.choice(ATTRIBUTES[name]),
+                    ))
+                inventory.append(Inventory(variant_id=variant_id, quantity=rng.randint(0, 30)))
+                variant_id += 1
+            if len(products) >= self.batch_size:
+                flush()
+        flush()
+        self.log(f'Product: {self.products} rows (with variants, attribute values, inventory and reviews)')
+
+    def generate_users(self):
+        User = get_user_model()
+        password = make_password('loadtest')
+        self.user_start = self.next_id(User)
+        self.write(User, (
+            User(
+                id=self.user_start + n, email=f'loadtest{n:08d}@example.com', password=password,
+                first_name='Load', last_name=f'Tester {n}',
+            )
+            for n in range(self.users)
+        ))
+
+    def generate_orders(self):
+        Order = apps.get_model('orders', 'Order')
+        OrderItem = apps.get_model('orders', 'OrderItem')
+        rng = self.rng
+        order_start = self.next_id(Order)
+        orders, items = [], []
+        for n in range(self.orders):
+            order_id = order_start + n
+            subtotal = Decimal('0.00')
+            for index in rng.sample(range(self.products), min(self.products, rng.randint(1, 9))):
+                price, quantity = product_price(index), rng.choice([1, 1, 1, 2])
+                subtotal += price * quantity
+                items.append(OrderItem(
+                    order_id=order_id, product_id=self.product_start + index, product_name=f'Laptop {index:08d}',
+                    sku=f'{SKU_PREFIX}-{index:08d}', price=price, quantity=quantity, total_price=price * quantity,
+                ))
+            status = rng.choice(ORDER_STATUSES)
+            orders.append(Order(
+                id=order_id, order_number=f'{SKU_PREFIX}-{order_id:010d}',
+                user_id=self.user_start + rng.randrange(self.users), email='loadtest@example.com',
+                status=status, payment_status='pending' if status == 'pending' else 'paid', subtotal=subtotal, total=subtotal,
+            ))
+            if len(items) >= self.batch_size:
+                self.flush(Order, orders)
+                self.flush(OrderItem, items)
+                orders, items = [], []
+        if orders:
+            self.flush(Order, orders)
+            self.flush(OrderItem, items)
+        self.log(f'Order: {self.orders} rows (with items)')
+
+    def generate_carts(self):
+        Cart = apps.get_model('cart', 'Cart')
+        CartItem = apps.get_model('cart', 'CartItem')
+        rng = self.rng
+        cart_start = self.next_id(Cart)
+        self.write(Cart, (Cart(id=cart_start + n, user_id=self.user_start + n) for n in range(self.carts)))
+        self.write(CartItem, (
+            CartItem(cart_id=cart_start + n, product_id=self.product_start + index, quantity=rng.randint(1, 2))
+            for n in range(self.carts)
+            for index in rng.sample(range(self.products), min(self.products, rng.randint(1, 3)))
+        ))
+
+    def generate_reviews(self, product_id, reviews):
+        """Queue the product's reviews; returns its rating aggregates, so no reconcile pass is needed."""
+        rng = self.rng
+        histogram = dict.fromkeys(range(1, 6), 0)
+        for user in rng.sample(range(self.users), min(self.users, rng.choice([0, 0, 1, 2, 3, 6]))):
+            rating = rng.choices(range(1, 6), RATING_WEIGHTS)[0]
+            approved = rng.random() < 0.9
+            histogram[rating] += approved
+            reviews.append(Review(
+                product_id=product_id, user_id=self.user_start + user, rating=rating,
+                title='Synthetic review', comment='Generated for load testing.', is_approved=approved,
+            ))
+        count = sum(histogram.values())
+        average = Decimal(sum(star * n for star, n in histogram.items()) / count) if count else Decimal(0)
+        return {
+            'rating_count': count,
+            'rating_avg': average.quantize(Decimal('0.01')),
+            **{f'rating_{star}': n for star, n in histogram.items()},
+        }
+
+    def rebuild_derived(self):
+        self.log(f'Category closure: {rebuild_closure()} rows')
+        self.log(f'Product listings: {rebuild_listings()} rows')
+        get_search_backend().rebuild()
+        bump_catalog_version('catalog', 'products', 'brands', 'categories', 'attributes')
+
+
+def generate(products, seed=0, batch_size=BATCH_SIZE, log=None):
+    """Generate a synthetic dataset sized by ``products``; see SyntheticCatalog."""
+    SyntheticCatalog(products, seed=seed, batch_size=batch_size, log=log).run()
@@ -1,3 +1,1468 @@
-from django.test import TestCase
+import json
+import os
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import autocomplete, facets, recommendations
+from .caching import bump_catalog_version
+from .facets import bitmap_to_ids, id_filter, ids_to_bitmap
+from . import tracking
+from .tracking import flush_views
+from .models import (
+    Category, Brand, Product, ProductImage, ProductAttribute,
+    ProductAttributeValue, ProductVariant, VariantAttributeValue,
+    Inventory, Review, ProductListing, CategoryClosure, ProductRecommendation,
+    RecentlyViewed, Wishlist
+)
+from users.models import CustomUser
+
+
+class CatalogFixtureMixin:
+    """Helpers for building a small catalog in tests."""
+
+    def create_catalog(self, count, category=None, brand=None, **product_kwargs):
+        category = category or Category.objects.get_or_create(name='Laptops')[0]
+        brand = brand or Brand.objects.get_or_create(name='Dell')[0]
+        offset = Product.objects.count()
+        products = []
+        for i in range(offset, offset + count):
+            defaults = {
+                'name': f'Laptop {i}',
+                'sku': f'SKU-{i:05d}',
+                'category': category,
+                'brand': brand,
+                'description': f'Laptop number {i}',
+                'price': Decimal('1000.00') + i,
+                'is_featured': True,
+            }
+            defaults.update(product_kwargs)
+            product = Product.objects.create(**defaults)
+            ProductImage.objects.create(product=product, image=f'products/{i}_1.jpg', is_primary=True)
+            ProductImage.objects.create(product=product, image=f'products/{i}_2.jpg')
+            products.append(product)
+        return products
+
+
+class ListQueryBudgetTests(CatalogFixtureMixin, TestCase):
+    """Every catalog list endpoint must stay within a fixed query budget, whatever the page size."""
+
+    BUDGETS = {
+        # COUNT + page, plus the MAX(updated_at)/COUNT validator aggregate
+        '/api/v1/products/products/': 3,
+        '/api/v1/products/products/featured/': 1,
+        '/api/v1/products/products/search/?q=laptop': 2,
+        '/api/v1/products/products/by_category/?slug=laptops': 2,
+        '/api/v1/products/products/by_brand/?slug=dell': 2,
+        '/api/v1/products/categories/laptops/products/': 2,
+        '/api/v1/products/brands/dell/products/': 2,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(ctx.captured_queries)
+
+    def test_query_budget_is_independent_of_result_size(self):
+        self.create_catalog(2)
+        small = {url: self.count_queries(url) for url in self.BUDGETS}
+        self.create_catalog(18)
+        for url, budget in self.BUDGETS.items():
+            with self.subTest(url=url):
+                large = self.count_queries(url)
+                self.assertLessEqual(large, budget)
+                self.assertEqual(large, small[url])
+
+    def test_primary_image_is_served_from_listing(self):
+        self.create_catalog(1)
+        response = self.client.get('/api/v1/products/products/featured/')
+        self.assertTrue(response.data['results'][0]['primary_image'].endswith('/media/products/0_1.jpg'))
+
+
+class KeysetPaginationTests(CatalogFixtureMixin, TestCase):
+    """Custom catalog actions page with a keyset cursor instead of OFFSET/COUNT."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.products = self.create_catalog(10)
+
+    def walk(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            url = response.data['next']
+        return pages
+
+    def test_walks_every_product_once_in_order(self):
+        for ordering, key in [('-created_at', None), ('price', 'price'), ('-name', 'name')]:
+            with self.subTest(ordering=ordering):
+                pages = self.walk(f'/api/v1/products/products/featured/?page_size=3&ordering={ordering}')
+                self.assertEqual([len(page['results']) for page in pages], [3, 3, 3, 1])
+                ids = [item['id'] for page in pages for item in page['results']]
+                self.assertEqual(len(set(ids)), 10)
+                if key:
+                    values = [item[key] for page in pages for item in page['results']]
+                    self.assertEqual(values, sorted(values, reverse=ordering.startswith('-')))
+
+    def test_previous_link_returns_the_prior_page(self):
+        pages = self.walk('/api/v1/products/products/featured/?page_size=4')
+        self.assertIsNone(pages[0]['previous'])
+        response = self.client.get(pages[1]['previous'])
+        self.assertEqual(response.data['results'], pages[0]['results'])
+        self.assertIsNone(response.data['previous'])
+
+    def test_later_pages_cost_the_same_and_never_count(self):
+        first = '/api/v1/products/products/featured/?page_size=3'
+        with CaptureQueriesContext(connection) as page_one:
+            response = self.client.get(first)
+        third = self.client.get(response.data['next']).data['next']
+        with CaptureQueriesContext(connection) as page_three:
+            self.client.get(third)
+        self.assertEqual(len(page_one.captured_queries), len(page_three.captured_queries))
+        for query in page_one.captured_queries + page_three.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/v1/products/products/featured/?cursor=bogus')
+        self.assertEqual(response.status_code, 404)
+
+    def test_tampered_cursor_is_rejected(self):
+        import base64
+
+        def cursor(**fields):
+            return base64.urlsafe_b64encode(json.dumps(fields).encode('utf-8')).decode('ascii')
+
+        for url, fields in [
+            ('/api/v1/products/products/featured/', {'v': 'garbage', 'pk': 1, 'o': '-created_at'}),
+            ('/api/v1/products/products/featured/', {'v': '2024-01-01T00:00:00', 'pk': 'x', 'o': '-created_at'}),
+            ('/api/v1/products/products/featured/', {'v': None, 'pk': 1, 'o': '-created_at'}),
+            ('/api/v1/products/products/featured/', {'v': '2024-01-01T00:00:00', 'pk': 10 ** 30, 'o': '-created_at'}),
+            ('/api/v1/products/products/search/', {'v': 'high', 'pk': 1, 'o': 'score'}),
+        ]:
+            response = self.client.get(url, {'q': 'laptop', 'cursor': cursor(**fields)})
+            self.assertEqual(response.status_code, 404, fields)
+
+
+class SearchIndexTests(CatalogFixtureMixin, TestCase):
+    """The FTS index follows catalog writes and ranks by relevance."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.brand = Brand.objects.create(name='Lenovo')
+        self.category = Category.objects.create(name='Ultrabooks')
+        self.thinkpad = Product.objects.create(
+            name='ThinkPad X1 Carbon', sku='TP-X1', category=self.category, brand=self.brand,
+            description='Business laptop with carbon fibre chassis', price=Decimal('1899.00'),
+        )
+        self.yoga = Product.objects.create(
+            name='Yoga Slim', sku='YG-7', category=self.category, brand=self.brand,
+            description='Thin convertible, nothing like a thinkpad', price=Decimal('999.00'),
+        )
+
+    def search(self, query):
+        response = self.client.get('/api/v1/products/products/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data['results']]
+
+    def test_ranks_name_matches_first_and_matches_prefixes(self):
+        self.assertEqual(self.search('thinkpad'), ['ThinkPad X1 Carbon', 'Yoga Slim'])
+        self.assertEqual(self.search('carb'), ['ThinkPad X1 Carbon'])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.yoga.name = 'Yoga Pro'
+        self.yoga.save()
+        self.assertEqual(self.search('pro'), ['Yoga Pro'])
+        self.brand.name = 'Legion'
+        self.brand.save()
+        self.assertEqual(len(self.search('legion')), 2)
+        self.thinkpad.is_active = False
+        self.thinkpad.save()
+        self.assertEqual(self.search('carbon'), [])
+        self.yoga.delete()
+        self.assertEqual(self.search('legion'), [])
+
+    def test_pages_forward_with_cursor(self):
+        self.create_catalog(7, category=self.category, brand=self.brand)
+        seen = []
+        url = '/api/v1/products/products/search/?q=laptop&page_size=3'
+        while url:
+            response = self.client.get(url)
+            seen += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(seen), 8)
+        self.assertEqual(len(set(seen)), 8)
+
+    def test_query_syntax_is_treated_as_text(self):
+        self.assertEqual(self.search('"carbon" OR NEAR('), [])
+
+
+@override_settings(CATALOG_INDEX_BACKGROUND_REBUILD=False)
+class AutocompleteTests(CatalogFixtureMixin, TestCase):
+    """Autocomplete is served from the in-process prefix index."""
+
+    url = '/api/v1/products/products/autocomplete/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.brand = Brand.objects.create(name='Lenovo')
+        self.category = Category.objects.create(name='Ultrabooks')
+        Product.objects.create(
+            name='ThinkPad X1 Carbon', sku='TP-X1', category=self.category, brand=self.brand,
+            description='Business laptop', price=Decimal('1899.00'),
+        )
+
+    def suggest(self, query):
+        return [(item['type'], item['text']) for item in self.client.get(self.url, {'q': query}).data['results']]
+
+    def test_matches_names_words_and_skus(self):
+        self.assertEqual(self.suggest('len'), [('brand', 'Lenovo')])
+        self.assertEqual(self.suggest('ultra'), [('category', 'Ultrabooks')])
+        self.assertEqual(self.suggest('carb'), [('product', 'ThinkPad X1 Carbon')])
+        self.assertEqual(self.suggest('tp-'), [('sku', 'TP-X1')])
+        self.assertEqual(self.suggest(''), [])
+
+    def test_hot_path_does_not_hit_the_database(self):
+        self.suggest('think')
+        with self.assertNumQueries(0):
+            self.suggest('thinkp')
+
+    def test_index_refreshes_after_catalog_writes(self):
+        self.suggest('think')
+        self.brand.name = 'Legion'
+        self.brand.save()
+        self.assertEqual(self.suggest('leg'), [('brand', 'Legion')])
+        self.assertEqual(self.suggest('len'), [])
+
+    def test_stale_index_is_rebuilt_off_the_request_path(self):
+        self.suggest('think')
+        self.brand.name = 'Legion'
+        self.brand.save()
+        with override_settings(CATALOG_INDEX_BACKGROUND_REBUILD=True), \
+                mock.patch('products.caching.threading.Thread') as thread:
+            with self.assertNumQueries(0):
+                self.assertEqual(self.suggest('len'), [('brand', 'Lenovo')])
+            self.suggest('len')
+        thread.return_value.start.assert_called_once_with()
+        autocomplete._index.rebuild(*thread.call_args.kwargs['args'])
+        self.assertEqual(self.suggest('leg'), [('brand', 'Legion')])
+        self.assertFalse(autocomplete._index.rebuilding)
+
+
+@override_settings(CATALOG_INDEX_BACKGROUND_REBUILD=False)
+class FacetTests(CatalogFixtureMixin, TestCase):
+    """Attribute filters and facet counts come from the bitmap index."""
+
+    url = '/api/v1/products/products/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.products = self.create_catalog(4)
+        ram = ProductAttribute.objects.create(name='RAM')
+        storage = ProductAttribute.objects.create(name='Storage')
+        for product, (ram_value, storage_value) in zip(self.products, [
+            ('16GB', '512GB'), ('16GB', '1TB'), ('32GB', '512GB'), ('8GB', '256GB'),
+        ]):
+            ProductAttributeValue.objects.create(product=product, attribute=ram, value=ram_value)
+            ProductAttributeValue.objects.create(product=product, attribute=storage, value=storage_value)
+        # A variant contributes its own values to its product.
+        variant = ProductVariant.objects.create(
+            product=self.products[3], name='Upgraded', sku='SKU-00003-UP', price=Decimal('1200.00')
+        )
+        VariantAttributeValue.objects.create(variant=variant, attribute=ram, value='32GB')
+
+    def facet_counts(self, data, attribute):
+        facet = next(f for f in data['facets'] if f['attribute'] == attribute)
+        return {v['value']: v['count'] for v in facet['values']}
+
+    def test_bitmap_round_trip(self):
+        ids = [1, 7, 8, 63, 64, 1000]
+        self.assertEqual(bitmap_to_ids(ids_to_bitmap(ids)), ids)
+        self.assertEqual(bitmap_to_ids(0), [])
+
+    def test_filters_intersect_attributes_and_union_values(self):
+        response = self.client.get(self.url, {'attr': ['RAM:16GB', 'Storage:512GB']})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.products[0].id])
+        response = self.client.get(self.url, {'attr': ['RAM:16GB', 'RAM:32GB']})
+        self.assertEqual(response.data['count'], 4)
+
+    def test_facet_counts_ignore_their_own_selection(self):
+        response = self.client.get(self.url, {'attr': 'RAM:16GB'})
+        self.assertEqual(self.facet_counts(response.data, 'RAM'), {'16GB': 2, '32GB': 2, '8GB': 1})
+        self.assertEqual(self.facet_counts(response.data, 'Storage'), {'512GB': 1, '1TB': 1})
+
+    def test_facets_respect_other_filters_and_refresh(self):
+        other = Brand.objects.create(name='HP')
+        self.products[2].brand = other
+        self.products[2].save()
+        response = self.client.get(self.url, {'brand': other.id, 'facets': 1})
+        self.assertEqual(self.facet_counts(response.data, 'RAM'), {'32GB': 1})
+
+    def test_indexed_filters_skip_the_id_scan(self):
+        with mock.patch('products.views.ids_to_bitmap', wraps=ids_to_bitmap) as scan:
+            response = self.client.get(self.url, {'attr': 'RAM:16GB', 'brand': self.products[0].brand_id, 'facets': 1})
+            self.assertEqual(response.data['count'], 2)
+            self.assertEqual(self.facet_counts(response.data, 'RAM'), {'16GB': 2, '32GB': 2, '8GB': 1})
+            scan.assert_not_called()
+            # A price range is not in the index; the matching ids come from SQL.
+            response = self.client.get(self.url, {'attr': 'RAM:16GB', 'max_price': '1000.50'})
+            self.assertEqual([p['id'] for p in response.data['results']], [self.products[0].id])
+            scan.assert_called_once()
+
+    def test_malformed_filter_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'attr': 'RAM'}).status_code, 400)
+
+    def test_id_filter_binds_one_parameter(self):
+        ids = [product.id for product in self.products[:2]] + list(range(10 ** 6, 10 ** 6 + 50000))
+        with CaptureQueriesContext(connection) as queries:
+            matched = set(ProductListing.objects.filter(id_filter(ids)).values_list('product_id', flat=True))
+        self.assertEqual(matched, {product.id for product in self.products[:2]})
+        # A plain pk__in would bind 50002 variables, over SQLite's limit.
+        self.assertIn('json_each', queries[0]['sql'])
+
+    def test_stale_index_is_rebuilt_off_the_request_path(self):
+        index = facets.get_facet_index()
+        colour = ProductAttribute.objects.create(name='Colour')
+        ProductAttributeValue.objects.create(product=self.products[0], attribute=colour, value='Silver')
+        with override_settings(CATALOG_INDEX_BACKGROUND_REBUILD=True), \
+                mock.patch('products.caching.threading.Thread') as thread:
+            self.assertIs(facets.get_facet_index(), index)
+            self.assertIs(facets.get_facet_index(), index)
+        thread.return_value.start.assert_called_once_with()
+        facets._index.rebuild(*thread.call_args.kwargs['args'])
+        self.assertEqual(facets.get_facet_index().match('Colour', {'Silver'}), 1 << self.products[0].id)
+        self.assertFalse(facets._index.rebuilding)
+
+
+class ProductListingTests(CatalogFixtureMixin, TestCase):
+    """The listing read model follows writes to its source tables."""
+
+    def setUp(self):
+        self.product = self.create_catalog(1, price=Decimal('1000.00'))[0]
+
+    def listing(self):
+        return ProductListing.objects.get(product=self.product)
+
+    def test_tracks_prices_images_and_names(self):
+        self.product.sale_price = Decimal('750.00')
+        self.product.is_on_sale = True
+        self.product.save()
+        listing = self.listing()
+        self.assertEqual(listing.effective_price, Decimal('750.00'))
+        self.assertEqual(listing.discount_percentage, Decimal('25.00'))
+        self.assertEqual(listing.primary_image.name, 'products/0_1.jpg')
+
+        ProductImage.objects.create(product=self.product, image='products/new.jpg', is_primary=True)
+        self.assertEqual(self.listing().primary_image.name, 'products/new.jpg')
+
+        self.product.brand.name = 'Alienware'
+        self.product.brand.save()
+        self.assertEqual(self.listing().brand_name, 'Alienware')
+
+    def test_tracks_stock_and_reviews(self):
+        Inventory.objects.create(product=self.product, quantity=3)
+        variant = ProductVariant.objects.create(
+            product=self.product, name='32GB', sku='SKU-V', price=Decimal('1100.00')
+        )
+        Inventory.objects.create(variant=variant, quantity=2)
+        self.assertEqual(self.listing().stock_quantity, 5)
+        self.assertTrue(self.listing().in_stock)
+
+        user = CustomUser.objects.create_user(email='a@example.com', password='x')
+        Review.objects.create(product=self.product, user=user, rating=4, title='Good', comment='.', is_approved=True)
+        self.assertEqual((self.listing().rating_avg, self.listing().rating_count), (Decimal('4.00'), 1))
+
+    def test_inactive_and_deleted_products_leave_the_listing(self):
+        self.product.is_active = False
+        self.product.save()
+        self.assertFalse(ProductListing.objects.exists())
+        self.product.is_active = True
+        self.product.save()
+        self.product.delete()
+        self.assertFalse(ProductListing.objects.exists())
+
+    def test_rebuild_command(self):
+        ProductListing.objects.all().delete()
+        call_command('rebuild_product_listings', stdout=StringIO())
+        self.assertEqual(self.listing().name, self.product.name)
+
+
+class ResponseCacheTests(CatalogFixtureMixin, TestCase):
+    """Anonymous catalog reads are cached until a relevant write bumps their family."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = self.create_catalog(3)[0]
+
+    def test_repeated_reads_skip_the_database(self):
+        for url in ['/api/v1/products/products/', f'/api/v1/products/products/{self.product.slug}/',
+                    '/api/v1/products/categories/', '/api/v1/products/brands/dell/products/']:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(first.json(), second.json())
+
+    def test_writes_invalidate_dependent_families_only(self):
+        url = f'/api/v1/products/products/{self.product.slug}/'
+        self.client.get(url)
+        self.client.get('/api/v1/products/categories/')
+        Inventory.objects.create(product=self.product, quantity=7)
+        self.assertEqual(self.client.get(url).data['inventory']['quantity'], 7)
+        with self.assertNumQueries(0):
+            self.client.get('/api/v1/products/categories/')
+
+        self.product.brand.name = 'Renamed'
+        self.product.brand.save()
+        self.assertEqual(self.client.get(url).data['brand']['name'], 'Renamed')
+
+    def test_bumps_from_another_process_invalidate(self):
+        url = f'/api/v1/products/products/{self.product.slug}/'
+        self.client.get(url)
+        Product.objects.filter(pk=self.product.pk).update(name='Renamed')
+        # What a management command sees: its own handle on the shared store.
+        other_process = FileBasedCache(settings.CACHES['catalog']['LOCATION'], {})
+        with mock.patch('products.caching.stamps', other_process):
+            bump_catalog_version('products')
+        self.assertEqual(self.client.get(url).data['name'], 'Renamed')
+
+    def test_authenticated_requests_bypass_the_cache(self):
+        url = '/api/v1/products/products/'
+        self.client.get(url)
+        user = CustomUser.objects.create_user(email='a@example.com', password='x')
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertGreater(len(ctx.captured_queries), 0)
+
+
+class ConditionalGetTests(CatalogFixtureMixin, TestCase):
+    """Catalog resources carry validators and answer revalidation with 304."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = self.create_catalog(2)[0]
+        self.detail_url = f'/api/v1/products/products/{self.product.slug}/'
+
+    def test_list_etag_round_trip(self):
+        for url in ['/api/v1/products/products/', '/api/v1/products/categories/', '/api/v1/products/brands/']:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('ETag', response)
+                self.assertIn('Last-Modified', response)
+                with self.assertNumQueries(0):
+                    revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(revalidated.status_code, 304)
+                self.assertEqual(revalidated.content, b'')
+
+    def test_filters_get_their_own_etag(self):
+        first = self.client.get('/api/v1/products/products/')
+        filtered = self.client.get('/api/v1/products/products/', {'is_featured': 'false'})
+        self.assertNotEqual(first['ETag'], filtered['ETag'])
+
+    def test_detail_validators_follow_child_rows(self):
+        response = self.client.get(self.detail_url)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(
+            self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+        )
+
+        self.product.images.first().delete()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['images']), 1)
+
+    def test_unknown_detail_is_still_404(self):
+        self.assertEqual(self.client.get('/api/v1/products/products/missing/').status_code, 404)
+
+
+class DetailPrefetchTests(CatalogFixtureMixin, TestCase):
+    """retrieve and variants load the nested detail tree in a constant number of queries."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.attributes = [ProductAttribute.objects.create(name=f'Attr {i}') for i in range(10)]
+
+    def build(self, variants, attributes):
+        product = self.create_catalog(1)[0]
+        Inventory.objects.create(product=product, quantity=5)
+        for attribute in self.attributes[:attributes]:
+            ProductAttributeValue.objects.create(product=product, attribute=attribute, value='x')
+        for i in range(variants):
+            variant = ProductVariant.objects.create(
+                product=product, name=f'V{i}', sku=f'{product.sku}-{i}', price=Decimal('999.00')
+            )
+            Inventory.objects.create(variant=variant, quantity=i)
+            for attribute in self.attributes[:3]:
+                VariantAttributeValue.objects.create(variant=variant, attribute=attribute, value='y')
+        return product
+
+    def count(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_retrieve_query_count_is_constant(self):
+        small = self.build(variants=1, attributes=1)
+        large = self.build(variants=4, attributes=10)
+        small_count, _ = self.count(f'/api/v1/products/products/{small.slug}/')
+        large_count, response = self.count(f'/api/v1/products/products/{large.slug}/')
+        # validators, product + category + brand + inventory, images,
+        # attribute values, variants + inventory, variant attribute values
+        self.assertEqual(large_count, small_count)
+        self.assertLessEqual(large_count, 6)
+        self.assertEqual(len(response.data['variants']), 4)
+        self.assertEqual(len(response.data['attribute_values']), 10)
+        self.assertEqual(response.data['variants'][0]['attribute_values'][0]['attribute_name'], 'Attr 0')
+
+    def test_variants_query_count_is_constant(self):
+        small = self.build(variants=1, attributes=0)
+        large = self.build(variants=4, attributes=0)
+        small_count, _ = self.count(f'/api/v1/products/products/{small.slug}/variants/')
+        large_count, _ = self.count(f'/api/v1/products/products/{large.slug}/variants/')
+        self.assertEqual(large_count, small_count)
+        self.assertLessEqual(large_count, 3)
+
+
+class RatingAggregateTests(CatalogFixtureMixin, TestCase):
+    """Review approvals, edits and deletes keep Product rating aggregates current."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = self.create_catalog(1)[0]
+        self.users = [
+            CustomUser.objects.create_user(email=f'r{i}@example.com', password='x') for i in range(3)
+        ]
+
+    def review(self, user, rating, approved=True):
+        return Review.objects.create(
+            product=self.product, user=user, rating=rating, title='t', comment='c', is_approved=approved
+        )
+
+    def assertRatings(self, avg, count, histogram):
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(product.rating_avg, Decimal(avg))
+        self.assertEqual(product.rating_count, count)
+        self.assertEqual(product.rating_histogram, histogram)
+        listing = ProductListing.objects.get(pk=self.product.pk)
+        self.assertEqual((listing.rating_avg, listing.rating_count), (Decimal(avg), count))
+
+    def test_approve_edit_and_delete_apply_deltas(self):
+        first = self.review(self.users[0], 5)
+        pending = self.review(self.users[1], 1, approved=False)
+        self.assertRatings('5.00', 1, {1: 0, 2: 0, 3: 0, 4: 0, 5: 1})
+
+        pending.is_approved = True
+        pending.save()
+        self.assertRatings('3.00', 2, {1: 1, 2: 0, 3: 0, 4: 0, 5: 1})
+
+        first.rating = 4
+        first.save()
+        self.assertRatings('2.50', 2, {1: 1, 2: 0, 3: 0, 4: 1, 5: 0})
+
+        pending.delete()
+        self.assertRatings('4.00', 1, {1: 0, 2: 0, 3: 0, 4: 1, 5: 0})
+
+        first.is_approved = False
+        first.save()
+        self.assertRatings('0.00', 0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0})
+
+    def test_rating_changes_move_updated_at(self):
+        stale = timezone.now() - timedelta(days=1)
+        Product.objects.filter(pk=self.product.pk).update(updated_at=stale)
+        self.review(self.users[0], 4)
+        self.assertGreater(Product.objects.get(pk=self.product.pk).updated_at, stale)
+
+        Product.objects.filter(pk=self.product.pk).update(rating_count=9, updated_at=stale)
+        call_command('reconcile_review_ratings', stdout=StringIO())
+        self.assertGreater(Product.objects.get(pk=self.product.pk).updated_at, stale)
+
+    def test_reconcile_repairs_drift(self):
+        self.review(self.users[0], 4)
+        self.review(self.users[1], 2)
+        Product.objects.filter(pk=self.product.pk).update(rating_count=9, rating_4=0, rating_avg=0)
+
+        out = StringIO()
+        call_command('reconcile_review_ratings', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertRatings('3.00', 2, {1: 0, 2: 1, 3: 0, 4: 1, 5: 0})
+
+    def test_order_list_by_rating(self):
+        other = self.create_catalog(1)[0]
+        self.review(self.users[0], 2)
+        Review.objects.create(product=other, user=self.users[1], rating=5, title='t', comment='c', is_approved=True)
+        response = self.client.get('/api/v1/products/products/?ordering=-rating_avg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], [other.pk, self.product.pk])
+        self.assertEqual(response.data['results'][0]['rating_avg'], 5.0)
+
+
+class ReviewFeedTests(CatalogFixtureMixin, TestCase):
+    """Review feeds are cursor-paginated and join the author in the same query."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = self.create_catalog(1)[0]
+        self.users = [
+            CustomUser.objects.create_user(email=f'r{i}@example.com', password='x') for i in range(5)
+        ]
+        for i, user in enumerate(self.users):
+            Review.objects.create(
+                product=self.product, user=user, rating=5, title='t', comment='c', is_approved=i % 2 == 0
+            )
+
+    def test_product_reviews_are_paginated(self):
+        url = f'/api/v1/products/products/{self.product.slug}/reviews/?page_size=2'
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # product lookup, reviews joined with their authors
+        self.assertEqual(len(ctx.captured_queries), 2)
+        emails = [review['user_email'] for review in response.data['results']]
+        self.assertEqual(emails, ['r4@example.com', 'r2@example.com'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([review['user_email'] for review in response.data['results']], ['r0@example.com'])
+        self.assertIsNone(response.data['next'])
+
+    def test_moderation_queue_lists_pending_reviews(self):
+        staff = CustomUser.objects.create_user(email='staff@example.com', password='x', is_staff=True)
+        self.client.force_authenticate(staff)
+        response = self.client.get('/api/v1/products/reviews/pending/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([review['user_email'] for review in response.data['results']], ['r3@example.com', 'r1@example.com'])
+
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.get('/api/v1/products/reviews/pending/').status_code, 403)
+
+    def test_duplicate_review_is_rejected(self):
+        self.client.force_authenticate(self.users[0])
+        response = self.client.post('/api/v1/products/reviews/', {
+            'product': self.product.pk, 'rating': 4, 'title': 't', 'comment': 'c',
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class EffectivePriceTests(CatalogFixtureMixin, TestCase):
+    """effective_price is what the customer pays and drives price sorting and range filters."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.cheap_list, self.on_sale = self.create_catalog(2)
+        self.on_sale.price = Decimal('2000.00')
+        self.on_sale.sale_price = Decimal('500.00')
+        self.on_sale.is_on_sale = True
+        self.on_sale.save()
+
+    def test_generated_column_tracks_sale_price(self):
+        self.assertEqual(self.on_sale.effective_price, Decimal('500.00'))
+        self.on_sale.is_on_sale = False
+        self.on_sale.save()
+        self.assertEqual(self.on_sale.effective_price, Decimal('2000.00'))
+        self.assertEqual(Product.objects.get(pk=self.on_sale.pk).effective_price, Decimal('2000.00'))
+
+    def test_zero_sale_price_is_not_a_sale(self):
+        self.on_sale.sale_price = Decimal('0.00')
+        self.on_sale.save()
+        product = Product.objects.get(pk=self.on_sale.pk)
+        self.assertEqual(product.effective_price, Decimal('2000.00'))
+        self.assertEqual(product.current_price, product.effective_price)
+        self.assertEqual(product.discount_percentage, 0)
+        self.assertEqual(ProductListing.objects.get(pk=product.pk).effective_price, Decimal('2000.00'))
+
+    def test_order_and_filter_by_effective_price(self):
+        response = self.client.get('/api/v1/products/products/?ordering=effective_price')
+        self.assertEqual([item['id'] for item in response.data['results']], [self.on_sale.pk, self.cheap_list.pk])
+
+        response = self.client.get('/api/v1/products/products/?min_price=600&max_price=1500')
+        self.assertEqual([item['id'] for item in response.data['results']], [self.cheap_list.pk])
+
+    def test_price_range_across_variants(self):
+        for i, price in enumerate(['1200.00', '1800.00']):
+            ProductVariant.objects.create(
+                product=self.cheap_list, name=f'V{i}', sku=f'V-{i}', price=Decimal(price)
+            )
+        ProductVariant.objects.create(
+            product=self.cheap_list, name='Sale', sku='V-sale', price=Decimal('1500.00'),
+            sale_price=Decimal('900.00'), is_on_sale=True,
+        )
+        listing = ProductListing.objects.get(pk=self.cheap_list.pk)
+        self.assertEqual((listing.price_min, listing.price_max), (Decimal('900.00'), Decimal('1800.00')))
+
+        response = self.client.get(f'/api/v1/products/products/{self.cheap_list.slug}/')
+        self.assertEqual((response.data['price_min'], response.data['price_max']), ('900.00', '1800.00'))
+        self.assertEqual(
+            sorted(variant['effective_price'] for variant in response.data['variants']),
+            ['1200.00', '1800.00', '900.00'],
+        )
+
+        listing = ProductListing.objects.get(pk=self.on_sale.pk)
+        self.assertEqual((listing.price_min, listing.price_max), (Decimal('500.00'), Decimal('500.00')))
+
+
+class CategoryTreeTests(CatalogFixtureMixin, TestCase):
+    """The closure table resolves category subtrees in one query and follows moves."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.laptops = Category.objects.create(name='Laptops')
+        self.gaming = Category.objects.create(name='Gaming', parent=self.laptops)
+        self.esports = Category.objects.create(name='Esports', parent=self.gaming)
+        self.ultrabooks = Category.objects.create(name='Ultrabooks', parent=self.laptops)
+        self.accessories = Category.objects.create(name='Accessories')
+
+    def subtree_names(self, category):
+        return sorted(category.subtree().values_list('name', flat=True))
+
+    def test_closure_rows_follow_inserts_and_moves(self):
+        self.assertEqual(self.subtree_names(self.laptops), ['Esports', 'Gaming', 'Laptops', 'Ultrabooks'])
+        self.assertEqual(
+            CategoryClosure.objects.get(ancestor=self.laptops, descendant=self.esports).depth, 2
+        )
+
+        self.gaming.parent = self.accessories
+        self.gaming.save()
+        self.assertEqual(self.subtree_names(self.laptops), ['Laptops', 'Ultrabooks'])
+        self.assertEqual(self.subtree_names(self.accessories), ['Accessories', 'Esports', 'Gaming'])
+
+        call_command('rebuild_category_closure', stdout=StringIO())
+        self.assertEqual(self.subtree_names(self.accessories), ['Accessories', 'Esports', 'Gaming'])
+
+    def test_category_products_include_subcategories(self):
+        self.create_catalog(1, category=self.laptops)
+        self.create_catalog(1, category=self.esports)
+        self.create_catalog(1, category=self.accessories)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/v1/products/categories/{self.laptops.slug}/products/')
+        self.assertEqual(len(response.data['results']), 2)
+        # category lookup, one product query joined to the closure table
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+        response = self.client.get(f'/api/v1/products/products/by_category/?slug={self.gaming.slug}')
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_tree_endpoint(self):
+        response = self.client.get('/api/v1/products/categories/tree/')
+        self.assertEqual([node['name'] for node in response.data], ['Accessories', 'Laptops'])
+        laptops = response.data[1]
+        self.assertEqual([node['name'] for node in laptops['children']], ['Gaming', 'Ultrabooks'])
+        self.assertEqual(laptops['children'][0]['children'][0]['name'], 'Esports')
+
+        response = self.client.get(f'/api/v1/products/categories/tree/?root={self.gaming.slug}')
+        self.assertEqual([node['name'] for node in response.data], ['Gaming'])
+
+    def test_cannot_move_under_own_subtree(self):
+        admin = CustomUser.objects.create_user(email='admin@example.com', password='x', is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.patch(
+            f'/api/v1/products/categories/{self.laptops.slug}/', {'parent': self.esports.pk}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+        for parent in (self.esports, self.laptops):
+            self.laptops.parent = parent
+            with self.assertRaises(ValidationError):
+                self.laptops.full_clean()
+        self.laptops.parent = self.accessories
+        self.laptops.full_clean()
+
+    def test_closure_migration_survives_parent_cycles(self):
+        from importlib import import_module
+        from django.apps import apps
+        populate_closure = import_module('products.migrations.0009_category_closure').populate_closure
+        Category.objects.filter(pk=self.laptops.pk).update(parent=self.esports)
+        CategoryClosure.objects.all().delete()
+        populate_closure(apps, None)
+        self.assertEqual(self.subtree_names(self.accessories), ['Accessories'])
+        self.assertEqual(CategoryClosure.objects.filter(descendant=self.esports).count(), 3)
+
+
+class CompareTests(CatalogFixtureMixin, TestCase):
+    """compare pivots attribute values for N products in a constant number of queries."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.ram = ProductAttribute.objects.create(name='RAM')
+        self.cpu = ProductAttribute.objects.create(name='CPU')
+        self.products = self.create_catalog(5)
+        for i, product in enumerate(self.products):
+            ProductAttributeValue.objects.create(product=product, attribute=self.cpu, value='i7')
+            if i % 2 == 0:
+                ProductAttributeValue.objects.create(product=product, attribute=self.ram, value=f'{8 * (i + 1)}GB')
+
+    def compare(self, products):
+        cache.clear()
+        ids = ','.join(str(product.pk) for product in products)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/v1/products/products/compare/?ids={ids}')
+        return len(ctx.captured_queries), response
+
+    def test_matrix_in_constant_queries(self):
+        small, _ = self.compare(self.products[:2])
+        large, response = self.compare(list(reversed(self.products)))
+        self.assertEqual(small, large)
+        self.assertEqual(large, 2)
+        self.assertEqual([item['id'] for item in response.data['products']], [p.pk for p in reversed(self.products)])
+        cpu, ram = response.data['attributes']
+        self.assertEqual((cpu['attribute'], cpu['differs']), ('CPU', False))
+        self.assertEqual(ram['values'], ['40GB', None, '24GB', None, '8GB'])
+        self.assertTrue(ram['differs'])
+        self.assertIn('stock_quantity', response.data['products'][0])
+
+    def test_rejects_bad_id_lists(self):
+        ids = ','.join(str(pk) for pk in range(1, 9))
+        self.assertEqual(self.client.get(f'/api/v1/products/products/compare/?ids={ids}').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/products/products/compare/?ids=1,x').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/products/products/compare/?ids=1').status_code, 400)
+
+
+class RecommendationTests(CatalogFixtureMixin, TestCase):
+    """Co-view/co-purchase neighbours are built offline and served from one indexed read."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.a, self.b, self.c, self.d = self.create_catalog(4)
+        self.users = [CustomUser.objects.create_user(email=f'u{i}@example.com', password='x') for i in range(3)]
+
+    def view(self, user, *products):
+        for product in products:
+            RecentlyViewed.objects.create(user=user, product=product)
+
+    def buy(self, *products):
+        from orders.models import Order, OrderItem
+        order = Order.objects.create(email='buyer@example.com')
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, price=product.price)
+
+    def test_build_and_serve_neighbours(self):
+        self.view(self.users[0], self.a, self.b, self.c)
+        self.view(self.users[1], self.a, self.b)
+        self.buy(self.a, self.c)
+        self.buy(self.a, self.c)
+
+        out = StringIO()
+        call_command('build_recommendations', stdout=out)
+        self.assertIn('Stored', out.getvalue())
+        ranked = list(
+            ProductRecommendation.objects.filter(product=self.a).values_list('recommended_id', flat=True)
+        )
+        # Purchases outweigh views: C (1 co-view + 2 co-purchases) beats B (2 co-views).
+        self.assertEqual(ranked, [self.c.pk, self.b.pk])
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/v1/products/products/{self.a.slug}/related/')
+        self.assertEqual(response.data['source'], 'behaviour')
+        self.assertEqual([item['id'] for item in response.data['results']], [self.c.pk, self.b.pk])
+        self.assertLessEqual(len(ctx.captured_queries), 2)
+
+    def test_long_baskets_keep_their_most_recent_products(self):
+        with mock.patch('products.recommendations.MAX_BASKET_SIZE', 2):
+            pairs, items = recommendations.cooccurrence([{30: None, 20: None, 10: None}])
+        self.assertEqual(dict(pairs), {(20, 30): 1})
+        self.assertEqual(set(items), {20, 30})
+
+        self.view(self.users[0], self.a, self.b)
+        RecentlyViewed.objects.filter(product=self.a).update(viewed_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual([list(basket) for basket in recommendations.view_baskets()], [[self.a.pk, self.b.pk]])
+
+    def test_cold_start_falls_back_to_brand_and_category(self):
+        other_brand = Brand.objects.create(name='Lenovo')
+        other = self.create_catalog(1, brand=other_brand)[0]
+        unrelated = self.create_catalog(
+            1, category=Category.objects.create(name='Tablets'), brand=Brand.objects.create(name='Apple')
+        )[0]
+        response = self.client.get(f'/api/v1/products/products/{self.d.slug}/related/')
+        self.assertEqual(response.data['source'], 'similar')
+        ids = [item['id'] for item in response.data['results']]
+        self.assertEqual(ids[-1], other.pk)
+        self.assertEqual(set(ids[:-1]), {self.a.pk, self.b.pk, self.c.pk})
+        self.assertNotIn(unrelated.pk, ids)
+
+
+class ViewTrackingTests(CatalogFixtureMixin, TestCase):
+    """track_view buffers views in memory and flushes them as one upsert."""
+
+    def setUp(self):
+        cache.clear()
+        flush_views()
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(email='viewer@example.com', password='x')
+        self.client.force_authenticate(self.user)
+        self.products = self.create_catalog(4)
+
+    def track(self, product):
+        return self.client.post(f'/api/v1/products/products/{product.slug}/track_view/')
+
+    def test_views_are_buffered_then_flushed(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.track(self.products[0]).status_code, 200)
+        writes = [q for q in ctx.captured_queries if 'recentlyviewed' in q['sql'].lower()]
+        self.assertEqual(writes, [])
+        self.assertFalse(RecentlyViewed.objects.exists())
+
+        self.track(self.products[1])
+        self.track(self.products[0])
+        self.assertEqual(flush_views(), 2)
+        self.assertEqual(
+            list(RecentlyViewed.objects.filter(user=self.user).values_list('product_id', flat=True)),
+            [self.products[0].pk, self.products[1].pk],
+        )
+        self.assertEqual(flush_views(), 0)
+
+    @override_settings(RECENTLY_VIEWED_LIMIT=2)
+    def test_history_is_capped_per_user(self):
+        for product in self.products:
+            self.track(product)
+            flush_views()
+        self.assertEqual(
+            list(RecentlyViewed.objects.filter(user=self.user).values_list('product_id', flat=True)),
+            [self.products[3].pk, self.products[2].pk],
+        )
+
+    def test_deleted_products_are_skipped(self):
+        self.track(self.products[0])
+        self.track(self.products[1])
+        self.products[1].delete()
+        self.assertEqual(flush_views(), 1)
+
+    @override_settings(RECENTLY_VIEWED_BUFFER_SIZE=2)
+    def test_buffer_is_capped_while_a_flusher_runs(self):
+        with mock.patch.object(tracking, '_flusher', mock.Mock(**{'is_alive.return_value': True})):
+            for product in self.products[:3]:
+                self.track(product)
+            self.assertEqual(
+                [product_id for _, product_id in tracking._buffer],
+                [self.products[1].pk, self.products[2].pk],
+            )
+        self.assertFalse(RecentlyViewed.objects.exists())
+        self.assertEqual(flush_views(), 2)
+
+    def test_flusher_survives_failed_flushes(self):
+        class Stop(BaseException):
+            pass
+
+        with mock.patch.object(tracking.time, 'sleep', side_effect=[None, None, Stop]), \
+                mock.patch.object(tracking, 'flush_views', side_effect=[OperationalError('locked'), 0]) as flush, \
+                self.assertLogs('products.tracking', 'ERROR'):
+            with self.assertRaises(Stop):
+                tracking._run_flusher()
+        self.assertEqual(flush.call_count, 2)
+
+
+class WishlistMembershipTests(CatalogFixtureMixin, TestCase):
+    """in_wishlist comes from one cached id set per user; bulk edits are set-based."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(email='fan@example.com', password='x')
+        self.products = self.create_catalog(5)
+        Wishlist.objects.create(user=self.user, product=self.products[1])
+
+    def test_list_and_detail_flag_wishlisted_products(self):
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/products/products/')
+        flags = {item['id']: item['in_wishlist'] for item in response.data['results']}
+        self.assertEqual([pk for pk, flag in flags.items() if flag], [self.products[1].pk])
+        wishlist_queries = [q for q in ctx.captured_queries if 'products_wishlist' in q['sql']]
+        self.assertEqual(len(wishlist_queries), 1)
+
+        response = self.client.get(f'/api/v1/products/products/{self.products[1].slug}/')
+        self.assertTrue(response.data['in_wishlist'])
+
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/v1/products/products/')
+        self.assertFalse(any(item['in_wishlist'] for item in response.data['results']))
+
+    def test_etag_changes_with_wishlist(self):
+        self.client.force_authenticate(self.user)
+        url = f'/api/v1/products/products/{self.products[0].slug}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Wishlist.objects.create(user=self.user, product=self.products[0])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['in_wishlist'])
+
+    def test_bulk_add_and_remove(self):
+        self.client.force_authenticate(self.user)
+        ids = [self.products[0].pk, self.products[1].pk, self.products[2].pk, 9999]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                '/api/v1/products/wishlist/bulk/',
+                {'add': ids, 'remove': [self.products[1].pk]}, format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['removed'], 1)
+        self.assertEqual(response.data['added'], 3)
+        self.assertEqual(response.data['product_ids'], sorted(ids[:3]))
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT') and 'products_wishlist' in q['sql']]
+        self.assertEqual(len(inserts), 1)
+
+        response = self.client.post('/api/v1/products/wishlist/bulk/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ImportProductsTests(TestCase):
+    """import_products streams CSV/JSONL in chunks with per-row error reports."""
+
+    JSONL = '\n'.join([
+        json.dumps({
+            'sku': 'IMP-1', 'name': 'Import One', 'category': 'Laptops', 'brand': 'Dell',
+            'price': '999.00', 'stock': 4, 'attributes': {'RAM': '16GB'},
+            'variants': [
+                {'sku': 'IMP-1-A', 'name': 'A', 'price': '1099.00', 'stock': 2, 'attributes': {'Color': 'Black'}},
+            ],
+        }),
+        json.dumps({'sku': 'IMP-2', 'name': 'Import Two', 'category': 'Tablets', 'brand': 'Apple', 'price': 'abc'}),
+        '{not json',
+        json.dumps({'sku': 'IMP-3', 'name': 'Import Three', 'category': 'Tablets', 'brand': 'Apple', 'price': '499'}),
+    ])
+
+    CSV = (
+        'sku,product_sku,name,category,brand,price,sale_price,is_on_sale,stock,attr:RAM\n'
+        'CSV-1,,Csv One,Laptops,HP,1200,1000,true,7,32GB\n'
+        'CSV-1-A,CSV-1,Csv One A,,,1300,,,1,\n'
+        'CSV-2,,Csv Two,Laptops,HP,,,,,\n'
+        'CSV-3-A,MISSING,Orphan,,,10,,,,\n'
+    )
+
+    def run_import(self, text, format, **kwargs):
+        from .importing import import_products
+        return import_products(StringIO(text), format, **kwargs)
+
+    def test_jsonl_import_with_errors(self):
+        result = self.run_import(self.JSONL, 'jsonl', chunk_size=2)
+        self.assertEqual((result.products_created, result.variants_created), (2, 1))
+        self.assertEqual([error['line'] for error in result.errors], [3, 2])
+        product = Product.objects.get(sku='IMP-1')
+        self.assertEqual(product.inventory.quantity, 4)
+        self.assertEqual(product.attribute_values.get().value, '16GB')
+        variant = product.variants.get()
+        self.assertEqual((variant.inventory.quantity, variant.attribute_values.get().value), (2, 'Black'))
+        listing = ProductListing.objects.get(pk=product.pk)
+        self.assertEqual((listing.stock_quantity, listing.price_max), (6, Decimal('1099.00')))
+        self.assertTrue(Category.objects.get(name='Tablets').descendant_links.exists())
+
+        # Re-importing updates in place.
+        result = self.run_import(self.JSONL, 'jsonl')
+        self.assertEqual((result.products_created, result.products_updated), (0, 2))
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_csv_import(self):
+        result = self.run_import(self.CSV, 'csv')
+        self.assertEqual((result.products_created, result.variants_created), (1, 1))
+        self.assertEqual(result.error_count, 2)
+        product = Product.objects.get(sku='CSV-1')
+        self.assertEqual((product.effective_price, product.inventory.quantity), (Decimal('1000.00'), 7))
+        self.assertEqual(product.variants.get().sku, 'CSV-1-A')
+
+    def test_dry_run_writes_nothing(self):
+        result = self.run_import(self.JSONL, 'jsonl', dry_run=True)
+        self.assertEqual(result.products_created, 2)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Category.objects.filter(name='Tablets').exists())
+
+    def test_rows_are_checked_against_column_lengths_and_slugs(self):
+        Brand.objects.create(name='Dell')
+        text = (
+            'sku,name,category,brand,price\n'
+            f'{"S" * 51},Long Sku,Laptops,Dell,10\n'
+            f'LEN-1,{"N" * 256},Laptops,Dell,10\n'
+            f'LEN-2,Long Brand,Laptops,{"B" * 101},10\n'
+            'LEN-3,Clashing Brand,Laptops,DELL,10\n'
+            'LEN-4,Fine,Laptops,Dell,10\n'
+        )
+        result = self.run_import(text, 'csv')
+        self.assertEqual([error['line'] for error in result.errors], [2, 3, 4, 5])
+        self.assertIn('same slug', result.errors[3]['error'])
+        self.assertEqual(list(Product.objects.values_list('sku', flat=True)), ['LEN-4'])
+        self.assertFalse(Brand.objects.filter(name='DELL').exists())
+
+    def test_database_errors_are_isolated_to_their_rows(self):
+        from .importing import ProductImporter
+        write_stock = ProductImporter.write_stock
+
+        def failing_write_stock(importer, owner, rows):
+            if any(row['sku'] == 'BAD' for _, row in rows):
+                raise IntegrityError('stock rejected')
+            return write_stock(importer, owner, rows)
+
+        text = 'sku,name,category,brand,price,stock\n' + ''.join(
+            f'{sku},Product {sku},Laptops,Dell,10,1\n' for sku in ['OK-1', 'OK-2', 'BAD', 'OK-3', 'OK-4']
+        )
+        with mock.patch.object(ProductImporter, 'write_stock', failing_write_stock):
+            result = self.run_import(text, 'csv')
+        self.assertEqual(result.products_created, 4)
+        self.assertEqual(result.errors, [{'line': 4, 'error': 'rejected by the database: stock rejected'}])
+        self.assertFalse(Product.objects.filter(sku='BAD').exists())
+        self.assertEqual(Inventory.objects.count(), 4)
+
+    def test_command_and_upload_endpoint(self):
+        import tempfile
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as handle:
+            handle.write(self.JSONL)
+        self.addCleanup(os.remove, handle.name)
+        out = StringIO()
+        call_command('import_products', handle.name, stdout=out, stderr=StringIO())
+        self.assertIn('Products: 2 created', out.getvalue())
+
+        client = APIClient()
+        upload = SimpleUploadedFile('products.csv', self.CSV.encode('utf-8'), content_type='text/csv')
+        self.assertEqual(client.post('/api/v1/products/products/bulk_import/', {'file': upload}).status_code, 401)
+        client.force_authenticate(CustomUser.objects.create_user(email='a@example.com', password='x', is_staff=True))
+        upload.seek(0)
+        response = client.post('/api/v1/products/products/bulk_import/', {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['products_created'], 1)
+
+
+class ExportProductsTests(CatalogFixtureMixin, TestCase):
+    """Exports stream chunk by chunk and round-trip through import_products."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            CustomUser.objects.create_user(email='admin@example.com', password='x', is_staff=True)
+        )
+        ram = ProductAttribute.objects.create(name='RAM')
+        self.products = self.create_catalog(3)
+        product = self.products[0]
+        Inventory.objects.create(product=product, quantity=3)
+        ProductAttributeValue.objects.create(product=product, attribute=ram, value='16GB')
+        variant = ProductVariant.objects.create(product=product, name='Big', sku='SKU-BIG', price=Decimal('1500.00'))
+        Inventory.objects.create(variant=variant, quantity=0)
+
+    def export(self, export_type):
+        response = self.client.get(f'/api/v1/products/products/export/?type={export_type}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_query_count_does_not_grow_with_catalog(self):
+        from .exporting import export_jsonl
+        with CaptureQueriesContext(connection) as small:
+            list(export_jsonl())
+        self.create_catalog(5)
+        with CaptureQueriesContext(connection) as large:
+            list(export_jsonl())
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_jsonl_and_csv_round_trip(self):
+        from .importing import import_products
+        jsonl = self.export('jsonl')
+        records = [json.loads(line) for line in jsonl.splitlines()]
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]['attributes'], {'RAM': '16GB'})
+        self.assertEqual(records[0]['variants'][0]['sku'], 'SKU-BIG')
+        self.assertTrue(records[0]['images'][0].startswith('http://testserver/media/products/'))
+
+        csv_text = self.export('csv')
+        self.assertTrue(csv_text.startswith('sku,product_sku,name'))
+        Product.objects.all().delete()
+        result = import_products(StringIO(csv_text), 'csv')
+        self.assertEqual((result.products_created, result.variants_created, result.error_count), (3, 1, 0))
+        product = Product.objects.get(sku=self.products[0].sku)
+        self.assertEqual(product.inventory.quantity, 3)
+        self.assertEqual(product.attribute_values.get().value, '16GB')
+
+    def test_xml_feed(self):
+        from xml.etree import ElementTree
+        root = ElementTree.fromstring(self.export('xml'))
+        g = '{http://base.google.com/ns/1.0}'
+        items = root.findall('channel/item')
+        # The first product is listed through its single variant.
+        self.assertEqual(len(items), 3)
+        variant_item = next(item for item in items if item.findtext(f'{g}id') == 'SKU-BIG')
+        self.assertEqual(variant_item.findtext(f'{g}availability'), 'out_of_stock')
+        self.assertEqual(variant_item.findtext(f'{g}price'), '1500.00 USD')
+        self.assertEqual(variant_item.findtext(f'{g}item_group_id'), self.products[0].sku)
+
+    def test_command_writes_gzip(self):
+        import gzip
+        import tempfile
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'catalog.jsonl')
+        call_command('export_products', path, stdout=StringIO())
+        self.addCleanup(os.remove, path + '.gz')
+        with gzip.open(path + '.gz', 'rt', encoding='utf-8') as handle:
+            self.assertEqual(len(handle.readlines()), 3)
+
+    def test_export_is_admin_only(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/v1/products/products/export/').status_code, 401)
+
+
+class SyntheticDataTests(TestCase):
+    """generate_laptop_data --scale is deterministic and derives every volume from N."""
+    
+    def generate(self, seed=7):
+        call_command('generate_laptop_data', scale=60, seed=seed, batch_size=25, stdout=StringIO())
+    
+    def snapshot(self):
+        return (
+            list(Product.objects.order_by('sku').values_list('sku', 'category__slug', 'brand__slug', 'price', 'sale_price')),
+            list(ProductVariant.objects.order_by('sku').values_list('sku', 'price')),
+            list(Review.objects.order_by('product__sku', 'user__email').values_list('product__sku', 'user__email', 'rating')),
+        )
+    
+    def test_scale_generates_related_data(self):
+        from orders.models import Order, OrderItem
+        from cart.models import Cart
+        self.generate()
+        self.assertEqual(Product.objects.count(), 60)
+        self.assertEqual(CustomUser.objects.count(), 10)
+        self.assertEqual(Order.objects.count(), 120)
+        self.assertEqual(Cart.objects.count(), 5)
+        self.assertEqual(ProductListing.objects.count(), 60)
+        self.assertEqual(
+            Inventory.objects.count(), Product.objects.count() + ProductVariant.objects.count()
+        )
+        order = Order.objects.prefetch_related('items').first()
+        self.assertEqual(order.subtotal, sum(item.total_price for item in order.items.all()))
+        self.assertTrue(OrderItem.objects.filter(product__isnull=True).count() == 0)
+        rated = Product.objects.filter(rating_count__gt=0).first()
+        self.assertEqual(rated.rating_count, rated.reviews.approved().count())
+    
+    def test_same_seed_same_data(self):
+        self.generate()
+        first = self.snapshot()
+        Product.objects.all().delete()
+        Brand.objects.all().delete()
+        Category.objects.all().delete()
+        CustomUser.objects.all().delete()
+        self.generate()
+        self.assertEqual(self.snapshot(), first)
+    
+    def test_refuses_to_generate_twice(self):
+        from django.core.management.base import CommandError
+        self.generate()
+        with self.assertRaises(CommandError):
+            self.generate()
+
+
+class ImageIngestTests(CatalogFixtureMixin, TestCase):
+    """generate_laptop_images fetches concurrently and stores identical bytes once."""
+    
+    def setUp(self):
+        import shutil
+        import tempfile
+        from PIL import Image
+        self.media = tempfile.mkdtemp()
+        self.source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        self.addCleanup(shutil.rmtree, self.source)
+        for name, color in (('a.png', 'red'), ('b.png', 'blue'), ('c.png', 'red'), ('d.png', 'green')):
+            Image.new('RGB', (8, 8), color).save(os.path.join(self.source, name))
+        self.products = self.create_catalog(4)
+        ProductImage.objects.all().delete()
+    
+    def generate(self, source):
+        with override_settings(MEDIA_ROOT=self.media):
+            out = StringIO()
+            call_command('generate_laptop_images', source=source, seed=1, workers=4, stdout=out)
+        return out.getvalue()
+    
+    def test_directory_source_dedupes_by_content(self):
+        output = self.generate(self.source)
+        self.assertIn('images/s', output)
+        self.assertEqual(ProductImage.objects.filter(is_primary=True).count(), 4)
+        # a.png and c.png have the same bytes, so at most three distinct files exist.
+        stored = os.listdir(os.path.join(self.media, 'products'))
+        self.assertEqual(len(stored), 3)
+        self.assertEqual(
+            set(ProductImage.objects.values_list('image', flat=True)), {f'products/{name}' for name in stored}
+        )
+        listing = ProductListing.objects.get(product=self.products[0])
+        self.assertEqual(listing.primary_image.name, self.products[0].images.get(is_primary=True).image.name)
+    
+    def test_new_primary_replaces_the_existing_one(self):
+        product = self.products[0]
+        old = ProductImage.objects.create(product=product, image='products/old.png', is_primary=True)
+        from .image_ingest import ingest_images
+        with override_settings(MEDIA_ROOT=self.media):
+            ingest_images({product: [os.path.join(self.source, 'b.png')]}, workers=1)
+        primary = product.images.get(is_primary=True)
+        self.assertNotEqual(primary.pk, old.pk)
+        self.assertEqual(ProductListing.objects.get(product=product).primary_image.name, primary.image.name)
+    
+    def test_http_stand_in(self):
+        import functools
+        import threading
+        from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+        class QuietHandler(SimpleHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+        
+        server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=self.source))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        # Every Unsplash URL is rebased onto the stand-in, which has none of them.
+        output = self.generate(f'http://127.0.0.1:{server.server_port}/')
+        self.assertIn('Error fetching', output)
+        self.assertEqual(ProductImage.objects.count(), 0)
+        
+        from .image_ingest import ingest_images
+        base = f'http://127.0.0.1:{server.server_port}/'
+        with override_settings(MEDIA_ROOT=self.media):
+            result = ingest_images({
+                product: [base + 'a.png', base + 'b.png', base + 'c.png'] for product in self.products
+            }, workers=4)
+        self.assertEqual((result.fetched, result.files_stored, result.files_reused), (3, 2, 1))
+        self.assertEqual(result.images_created, 12)
+
+
+class ImageDerivativeTests(CatalogFixtureMixin, TestCase):
+    """Uploads get thumbnail/card/detail renditions in WebP and JPEG, exposed as srcsets."""
+    
+    def setUp(self):
+        import shutil
+        import tempfile
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings_override = override_settings(MEDIA_ROOT=self.media, PRODUCT_IMAGE_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.product = self.create_catalog(1)[0]
+        ProductImage.objects.all().delete()
+    
+    def upload(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 900), 'purple').save(buffer, 'PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            return ProductImage.objects.create(
+                product=self.product, is_primary=True,
+                image=SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png'),
+            )
+    
+    def test_upload_renders_every_size_and_format(self):
+        from PIL import Image
+        from .derivatives import derivative_name
+        image = self.upload()
+        image.refresh_from_db()
+        self.assertTrue(image.derivatives_ready)
+        with Image.open(os.path.join(self.media, derivative_name(image.image.name, 'card', 'jpeg'))) as card:
+            self.assertEqual(card.size, (480, 360))
+        with Image.open(os.path.join(self.media, derivative_name(image.image.name, 'thumbnail', 'webp'))) as thumb:
+            self.assertEqual((thumb.format, thumb.size), ('WEBP', (300, 300)))
+        
+        item = self.client.get('/api/v1/products/products/').data['results'][0]
+        sizes = item['primary_image_sizes']
+        self.assertTrue(sizes['sizes']['card']['webp'].endswith('/' + derivative_name(image.image.name, 'card', 'webp')))
+        self.assertRegex(sizes['sizes']['card']['webp'], r'/card-480x360-[0-9a-f]{8}\.webp$')
+        self.assertEqual(sizes['srcset']['jpeg'].count('w,'), 2)
+        self.assertIn('480w', sizes['srcset']['webp'])
+        detail = self.client.get(f'/api/v1/products/products/{self.product.slug}/').data
+        self.assertIsNotNone(detail['images'][0]['sizes'])
+    
+    def test_encoder_options_change_the_name(self):
+        from . import derivatives
+        before = derivatives.derivative_name('products/a.png', 'card', 'jpeg')
+        formats = dict(derivatives.FORMATS, jpeg=('JPEG', 'jpg', {'quality': 90}))
+        with mock.patch.object(derivatives, 'FORMATS', formats):
+            after = derivatives.derivative_name('products/a.png', 'card', 'jpeg')
+        self.assertNotEqual(before, after)
+    
+    def test_backfill_command(self):
+        image = self.upload()
+        ProductImage.objects.filter(pk=image.pk).update(derivatives_ready=False)
+        ProductListing.objects.update(primary_image_derivatives=False)
+        self.assertIsNone(self.client.get('/api/v1/products/products/').data['results'][0]['primary_image_sizes'])
+        call_command('generate_image_derivatives', workers=2, stdout=StringIO())
+        self.assertTrue(ProductImage.objects.get(pk=image.pk).derivatives_ready)
+        self.assertTrue(ProductListing.objects.get(product=self.product).primary_image_derivatives)
+
+
+class ContentHashedMediaTests(CatalogFixtureMixin, TestCase):
+    """Catalog media is stored under content hashes and served as immutable."""
+    
+    def setUp(self):
+        import shutil
+        import tempfile
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings_override = override_settings(MEDIA_ROOT=self.media, PRODUCT_IMAGE_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.product = self.create_catalog(1)[0]
+        ProductImage.objects.all().delete()
+    
+    def png(self, color='orange'):
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new('RGB', (40, 30), color).save(buffer, 'PNG')
+        return buffer.getvalue()
+    
+    def test_identical_uploads_share_a_hashed_name(self):
+        import hashlib
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        data = self.png()
+        first = ProductImage.objects.create(product=self.product, image=SimpleUploadedFile('a.png', data))
+        second = ProductImage.objects.create(product=self.product, image=SimpleUploadedFile('b.PNG', data))
+        self.assertEqual(first.image.name, f'products/{hashlib.sha256(data).hexdigest()}.png')
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(os.listdir(os.path.join(self.media, 'products')), [os.path.basename(first.image.name)])
+    
+    def test_media_cache_headers(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        image = ProductImage.objects.create(product=self.product, image=SimpleUploadedFile('a.png', self.png()))
+        response = self.client.get(image.image.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        os.makedirs(os.path.join(self.media, 'profile_pictures'))
+        with open(os.path.join(self.media, 'profile_pictures', 'me.png'), 'wb') as handle:
+            handle.write(self.png())
+        response = self.client.get('/media/profile_pictures/me.png')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn('must-revalidate', response['Cache-Control'])
+    
+    def test_hash_media_names_renames_legacy_files(self):
+        from .storage import is_hashed
+        os.makedirs(os.path.join(self.media, 'products'))
+        with open(os.path.join(self.media, 'products', 'legacy.png'), 'wb') as handle:
+            handle.write(self.png('navy'))
+        image = ProductImage.objects.create(product=self.product, image='products/legacy.png', is_primary=True)
+        call_command('hash_media_names', delete_originals=True, stdout=StringIO())
+        image.refresh_from_db()
+        self.assertTrue(is_hashed(image.image.name))
+        self.assertTrue(image.derivatives_ready)
+        self.assertFalse(os.path.exists(os.path.join(self.media, 'products', 'legacy.png')))
+        self.assertEqual(ProductListing.objects.get(product=self.product).primary_image.name, image.image.name)
@@ -0,0 +1,126 @@
+"""
+Write-behind buffering of product view events.
+
+``record_view`` only touches an in-process dict keyed by (user, product),
+so repeat views coalesce and a page view never waits on the database. A
+single flusher per process drains the buffer every
+``RECENTLY_VIEWED_FLUSH_INTERVAL`` seconds with one bulk upsert, then
+trims the affected users' histories to the newest
+``RECENTLY_VIEWED_LIMIT`` rows. Without a running flusher thread (tests,
+management commands), the request that finds the buffer full or due
+flushes it inline instead. With one, a flush that fails is logged and
+the next one proceeds, and the buffer never grows past
+``RECENTLY_VIEWED_BUFFER_SIZE``: the oldest views are dropped. Buffered views of a process that dies are
+lost, which is acceptable for browsing history.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import Product, RecentlyViewed, User
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 5
+DEFAULT_BUFFER_SIZE = 500
+DEFAULT_HISTORY_LIMIT = 50
+
+_buffer = {}
+_buffer_lock = threading.Lock()
+# Held for a whole flush so there is only ever one writer per process.
+_flush_lock = threading.Lock()
+_last_flush = time.monotonic()
+_flusher = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def record_view(user_id, product_id):
+    """Buffer a view of ``product_id`` by ``user_id``."""
+    size = _setting('RECENTLY_VIEWED_BUFFER_SIZE', DEFAULT_BUFFER_SIZE)
+    flusher_running = _flusher is not None and _flusher.is_alive()
+    with _buffer_lock:
+        # Re-insert so the buffer stays ordered oldest view first.
+        _buffer.pop((user_id, product_id), None)
+        _buffer[user_id, product_id] = timezone.now()
+        due = (
+            len(_buffer) >= size or
+            time.monotonic() - _last_flush >= _setting('RECENTLY_VIEWED_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        )
+        if flusher_running:
+            while len(_buffer) > size:
+                del _buffer[next(iter(_buffer))]
+    if due and not flusher_running:
+        flush_views()
+
+
+def flush_views():
+    """Write every buffered view in one upsert and trim histories; returns rows written."""
+    global _buffer, _last_flush
+    with _flush_lock:
+        with _buffer_lock:
+            pending, _buffer = _buffer, {}
+            _last_flush = time.monotonic()
+        if not pending:
+            return 0
+        with transaction.atomic():
+            # Products or users deleted since the view would fail the foreign keys.
+            products = set(Product.objects.filter(
+                pk__in={product_id for _, product_id in pending}
+            ).values_list('pk', flat=True))
+            users = set(User.objects.filter(
+                pk__in={user_id for user_id, _ in pending}
+            ).values_list('pk', flat=True))
+            rows = [
+                RecentlyViewed(user_id=user_id, product_id=product_id, viewed_at=viewed_at)
+                for (user_id, product_id), viewed_at in pending.items()
+                if product_id in products and user_id in users
+            ]
+            RecentlyViewed.objects.bulk_create(
+                rows, batch_size=500, update_conflicts=True,
+                unique_fields=['user', 'product'], update_fields=['viewed_at'],
+            )
+            trim_histories({row.user_id for row in rows})
+        return len(rows)
+
+
+def trim_histories(user_ids, limit=None):
+    """Keep only the newest ``limit`` views of each of ``user_ids``."""
+    limit = limit or _setting('RECENTLY_VIEWED_LIMIT', DEFAULT_HISTORY_LIMIT)
+    ranked = RecentlyViewed.objects.filter(user_id__in=user_ids).annotate(
+        position=Window(RowNumber(), partition_by=F('user_id'), order_by=[F('viewed_at').desc(), F('pk').desc()])
+    ).filter(position__gt=limit).values_list('pk', flat=True)
+    stale = list(ranked)
+    if stale:
+        RecentlyViewed.objects.filter(pk__in=stale).delete()
+
+
+def _run_flusher():
+    while True:
+        time.sleep(_setting('RECENTLY_VIEWED_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL))
+        try:
+            flush_views()
+        except Exception:
+            # The batch is lost; the thread must survive to flush the next one.
+            logger.exception('Flushing recently viewed products failed')
+        finally:
+            connection.close()
+
+
+def start_view_flusher():
+    """Start this process's background flusher thread (idempotent)."""
+    global _flusher
+    with _flush_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_run_flusher, name='recently-viewed-flusher', daemon=True)
+            _flusher.start()
+            atexit.register(flush_views)
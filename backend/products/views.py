@@ -1,23 +1,63 @@
-from rest_framework import viewsets, generics, status, permissions, filters
+import io
+
+from rest_framework import viewsets, generics, status, permissions, filters, serializers
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.db.models import Q, Avg
+from rest_framework.parsers import MultiPartParser
+from rest_framework.settings import api_settings
+from django.db.models import Q, Avg, Max, Prefetch
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import (
     Category, Brand, Product, ProductImage, ProductAttribute, 
     ProductAttributeValue, ProductVariant, VariantAttributeValue, 
-    Inventory, Review, Wishlist, RecentlyViewed
+    Inventory, Review, Wishlist, RecentlyViewed, ProductListing
 )
 from .serializers import (
-    CategorySerializer, BrandSerializer, ProductListSerializer,
+    CategorySerializer, BrandSerializer, ProductListingSerializer, ProductComparisonSerializer,
     ProductDetailSerializer, ProductImageSerializer, ProductAttributeSerializer,
     ProductVariantSerializer, InventorySerializer, ReviewSerializer,
-    WishlistSerializer, RecentlyViewedSerializer
+    WishlistSerializer, WishlistBulkSerializer, RecentlyViewedSerializer
+)
+from .comparison import build_comparison, parse_compare_ids
+from .filters import ProductFilter
+from .hierarchy import build_tree
+from .exporting import EXPORTERS
+from .importing import detect_format, import_products
+from .recommendations import related_listings
+from .pagination import ProductKeysetPagination, ReviewKeysetPagination, SearchPagination
+from .search import get_search_backend
+from .tracking import record_view
+from .wishlists import get_wishlist_ids, invalidate_wishlist, wishlist_etag_variant
+from .autocomplete import get_autocomplete_index
+from .facets import FacetIndex, get_facet_index, id_filter, ids_to_bitmap, parse_attr_filters
+from .caching import cache_response
+from .conditional import conditional_response
+
+
+# Same shape as Product.objects.for_listing(), one relation further out.
+PRIMARY_IMAGE_PREFETCH = Prefetch(
+    'product__images',
+    queryset=ProductImage.objects.filter(is_primary=True),
+    to_attr='primary_images',
 )
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class ProductListActionMixin:
+    """Keyset-paginated product lists for custom catalog actions, read from ProductListing."""
+    
+    product_pagination_class = ProductKeysetPagination
+    
+    def paginated_products(self, queryset):
+        paginator = self.product_pagination_class()
+        page = paginator.paginate_queryset(queryset, self.request, view=self)
+        serializer = ProductListingSerializer(page, many=True, context={'request': self.request})
+        return paginator.get_paginated_response(serializer.data)
+
+
+class CategoryViewSet(ProductListActionMixin, viewsets.ModelViewSet):
     """ViewSet for managing product categories."""
     
     queryset = Category.objects.filter(is_active=True)
@@ -27,27 +67,51 @@ class CategoryViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'description']
     
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'products', 'root', 'tree']:
             return [permissions.AllowAny()]
         return [permissions.IsAdminUser()]
     
+    @conditional_response('categories')
+    @cache_response('categories')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @conditional_response('categories', detail=True)
+    @cache_response('categories')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
     @action(detail=True, methods=['get'])
+    @cache_response('categories', 'products')
     def products(self, request, slug=None):
-        """Get all products in a category."""
+        """Get products in a category and all its subcategories, keyset-paginated."""
         category = self.get_object()
-        products = Product.objects.filter(category=category, is_active=True)
-        serializer = ProductListSerializer(products, many=True, context={'request': request})
-        return Response(serializer.data)
+        products = ProductListing.objects.filter(category__in=category.subtree().values('pk'))
+        return self.paginated_products(products)
     
     @action(detail=False, methods=['get'])
+    @cache_response('categories')
     def root(self, request):
         """Get all root categories (categories without a parent)."""
         categories = Category.objects.filter(parent=None, is_active=True)
         serializer = self.get_serializer(categories, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    @cache_response('categories')
+    def tree(self, request):
+        """Nested category tree, optionally only the subtree under ?root=<slug>."""
+        slug = request.query_params.get('root')
+        if slug:
+            root = get_object_or_404(Category, slug=slug, is_active=True)
+            # The root's own parent is outside the subtree, so it nests at the top.
+            categories = list(root.subtree())
+        else:
+            categories = list(Category.objects.filter(is_active=True))
+        return Response(build_tree(categories))
 
 
-class BrandViewSet(viewsets.ModelViewSet):
+class BrandViewSet(ProductListActionMixin, viewsets.ModelViewSet):
     """ViewSet for managing product brands."""
     
     queryset = Brand.objects.filter(is_active=True)
@@ -57,37 +121,118 @@ class BrandViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'description']
     
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'products']:
             return [permissions.AllowAny()]
         return [permissions.IsAdminUser()]
     
+    @conditional_response('brands')
+    @cache_response('brands')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @conditional_response('brands', detail=True)
+    @cache_response('brands')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
     @action(detail=True, methods=['get'])
+    @cache_response('brands', 'products')
     def products(self, request, slug=None):
-        """Get all products of a brand."""
+        """Get products of a brand, keyset-paginated."""
         brand = self.get_object()
-        products = Product.objects.filter(brand=brand, is_active=True)
-        serializer = ProductListSerializer(products, many=True, context={'request': request})
-        return Response(serializer.data)
+        products = ProductListing.objects.filter(brand=brand)
+        return self.paginated_products(products)
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ProductListActionMixin, viewsets.ModelViewSet):
     """ViewSet for managing products."""
     
     queryset = Product.objects.filter(is_active=True)
     lookup_field = 'slug'
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'brand', 'is_featured', 'availability']
-    search_fields = ['name', 'description', 'short_description', 'sku']
-    ordering_fields = ['name', 'price', 'created_at']
+    filterset_class = ProductFilter
+    search_fields = ['name', 'short_description', 'sku', 'brand_name', 'category_name']
+    ordering_fields = ['name', 'price', 'effective_price', 'created_at', 'rating_avg']
+    
+    def get_queryset(self):
+        if self.action == 'list':
+            return ProductListing.objects.all()
+        if self.action == 'retrieve':
+            return super().get_queryset().for_detail()
+        return super().get_queryset()
     
     def get_serializer_class(self):
         if self.action == 'list':
-            return ProductListSerializer
+            return ProductListingSerializer
         return ProductDetailSerializer
     
+    @conditional_response('products')
+    @cache_response('products')
+    def list(self, request, *args, **kwargs):
+        """List products, optionally narrowed by ?attr=Name:Value facets."""
+        queryset = self.filter_queryset(self.get_queryset())
+        
+        facets = None
+        attr_filters = parse_attr_filters(request.query_params.getlist('attr'))
+        if attr_filters or request.query_params.get('facets'):
+            index = get_facet_index()
+            indexed = self.indexed_filters(request)
+            if indexed is not None:
+                base = index.filter(indexed)
+            else:
+                base = ids_to_bitmap(queryset.values_list('pk', flat=True))
+            result = index.query(base, attr_filters)
+            if attr_filters:
+                queryset = queryset.filter(id_filter(result.product_ids))
+            facets = result.facets
+        
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        if facets is not None:
+            response.data['facets'] = facets
+        return response
+    
+    def indexed_filters(self, request):
+        """The active ProductFilter values if the facet index covers them all, else None."""
+        if request.query_params.get(api_settings.SEARCH_PARAM):
+            return None
+        filterset = ProductFilter(request.query_params, queryset=ProductListing.objects.none())
+        if not filterset.is_valid():
+            return None
+        active = {name: value for name, value in filterset.form.cleaned_data.items() if value not in (None, '')}
+        if not set(active) <= set(FacetIndex.FIELDS):
+            return None
+        for name in ('category', 'brand'):
+            if name in active:
+                active[name] = int(active[name])
+        return active
+    
+    @conditional_response('products', detail=True)
+    @cache_response('products')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
+    def get_last_modified(self, queryset):
+        """Newest change to the product or to the child rows its detail payload embeds."""
+        stamps = queryset.aggregate(
+            product_changed=Max('updated_at'),
+            images_changed=Max('images__created_at'),
+            variants_changed=Max('variants__updated_at'),
+            inventory_changed=Max('inventory__last_checked'),
+            variant_inventory_changed=Max('variants__inventory__last_checked'),
+        )
+        return max((stamp for stamp in stamps.values() if stamp), default=None)
+    
+    def get_etag_variant(self, request):
+        # Payloads carry the user's in_wishlist flags
+        return wishlist_etag_variant(request)
+    
     def get_permissions(self):
-        if self.action in ['list', 'retrieve', 'featured', 'search', 'by_category', 'by_brand']:
+        if self.action in ['list', 'retrieve', 'variants', 'reviews', 'related', 'featured', 'search', 'autocomplete', 'compare', 'by_category', 'by_brand']:
             return [permissions.AllowAny()]
+        if self.action in ['add_to_wishlist', 'remove_from_wishlist', 'track_view']:
+            return [permissions.IsAuthenticated()]
         return [permissions.IsAdminUser()]
     
     def get_serializer_context(self):
@@ -96,44 +241,90 @@ class ProductViewSet(viewsets.ModelViewSet):
         return context
     
     @action(detail=False, methods=['get'])
+    @cache_response('products')
     def featured(self, request):
         """Get featured products."""
-        products = Product.objects.filter(is_featured=True, is_active=True)
-        serializer = ProductListSerializer(products, many=True, context={'request': request})
-        return Response(serializer.data)
+        products = ProductListing.objects.filter(is_featured=True)
+        return self.paginated_products(products)
     
     @action(detail=False, methods=['get'])
     def search(self, request):
-        """Search products by query parameter."""
+        """Full-text search, ranked by relevance with prefix matching."""
         query = request.query_params.get('q', '')
         if not query:
             return Response({'error': 'Query parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        products = Product.objects.filter(
-            Q(name__icontains=query) | 
-            Q(description__icontains=query) | 
-            Q(short_description__icontains=query) |
-            Q(sku__icontains=query) |
-            Q(category__name__icontains=query) |
-            Q(brand__name__icontains=query),
-            is_active=True
+        paginator = SearchPagination()
+        products = paginator.paginate_search(
+            get_search_backend(), query, ProductListing.objects.all(), request
         )
-        serializer = ProductListSerializer(products, many=True, context={'request': request})
-        return Response(serializer.data)
+        serializer = ProductListingSerializer(products, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    @cache_response('products')
+    def compare(self, request):
+        """Compare products side by side: ?ids=1,2,3 (attribute matrix, price ranges, stock)."""
+        ids = parse_compare_ids(request.query_params.get('ids', ''))
+        listings, rows = build_comparison(ids)
+        if not listings:
+            return Response({'error': 'No products found'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = ProductComparisonSerializer(listings, many=True, context={'request': request})
+        return Response({'products': serializer.data, 'attributes': rows})
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the catalog (admin only): ?type=csv|jsonl|xml."""
+        export_type = request.query_params.get('type', 'jsonl')
+        if export_type not in EXPORTERS:
+            return Response({'error': 'Type must be csv, jsonl or xml'}, status=status.HTTP_400_BAD_REQUEST)
+        exporter, content_type = EXPORTERS[export_type]
+        base_url = request.build_absolute_uri('/').rstrip('/')
+        response = StreamingHttpResponse(exporter(base_url), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="products.{export_type}"'
+        return response
+    
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser])
+    def bulk_import(self, request):
+        """Import a CSV/JSONL upload (admin only); ?dry_run=1 validates without saving."""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'A file upload is required'}, status=status.HTTP_400_BAD_REQUEST)
+        format = request.data.get('format') or detect_format(upload.name)
+        if format not in ('csv', 'jsonl'):
+            return Response({'error': 'Format must be csv or jsonl'}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.query_params.get('dry_run', request.data.get('dry_run', ''))).lower() in ('1', 'true')
+        
+        # Large uploads are spooled to disk by Django and streamed from there.
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        result = import_products(stream, format, dry_run=dry_run)
+        return Response(result.as_dict(), status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Suggest brands, categories, products and SKUs for a typed prefix."""
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 20)
+        except ValueError:
+            limit = 10
+        results = get_autocomplete_index().lookup(query, limit=limit)
+        return Response({'query': query, 'results': results})
     
     @action(detail=False, methods=['get'])
+    @cache_response('categories', 'products')
     def by_category(self, request):
-        """Get products by category slug."""
+        """Get products by category slug, including its subcategories."""
         slug = request.query_params.get('slug', '')
         if not slug:
             return Response({'error': 'Category slug is required'}, status=status.HTTP_400_BAD_REQUEST)
         
         category = get_object_or_404(Category, slug=slug, is_active=True)
-        products = Product.objects.filter(category=category, is_active=True)
-        serializer = ProductListSerializer(products, many=True, context={'request': request})
-        return Response(serializer.data)
+        products = ProductListing.objects.filter(category__in=category.subtree().values('pk'))
+        return self.paginated_products(products)
     
     @action(detail=False, methods=['get'])
+    @cache_response('brands', 'products')
     def by_brand(self, request):
         """Get products by brand slug."""
         slug = request.query_params.get('slug', '')
@@ -141,25 +332,35 @@ class ProductViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Brand slug is required'}, status=status.HTTP_400_BAD_REQUEST)
         
         brand = get_object_or_404(Brand, slug=slug, is_active=True)
-        products = Product.objects.filter(brand=brand, is_active=True)
-        serializer = ProductListSerializer(products, many=True, context={'request': request})
-        return Response(serializer.data)
+        products = ProductListing.objects.filter(brand=brand)
+        return self.paginated_products(products)
     
     @action(detail=True, methods=['get'])
     def variants(self, request, slug=None):
         """Get all variants of a product."""
         product = self.get_object()
-        variants = product.variants.filter(is_active=True)
+        variants = ProductVariant.objects.for_detail().filter(product=product, is_active=True)
         serializer = ProductVariantSerializer(variants, many=True)
         return Response(serializer.data)
     
     @action(detail=True, methods=['get'])
     def reviews(self, request, slug=None):
-        """Get all approved reviews of a product."""
+        """Get approved reviews of a product, newest first, one cursor page at a time."""
         product = self.get_object()
-        reviews = product.reviews.filter(is_approved=True)
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data)
+        reviews = Review.objects.approved().for_feed().filter(product=product)
+        paginator = ReviewKeysetPagination()
+        page = paginator.paginate_queryset(reviews, request, view=self)
+        serializer = ReviewSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    @cache_response('products')
+    def related(self, request, slug=None):
+        """Customers also viewed/bought, or similar brand/category products for new items."""
+        product = self.get_object()
+        source, listings = related_listings(product)
+        serializer = ProductListingSerializer(listings, many=True, context={'request': request})
+        return Response({'source': source, 'results': serializer.data})
     
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def add_to_wishlist(self, request, slug=None):
@@ -189,12 +390,9 @@ class ProductViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def track_view(self, request, slug=None):
-        """Track a product view for the current user."""
+        """Track a product view for the current user (buffered, written in batches)."""
         product = self.get_object()
-        user = request.user
-        
-        # Update or create recently viewed record
-        RecentlyViewed.objects.update_or_create(user=user, product=product)
+        record_view(request.user.pk, product.pk)
         
         return Response({'message': 'Product view tracked'}, status=status.HTTP_200_OK)
 
@@ -204,11 +402,20 @@ class ReviewViewSet(viewsets.ModelViewSet):
     
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ReviewKeysetPagination
     
     def get_queryset(self):
         if self.request.user.is_staff:
-            return Review.objects.all()
-        return Review.objects.filter(user=self.request.user)
+            return Review.objects.for_feed()
+        return Review.objects.for_feed().filter(user=self.request.user)
+    
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def pending(self, request):
+        """Moderation queue: unapproved reviews, newest first."""
+        reviews = Review.objects.pending().for_feed()
+        page = self.paginate_queryset(reviews)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
     def perform_create(self, serializer):
         product_id = self.request.data.get('product')
@@ -228,7 +435,36 @@ class WishlistViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Wishlist.objects.filter(user=self.request.user)
+        return Wishlist.objects.filter(user=self.request.user).select_related(
+            'product__category', 'product__brand'
+        ).prefetch_related(PRIMARY_IMAGE_PREFETCH)
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Add and/or remove many products: {"add": [ids], "remove": [ids]}."""
+        serializer = WishlistBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        
+        with transaction.atomic():
+            removed, _ = Wishlist.objects.filter(
+                user=user, product_id__in=serializer.validated_data.get('remove', [])
+            ).delete()
+            add = list(Product.objects.active().filter(
+                pk__in=serializer.validated_data.get('add', [])
+            ).values_list('pk', flat=True))
+            existing = Wishlist.objects.filter(user=user, product_id__in=add).count()
+            Wishlist.objects.bulk_create(
+                [Wishlist(user=user, product_id=pk) for pk in add], ignore_conflicts=True
+            )
+        # bulk_create() sends no signals
+        invalidate_wishlist(user.pk)
+        
+        return Response({
+            'added': len(add) - existing,
+            'removed': removed,
+            'product_ids': sorted(get_wishlist_ids(user.pk)),
+        })
 
 
 class RecentlyViewedViewSet(viewsets.ReadOnlyModelViewSet):
@@ -238,4 +474,6 @@ class RecentlyViewedViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return RecentlyViewed.objects.filter(user=self.request.user)
+        return RecentlyViewed.objects.filter(user=self.request.user).select_related(
+            'product__category', 'product__brand'
+        ).prefetch_related(PRIMARY_IMAGE_PREFETCH)
@@ -0,0 +1,55 @@
+"""
+Per-user wishlist membership for product serializers.
+
+Each user's wishlisted product ids are cached as one frozenset, so
+serializing a page of products answers ``in_wishlist`` for every row
+with at most one query (none once cached). Wishlist signals and the bulk
+endpoint drop the entry whenever the set changes.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Wishlist
+
+WISHLIST_KEY = 'wishlist:ids:{}'
+
+
+def get_wishlist_ids(user_id):
+    """Return the frozenset of product ids on ``user_id``'s wishlist."""
+    key = WISHLIST_KEY.format(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(Wishlist.objects.filter(user_id=user_id).values_list('product_id', flat=True))
+        cache.set(key, ids, getattr(settings, 'CATALOG_CACHE_TIMEOUT', None))
+    return ids
+
+
+def invalidate_wishlist(user_id):
+    cache.delete(WISHLIST_KEY.format(user_id))
+
+
+def wishlist_ids_for_context(context):
+    """
+    Wishlist ids of the serializer context's user, looked up once per context.
+
+    A ``many=True`` serializer shares one context with all its children,
+    so the whole page costs a single lookup.
+    """
+    if 'wishlist_ids' not in context:
+        request = context.get('request')
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            context['wishlist_ids'] = get_wishlist_ids(user.pk)
+        else:
+            context['wishlist_ids'] = frozenset()
+    return context['wishlist_ids']
+
+
+def wishlist_etag_variant(request):
+    """Token folding the user's wishlist into ETags of pages that show it."""
+    if not request.user.is_authenticated:
+        return ''
+    ids = ','.join(str(pk) for pk in sorted(get_wishlist_ids(request.user.pk)))
+    return hashlib.md5(ids.encode('utf-8')).hexdigest()